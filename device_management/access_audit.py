@@ -0,0 +1,214 @@
+"""
+讀取稽核
+
+每次讀取只在記憶體中累加 (用戶, 物件, 時間區間) 的次數，
+由背景執行緒定期以批次 upsert 寫入 AccessCount，請求本身不會寫入資料庫。
+
+可透過 settings.ACCESS_AUDIT 設定：
+- ENABLED：全域開關
+- BUCKET_SECONDS：時間區間長度
+- FLUSH_INTERVAL：寫入間隔秒數，None 表示不啟動背景執行緒（由呼叫端自行 flush）
+- SAMPLE_RATE：取樣比例，小於 1 時以 1 / SAMPLE_RATE 為權重估算次數
+- MAX_PENDING：記憶體中最多累積的筆數，超過時提前寫入
+"""
+
+import atexit
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from .models import AccessCount
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BUCKET_SECONDS': 3600,
+    'FLUSH_INTERVAL': 30,
+    'SAMPLE_RATE': 1.0,
+    'MAX_PENDING': 50000,
+    'BATCH_SIZE': 500,
+}
+
+
+class AccessRecorder:
+    """在記憶體中彙總讀取次數，定期批次寫入"""
+
+    def __init__(self, enabled=True, bucket_seconds=3600, flush_interval=30,
+                 sample_rate=1.0, max_pending=50000, batch_size=500):
+        self.enabled = enabled
+        self.bucket_seconds = bucket_seconds
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self.weight = 1 if sample_rate >= 1 else max(1, round(1 / sample_rate))
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def record(self, user_id, model_name, object_pks):
+        """記錄一次讀取；只操作記憶體"""
+        if not self.enabled or not object_pks:
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+
+        now = time.time()
+        bucket = int(now // self.bucket_seconds * self.bucket_seconds)
+        with self._lock:
+            for pk in object_pks:
+                key = (user_id, model_name, pk, bucket)
+                entry = self._pending.get(key)
+                if entry is None:
+                    self._pending[key] = [self.weight, now, now]
+                else:
+                    entry[0] += self.weight
+                    entry[2] = now
+            overflow = len(self._pending) >= self.max_pending
+
+        self._ensure_flusher()
+        if overflow:
+            self._wake.set()
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    def _ensure_flusher(self):
+        """確保本行程有背景寫入執行緒（fork 後的子行程需重新建立）"""
+        if self.flush_interval is None:
+            return
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid is not None and self._pid != pid:
+                # fork 前累積的資料由父行程負責寫入
+                self._pending = {}
+            if self._pid != pid:
+                atexit.register(self.flush)
+            self._pid = pid
+            self._thread = threading.Thread(
+                target=self._run, name='access-audit-flusher', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+    def flush(self):
+        """將累積的次數以批次 upsert 寫入，回傳寫入的筆數"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            rows = [
+                (user_id, model_name, pk, bucket, count, first_seen, last_seen)
+                for (user_id, model_name, pk, bucket), (count, first_seen, last_seen) in pending.items()
+            ]
+            try:
+                for start in range(0, len(rows), self.batch_size):
+                    upsert_access_counts(rows[start:start + self.batch_size])
+            except DatabaseError:
+                logger.exception('讀取稽核寫入失敗，將於下次重試')
+                self._restore(pending)
+                return 0
+            return len(rows)
+
+    def _restore(self, pending):
+        """寫入失敗時將資料併回記憶體（超過上限的部分捨棄）"""
+        with self._lock:
+            for key, (count, first_seen, last_seen) in pending.items():
+                entry = self._pending.get(key)
+                if entry is not None:
+                    entry[0] += count
+                    entry[1] = min(entry[1], first_seen)
+                elif len(self._pending) < self.max_pending:
+                    self._pending[key] = [count, first_seen, last_seen]
+
+
+def _to_datetime(value):
+    return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+
+
+def upsert_access_counts(rows):
+    """以單一 INSERT ... ON CONFLICT 累加讀取次數"""
+    if not rows:
+        return
+    meta = AccessCount._meta
+    table = connection.ops.quote_name(meta.db_table)
+    columns = [
+        meta.get_field(name).column
+        for name in ('user', 'model_name', 'object_pk', 'bucket', 'count', 'first_seen', 'last_seen')
+    ]
+    user_col, model_col, object_col, bucket_col, count_col, first_col, last_col = (
+        connection.ops.quote_name(column) for column in columns
+    )
+
+    params = []
+    for user_id, model_name, pk, bucket, count, first_seen, last_seen in rows:
+        params.extend([
+            user_id,
+            model_name,
+            pk,
+            connection.ops.adapt_datetimefield_value(_to_datetime(bucket)),
+            count,
+            connection.ops.adapt_datetimefield_value(_to_datetime(first_seen)),
+            connection.ops.adapt_datetimefield_value(_to_datetime(last_seen)),
+        ])
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(rows))
+    insert = (
+        f'INSERT INTO {table} ({user_col}, {model_col}, {object_col}, {bucket_col}, '
+        f'{count_col}, {first_col}, {last_col}) VALUES {placeholders}'
+    )
+
+    if connection.vendor == 'mysql':
+        sql = (
+            f'{insert} ON DUPLICATE KEY UPDATE {count_col} = {count_col} + VALUES({count_col}), '
+            f'{last_col} = VALUES({last_col})'
+        )
+    else:
+        # PostgreSQL 與 SQLite（3.24+）
+        sql = (
+            f'{insert} ON CONFLICT ({user_col}, {model_col}, {object_col}, {bucket_col}) '
+            f'DO UPDATE SET {count_col} = {table}.{count_col} + excluded.{count_col}, '
+            f'{last_col} = excluded.{last_col}'
+        )
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+@lru_cache(maxsize=None)
+def get_recorder():
+    """依 settings.ACCESS_AUDIT 建立讀取稽核記錄器（每個行程一個實例）"""
+    config = {**DEFAULTS, **getattr(settings, 'ACCESS_AUDIT', {})}
+    return AccessRecorder(
+        enabled=config['ENABLED'],
+        bucket_seconds=config['BUCKET_SECONDS'],
+        flush_interval=config['FLUSH_INTERVAL'],
+        sample_rate=config['SAMPLE_RATE'],
+        max_pending=config['MAX_PENDING'],
+        batch_size=config['BATCH_SIZE'],
+    )
@@ -1,12 +1,27 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.auth.models import User
+from django.db.models import Count, Q
 from django.utils.html import format_html
 from .models import (
     DeviceCategory,
     PropertyDefinition,
     Device,
     IPRecord,
-    AuditLog
+    AuditLog,
+    AuditLogArchive,
+    AccessCount,
+    APIToken,
+    Notification,
+    PropertyMigration,
+    Subnet,
+    Tag,
+    DeviceTag
 )
+from . import bulk, valuation
+from .authentication import revoke_tokens
+from .pagination import EstimatedCountPaginator
 from .forms import (
     DeviceCategoryForm,
     PropertyDefinitionInlineForm,
@@ -33,21 +48,27 @@ class DeviceCategoryAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
     inlines = [PropertyDefinitionInline]
     
+    def get_queryset(self, request):
+        """裝置數量在列表查詢中一併計算，不需逐列查詢"""
+        return super().get_queryset(request).annotate(device_total=Count('devices'))
+    
     def device_count(self, obj):
         """顯示裝置數量"""
-        count = obj.devices.count()
-        return format_html('<span style="color: blue;">{}</span>', count)
+        return format_html('<span style="color: blue;">{}</span>', obj.device_total)
     device_count.short_description = '裝置數量'
+    device_count.admin_order_field = 'device_total'
 
 
 @admin.register(PropertyDefinition)
 class PropertyDefinitionAdmin(admin.ModelAdmin):
     """屬性定義管理"""
     form = PropertyDefinitionInlineForm
-    list_display = ['name', 'category', 'field_type', 'is_required', 'order']
-    list_filter = ['category', 'field_type', 'is_required']
+    list_display = ['name', 'category', 'field_type', 'is_required', 'is_promoted', 'order']
+    list_filter = ['category', 'field_type', 'is_required', 'is_promoted']
     search_fields = ['name', 'category__name']
     ordering = ['category', 'order', 'name']
+    list_select_related = ['category']
+    autocomplete_fields = ['category']
 
 
 class IPRecordInline(admin.TabularInline):
@@ -59,8 +80,39 @@ class IPRecordInline(admin.TabularInline):
     readonly_fields = []
 
 
+class DeviceTagInline(admin.TabularInline):
+    """裝置標籤內聯"""
+    model = DeviceTag
+    extra = 0
+    fields = ['tag', 'created_at']
+    readonly_fields = ['created_at']
+    autocomplete_fields = ['tag']
+
+
+class DeviceActionForm(ActionForm):
+    """裝置批次動作的參數（顯示在動作選單旁）"""
+    status = forms.ChoiceField(
+        label='狀態', required=False, choices=[('', '---------')] + Device.STATUS_CHOICES
+    )
+    username = forms.CharField(label='責任人帳號', required=False)
+
+
+class BulkDeleteLogMixin:
+    """
+    Admin 刪除時以一次 INSERT ... SELECT 寫入刪除日誌（bulk.delete）
+
+    IP 記錄（包含刪除裝置時連帶刪除的）以集合式 SQL 刪除，逐筆的刪除記錄與事件改為批次寫入與推送
+    """
+    
+    def delete_model(self, request, obj):
+        bulk.delete(self.model.objects.filter(pk=obj.pk), request.user, request)
+    
+    def delete_queryset(self, request, queryset):
+        bulk.delete(queryset, request.user, request)
+
+
 @admin.register(Device)
-class DeviceAdmin(admin.ModelAdmin):
+class DeviceAdmin(BulkDeleteLogMixin, admin.ModelAdmin):
     """裝置管理"""
     form = DeviceForm
     list_display = [
@@ -71,9 +123,15 @@ class DeviceAdmin(admin.ModelAdmin):
     list_filter = ['category', 'status', 'department', 'location']
     search_fields = ['serial_number', 'name', 'department', 'location', 'supplier']
     readonly_fields = ['created_at', 'updated_at', 'created_by', 'current_value_display']
+    list_select_related = ['category', 'responsible_person']
+    autocomplete_fields = ['category', 'responsible_person']
+    date_hierarchy = 'created_at'
+    # 批次動作皆為單一 UPDATE，可搭配「選取全部」處理大量裝置
+    action_form = DeviceActionForm
+    actions = ['change_status', 'reassign', 'retire']
     fieldsets = (
         ('基本資訊', {
-            'fields': ('serial_number', 'name', 'category', 'status', 'responsible_person')
+            'fields': ('serial_number', 'name', 'category', 'status', 'service_type', 'responsible_person')
         }),
         ('動態屬性', {
             'fields': ('custom_properties',),
@@ -82,7 +140,8 @@ class DeviceAdmin(admin.ModelAdmin):
         ('財產管理', {
             'fields': (
                 'purchase_date', 'cost', 'department', 'location',
-                'depreciation_rate', 'current_value_display', 'warranty_end_date',
+                'depreciation_method', 'depreciation_rate', 'depreciation_schedule', 'salvage_value',
+                'current_value_display', 'warranty_end_date',
                 'supplier', 'maintenance_info', 'retirement_date'
             )
         }),
@@ -91,7 +150,7 @@ class DeviceAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
-    inlines = [IPRecordInline]
+    inlines = [IPRecordInline, DeviceTagInline]
     
     def save_model(self, request, obj, form, change):
         """儲存時設定建立者"""
@@ -99,36 +158,82 @@ class DeviceAdmin(admin.ModelAdmin):
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
     
+    def get_changelist_instance(self, request):
+        """列表整頁的當前價值以 valuation.value_map 一次計算，不逐列計算"""
+        changelist = super().get_changelist_instance(request)
+        devices = list(changelist.result_list)
+        values = valuation.value_map(Device.objects.filter(pk__in=[device.pk for device in devices]))
+        for device in devices:
+            device.current_value = values.get(device.pk)
+        return changelist
+    
     def cost_display(self, obj):
         """顯示成本"""
         if obj.cost:
-            return format_html('<span style="color: green;">NT$ {:,.2f}</span>', obj.cost)
+            return format_html('<span style="color: green;">NT$ {}</span>', f'{obj.cost:,.2f}')
         return '-'
     cost_display.short_description = '成本'
     
     def current_value_display(self, obj):
-        """顯示當前價值"""
-        value = obj.get_current_depreciation()
+        """顯示當前價值；列表使用 get_changelist_instance 預先計算的結果"""
+        if hasattr(obj, 'current_value'):
+            value = obj.current_value
+        else:
+            value = obj.get_current_depreciation()
         if value is not None:
-            return format_html('<span style="color: blue;">NT$ {:,.2f}</span>', value)
+            return format_html('<span style="color: blue;">NT$ {}</span>', f'{value:,.2f}')
         return '-'
     current_value_display.short_description = '當前價值'
+    
+    @admin.action(description='將選取的裝置改為指定狀態', permissions=['change'])
+    def change_status(self, request, queryset):
+        status = request.POST.get('status')
+        if status not in dict(Device.STATUS_CHOICES):
+            self.message_user(request, '請選擇狀態', messages.ERROR)
+            return
+        if status == 'retired':
+            self.retire(request, queryset)
+            return
+        count = bulk.bulk_update(queryset, {'status': status}, request.user, request)
+        self.message_user(request, f'已將 {count} 台裝置改為「{dict(Device.STATUS_CHOICES)[status]}」')
+    
+    @admin.action(description='將選取的裝置指派給指定責任人', permissions=['change'])
+    def reassign(self, request, queryset):
+        username = request.POST.get('username', '').strip()
+        if not username:
+            self.message_user(request, '請輸入責任人帳號', messages.ERROR)
+            return
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            self.message_user(request, f'找不到用戶：{username}', messages.ERROR)
+            return
+        count = bulk.bulk_update(queryset, {'responsible_person': user}, request.user, request)
+        self.message_user(request, f'已將 {count} 台裝置指派給 {user.username}')
+    
+    @admin.action(description='報廢選取的裝置（並停用其 IP）', permissions=['change'])
+    def retire(self, request, queryset):
+        device_count, ip_count = bulk.retire_devices(queryset, request.user, request)
+        self.message_user(request, f'已報廢 {device_count} 台裝置，停用 {ip_count} 筆 IP 記錄')
 
 
 @admin.register(IPRecord)
-class IPRecordAdmin(admin.ModelAdmin):
+class IPRecordAdmin(BulkDeleteLogMixin, admin.ModelAdmin):
     """IP 記錄管理"""
     form = IPRecordForm
     list_display = [
-        'device', 'ip_address', 'mac_address', 
+        'device', 'ip_address', 'mac_address', 'subnet',
         'assigned_date', 'is_active_display', 'created_at'
     ]
-    list_filter = ['is_active', 'assigned_date']
+    list_filter = ['is_active', 'subnet']
     search_fields = ['ip_address', 'mac_address', 'device__name', 'device__serial_number']
-    readonly_fields = ['created_at', 'updated_at', 'history']
+    readonly_fields = ['subnet', 'created_at', 'updated_at', 'history']
+    list_select_related = ['device', 'subnet']
+    autocomplete_fields = ['device']
+    date_hierarchy = 'assigned_date'
+    actions = ['deactivate']
     fieldsets = (
         ('基本資訊', {
-            'fields': ('device', 'ip_address', 'mac_address', 'assigned_date', 'is_active', 'notes')
+            'fields': ('device', 'ip_address', 'mac_address', 'subnet', 'assigned_date', 'last_seen_at', 'is_active', 'notes')
         }),
         ('系統資訊', {
             'fields': ('history', 'created_at', 'updated_at'),
@@ -142,6 +247,26 @@ class IPRecordAdmin(admin.ModelAdmin):
             return format_html('<span style="color: green;">✓ 啟用</span>')
         return format_html('<span style="color: red;">✗ 停用</span>')
     is_active_display.short_description = '狀態'
+    
+    @admin.action(description='停用選取的 IP 記錄', permissions=['change'])
+    def deactivate(self, request, queryset):
+        count = bulk.bulk_update(queryset, {'is_active': False}, request.user, request)
+        self.message_user(request, f'已停用 {count} 筆 IP 記錄')
+
+
+class AuditedModelFilter(admin.SimpleListFilter):
+    """模型篩選：選項固定，不需對整個日誌表執行 SELECT DISTINCT"""
+    title = '模型名稱'
+    parameter_name = 'model_name'
+    models = (DeviceCategory, PropertyDefinition, Device, IPRecord)
+    
+    def lookups(self, request, model_admin):
+        return [(model.__name__, model._meta.verbose_name) for model in self.models]
+    
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(model_name=self.value())
+        return queryset
 
 
 @admin.register(AuditLog)
@@ -152,8 +277,13 @@ class AuditLogAdmin(admin.ModelAdmin):
         'timestamp', 'user', 'action_display', 
         'model_name', 'object_repr', 'ip_address'
     ]
-    list_filter = ['action', 'model_name', 'timestamp']
+    list_filter = ['action', AuditedModelFilter]
     search_fields = ['user__username', 'model_name', 'object_repr', 'ip_address']
+    list_select_related = ['user']
+    date_hierarchy = 'timestamp'
+    # 日誌表很大：未篩選時以統計資訊估算總數，篩選後也不再另外計算全表總數
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = [
         'user', 'action', 'model_name', 'object_id', 
         'object_repr', 'changes', 'ip_address', 'user_agent', 'timestamp'
@@ -183,3 +313,118 @@ class AuditLogAdmin(admin.ModelAdmin):
         """禁止刪除日誌"""
         return False
 
+
+@admin.register(AuditLogArchive)
+class AuditLogArchiveAdmin(AuditLogAdmin):
+    """封存操作日誌（唯讀）"""
+    
+    def has_change_permission(self, request, obj=None):
+        """封存資料不可修改"""
+        return False
+
+
+@admin.register(AccessCount)
+class AccessCountAdmin(admin.ModelAdmin):
+    """讀取紀錄（唯讀）"""
+    list_display = ['bucket', 'user', 'model_name', 'object_pk', 'count', 'last_seen']
+    list_filter = ['model_name', 'bucket']
+    search_fields = ['user__username', 'object_pk']
+    list_select_related = ['user']
+    readonly_fields = [
+        'user', 'model_name', 'object_pk', 'bucket', 'count', 'first_seen', 'last_seen'
+    ]
+    
+    def has_add_permission(self, request):
+        """禁止新增紀錄"""
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        """禁止修改紀錄"""
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        """禁止刪除紀錄"""
+        return False
+
+
+@admin.register(APIToken)
+class APITokenAdmin(admin.ModelAdmin):
+    """API 權杖（以 api_token 指令建立，原始權杖不會保存）"""
+    list_display = ['name', 'user', 'prefix', 'created_at', 'expires_at', 'last_used_at', 'revoked_at']
+    list_filter = ['revoked_at', 'expires_at']
+    search_fields = ['name', 'prefix', 'user__username']
+    list_select_related = ['user']
+    readonly_fields = ['user', 'prefix', 'created_at', 'last_used_at', 'revoked_at']
+    exclude = ['key_hash']
+    actions = ['revoke']
+    
+    def has_add_permission(self, request):
+        """權杖由 api_token 指令建立"""
+        return False
+    
+    @admin.action(description='撤銷選取的權杖')
+    def revoke(self, request, queryset):
+        count = revoke_tokens(queryset)
+        self.message_user(request, f'已撤銷 {count} 個權杖')
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    """通知（由排程指令建立）"""
+    list_display = ['subject', 'user', 'kind', 'key', 'created_at', 'delivered_at']
+    list_filter = ['kind', 'delivered_at']
+    search_fields = ['subject', 'user__username', 'key']
+    list_select_related = ['user']
+    readonly_fields = ['user', 'kind', 'key', 'subject', 'body', 'payload', 'created_at', 'delivered_at']
+    
+    def has_add_permission(self, request):
+        """通知由排程指令建立"""
+        return False
+
+
+@admin.register(PropertyMigration)
+class PropertyMigrationAdmin(admin.ModelAdmin):
+    """屬性結構演進工作（由屬性定義變更自動建立，唯讀）"""
+    list_display = ['id', 'category', 'definition', 'status', 'processed', 'total', 'updated', 'invalid', 'missing', 'created_at']
+    list_filter = ['status']
+    list_select_related = ['category', 'definition__category']
+    readonly_fields = [
+        'category', 'definition', 'operations', 'status', 'total', 'processed', 'updated', 'invalid',
+        'missing', 'samples', 'last_pk', 'error', 'created_by', 'created_at', 'started_at', 'finished_at'
+    ]
+    
+    def has_add_permission(self, request):
+        """工作由屬性定義變更自動建立"""
+        return False
+
+
+@admin.register(Subnet)
+class SubnetAdmin(admin.ModelAdmin):
+    """網段管理（IP 記錄依位址自動歸屬）"""
+    list_display = ['name', 'cidr', 'active_hosts', 'updated_at']
+    search_fields = ['name', 'cidr']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            active_total=Count('ip_records', filter=Q(ip_records__is_active=True))
+        )
+    
+    def active_hosts(self, obj):
+        return obj.active_total
+    active_hosts.short_description = '使用中'
+    active_hosts.admin_order_field = 'active_total'
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    """標籤管理"""
+    list_display = ['name', 'color', 'device_total', 'created_at']
+    search_fields = ['name']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(device_total=Count('device_links'))
+    
+    def device_total(self, obj):
+        return obj.device_total
+    device_total.short_description = '裝置數'
+    device_total.admin_order_field = 'device_total'
@@ -0,0 +1,325 @@
+"""
+非同步唯讀 API
+
+在 ASGI 部署下，同步的 DRF ViewSet 每個請求都會佔用一個執行緒。
+此模組提供熱門讀取路徑的原生非同步版本，使用 Django 非同步 ORM，
+並以 asyncio.gather 同時執行彼此獨立的子查詢。
+回應格式與對應的同步端點相同。
+"""
+
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import Page, Paginator
+from django.db.models import Count, Q, Sum
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import exceptions, status
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import events, throttling
+from .models import Device, IPRecord, AuditLog
+from .permissions import get_row_policy
+from .renderers import FastJSONRenderer
+from .serializers import DeviceSerializer, DeviceListSerializer
+from .views import DeviceViewSet
+
+
+def _json_response(data, status_code=status.HTTP_200_OK):
+    """使用與同步端點相同的 JSON 渲染器輸出"""
+    return HttpResponse(
+        FastJSONRenderer().render(data),
+        status=status_code,
+        content_type='application/json',
+    )
+
+
+def _exception_response(exc, drf_request):
+    """比照 DRF 的 exception_handler 將例外轉為回應"""
+    if isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {'detail': exc.detail}
+    response = _json_response(data, exc.status_code)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = '%d' % exc.wait
+
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        authenticators = drf_request.authenticators
+        auth_header = authenticators[0].authenticate_header(drf_request) if authenticators else None
+        if auth_header:
+            response['WWW-Authenticate'] = auth_header
+        else:
+            response.status_code = status.HTTP_403_FORBIDDEN
+    return response
+
+
+def _authenticate(drf_request, throttle_scope):
+    """以 DRF 設定的認證類別驗證請求（包含密碼雜湊等同步操作），並檢查流量額度"""
+    if not drf_request.user or not drf_request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    wait = throttling.check_throttle(drf_request, throttle_scope)
+    if wait is not None:
+        raise exceptions.Throttled(wait)
+
+
+def async_api_view(func=None, *, throttle_scope='read'):
+    """非同步 API 裝飾器：處理認證、流量限制與 DRF 例外"""
+    if func is None:
+        return functools.partial(async_api_view, throttle_scope=throttle_scope)
+
+    @functools.wraps(func)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return _json_response(
+                {'detail': f'Method "{request.method}" not allowed.'},
+                status.HTTP_405_METHOD_NOT_ALLOWED,
+            )
+        drf_request = Request(
+            request,
+            authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+        )
+        try:
+            await sync_to_async(_authenticate)(drf_request, throttle_scope)
+            return await func(drf_request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return _exception_response(exc, drf_request)
+    return wrapper
+
+
+def _build_viewset(drf_request, action):
+    """建立同步 ViewSet 實例，以重用其權限過濾與篩選邏輯"""
+    view = DeviceViewSet(request=drf_request, action=action, format_kwarg=None, args=(), kwargs={})
+    view.headers = {}
+    return view
+
+
+def _filtered_device_queryset(view):
+    """套用與同步列表相同的權限過濾、篩選、搜尋與排序"""
+    # 篩選器驗證（例如類別是否存在）可能需要查詢資料庫，必須在同步環境執行
+    return view.filter_queryset(view.get_queryset())
+
+
+async def _collect(queryset):
+    """以非同步迭代取得查詢結果"""
+    return [obj async for obj in queryset]
+
+
+def _attach_ip_records(devices, records):
+    """將 IP 記錄填入裝置的 prefetch 快取，避免序列化時再查詢"""
+    by_device = {}
+    for record in records:
+        by_device.setdefault(record.device_id, []).append(record)
+    for device in devices:
+        related = by_device.get(device.id, [])
+        for record in related:
+            record.device = device
+        queryset = device.ip_records.all()
+        queryset._result_cache = related
+        queryset._prefetch_done = True
+        device._prefetched_objects_cache = {'ip_records': queryset}
+
+
+@async_api_view
+async def device_list(request):
+    """非同步裝置列表（對應 GET /api/devices/）"""
+    view = _build_viewset(request, 'list')
+    queryset = await sync_to_async(_filtered_device_queryset)(view)
+    mapper = view.get_list_row_mapper()
+    if view.list_fast_path:
+        queryset = queryset.values_list(*mapper.columns)
+
+    pagination = PageNumberPagination()
+    page_size = pagination.get_page_size(request)
+    page_number = request.query_params.get(pagination.page_query_param) or 1
+    try:
+        page_number = int(page_number)
+        if page_number < 1:
+            raise ValueError
+    except (TypeError, ValueError):
+        raise exceptions.NotFound('Invalid page.')
+
+    offset = (page_number - 1) * page_size
+    count, rows = await asyncio.gather(
+        queryset.acount(),
+        _collect(queryset[offset:offset + page_size]),
+    )
+
+    paginator = Paginator(queryset, page_size)
+    paginator.__dict__['count'] = count
+    if page_number > paginator.num_pages:
+        raise exceptions.NotFound('Invalid page.')
+
+    pagination.request = request
+    pagination.page = Page(rows, page_number, paginator)
+    if view.list_fast_path:
+        data = mapper.map_rows(rows)
+    else:
+        data = DeviceListSerializer(rows, many=True, context={'request': request}).data
+    if view.audits_access('list'):
+        view.record_access(request.user, data)
+    return _json_response({
+        'count': count,
+        'next': pagination.get_next_link(),
+        'previous': pagination.get_previous_link(),
+        'results': data,
+    })
+
+
+@async_api_view
+async def device_detail(request, pk):
+    """非同步裝置詳情（對應 GET /api/devices/{id}/），裝置與 IP 記錄同時查詢"""
+    view = _build_viewset(request, 'retrieve')
+    fields, expand = view.get_sparse_params()
+    queryset = view.get_queryset().prefetch_related(None)
+    expanded = 'ip_records' in expand or bool(fields and 'ip_records' in fields)
+
+    try:
+        if expanded:
+            device, records = await asyncio.gather(
+                queryset.aget(pk=pk),
+                _collect(IPRecord.objects.filter(device_id=pk)),
+            )
+            _attach_ip_records([device], records)
+        else:
+            device = await queryset.aget(pk=pk)
+    except Device.DoesNotExist:
+        raise exceptions.NotFound('No Device matches the given query.')
+
+    serializer = DeviceSerializer(
+        device, fields=fields, expand=expand, context={'request': request}
+    )
+    if view.audits_access('retrieve'):
+        view.record_access(request.user, serializer.data)
+    return _json_response(serializer.data)
+
+
+@async_api_view
+async def search_by_ip(request):
+    """非同步 IP 搜尋（對應 GET /api/devices/search_by_ip/）"""
+    ip = request.query_params.get('ip', None)
+    if not ip:
+        return _json_response({'error': '請提供 IP 參數'}, status.HTTP_400_BAD_REQUEST)
+
+    view = _build_viewset(request, 'search_by_ip')
+    fields, expand = view.get_sparse_params()
+    queryset = view.get_queryset().prefetch_related(None)
+    matched = IPRecord.objects.filter(ip_address=ip, is_active=True).values('device_id')
+    expanded = 'ip_records' in expand or bool(fields and 'ip_records' in fields)
+
+    if expanded:
+        devices, records = await asyncio.gather(
+            _collect(queryset.filter(id__in=matched)),
+            _collect(IPRecord.objects.filter(device_id__in=matched)),
+        )
+        _attach_ip_records(devices, records)
+    else:
+        devices = await _collect(queryset.filter(id__in=matched))
+
+    context = {'request': request, 'as_of': view.get_as_of()}
+    if fields is None or 'current_value' in fields:
+        context['valuations'] = await sync_to_async(view.get_valuations)(devices)
+    serializer = DeviceSerializer(
+        devices, many=True, fields=fields, expand=expand, context=context
+    )
+    if view.audits_access('search_by_ip'):
+        view.record_access(request.user, serializer.data)
+    return _json_response(serializer.data)
+
+
+@async_api_view(throttle_scope='ping')
+async def check_ip_available(request):
+    """非同步 IP 可用性檢查（對應 GET /api/ip-records/check_ip_available/）"""
+    ip = request.query_params.get('ip', None)
+    if not ip:
+        return _json_response({'error': '請提供 IP 參數'}, status.HTTP_400_BAD_REQUEST)
+
+    in_use = await IPRecord.objects.filter(ip_address=ip, is_active=True).aexists()
+    return _json_response({
+        'ip_address': ip,
+        'is_available': not in_use,
+    })
+
+
+@async_api_view(throttle_scope='statistics')
+async def dashboard_overview(request):
+    """儀表板總覽：各項統計同時查詢"""
+    view = _build_viewset(request, 'list')
+    devices = view.get_queryset().prefetch_related(None)
+    ip_records = IPRecord.objects.filter(device__in=devices.values('id'))
+    active_ips = ip_records.filter(is_active=True)
+
+    # 一般用戶只能看到自己的操作日誌（與 AuditLogViewSet 相同）
+    logs = get_row_policy(AuditLog).filter_queryset(AuditLog.objects.all(), request.user)
+
+    (
+        status_counts,
+        by_category,
+        totals,
+        active_ip_count,
+        conflict_count,
+        recent_logs,
+    ) = await asyncio.gather(
+        _collect(devices.order_by().values('status').annotate(count=Count('id'))),
+        _collect(
+            devices.order_by().values('category__name')
+            .annotate(count=Count('id'))
+            .values_list('category__name', 'count')
+        ),
+        devices.aaggregate(total=Count('id'), total_cost=Sum('cost')),
+        active_ips.acount(),
+        active_ips.order_by().values('ip_address')
+        .annotate(n=Count('id')).filter(n__gt=1).acount(),
+        _collect(
+            logs.filter(Q(model_name='Device') | Q(model_name='IPRecord'))
+            .order_by('-timestamp')
+            .values('action', 'model_name', 'object_repr', 'timestamp')[:10]
+        ),
+    )
+
+    by_status = {row['status']: row['count'] for row in status_counts}
+    return _json_response({
+        'total_devices': totals['total'],
+        'active_devices': by_status.get('active', 0),
+        'inactive_devices': by_status.get('inactive', 0),
+        'maintenance_devices': by_status.get('maintenance', 0),
+        'retired_devices': by_status.get('retired', 0),
+        'devices_by_category': dict(by_category),
+        'total_cost': totals['total_cost'] or 0,
+        'active_ip_records': active_ip_count,
+        'ip_conflicts': conflict_count,
+        'recent_activity': recent_logs,
+    })
+
+
+@async_api_view
+async def event_stream(request):
+    """伺服器推送事件（SSE）：即時推送裝置、IP 記錄與 IP 衝突的變更"""
+    user = request.user
+    heartbeat = getattr(settings, 'DEVICE_EVENTS', {}).get('HEARTBEAT_INTERVAL', 15)
+
+    async def stream():
+        # 在串流所屬的事件迴圈中訂閱
+        subscription = events.get_backend().subscribe()
+        try:
+            # 斷線後由瀏覽器於 5 秒後自動重連，期間的變更可透過 changes/ 端點補齊
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    # 定期送出註解行，避免代理伺服器關閉閒置連線
+                    yield ': keep-alive\n\n'
+                    continue
+                if events.is_visible(event, user):
+                    yield events.format_sse(event)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,271 @@
+"""
+操作日誌的欄式封存格式
+
+每個封存由兩個檔案組成：
+- 資料檔（*.auditcol）：依 (model_name, object_id, timestamp) 排序後切成固定筆數的區塊，
+  區塊內每個欄位各自以 JSON 編碼並以 zlib 壓縮
+- 索引檔（*.auditcol.idx.json）：記錄每個區塊的位置、各欄位的位移與長度，
+  以及 timestamp、(model_name, object_id) 的最小／最大值與出現過的操作用戶
+
+查詢時先以索引排除不可能符合的區塊，再只讀取與解壓縮需要比對的欄位，
+確定有符合的資料列後才解壓縮其餘欄位。
+"""
+
+import glob
+import heapq
+import itertools
+import json
+import os
+import zlib
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+FORMAT_VERSION = 1
+DATA_SUFFIX = '.auditcol'
+INDEX_SUFFIX = '.auditcol.idx.json'
+DEFAULT_CHUNK_ROWS = 4096
+
+COLUMNS = (
+    'id', 'user_id', 'action', 'model_name', 'object_id',
+    'object_repr', 'changes', 'ip_address', 'user_agent', 'timestamp',
+)
+# 比對條件使用的欄位，其餘欄位只在區塊內有符合的資料列時才解壓縮
+FILTER_COLUMNS = ('user_id', 'model_name', 'object_id', 'timestamp')
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def to_micros(value):
+    """日期時間轉為 UTC 微秒整數"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt_timezone.utc)
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def from_micros(value):
+    return datetime.fromtimestamp(value / 1_000_000, tz=dt_timezone.utc)
+
+
+def _encode_column(values):
+    raw = json.dumps(values, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+    return zlib.compress(raw.encode('utf-8'), 6)
+
+
+def _decode_column(data):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+def index_path(data_path):
+    return data_path[:-len(DATA_SUFFIX)] + INDEX_SUFFIX
+
+
+class ArchiveWriter:
+    """依序寫入已排序的日誌資料列，每累積 chunk_rows 筆寫出一個區塊"""
+
+    def __init__(self, path, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.chunks = []
+        self.rows = 0
+        self._buffer = []
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(f'{path}.tmp', 'wb')
+
+    def write(self, row):
+        self._buffer.append(row)
+        if len(self._buffer) >= self.chunk_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        columns = {name: [row.get(name) for row in rows] for name in COLUMNS}
+        columns['timestamp'] = [to_micros(value) for value in columns['timestamp']]
+
+        offset = self._file.tell()
+        layout = {}
+        for name in COLUMNS:
+            data = _encode_column(columns[name])
+            layout[name] = [self._file.tell() - offset, len(data)]
+            self._file.write(data)
+
+        objects = [[row['model_name'], str(row['object_id'])] for row in rows]
+        self.chunks.append({
+            'offset': offset,
+            'length': self._file.tell() - offset,
+            'rows': len(rows),
+            'columns': layout,
+            'timestamp_min': min(columns['timestamp']),
+            'timestamp_max': max(columns['timestamp']),
+            'object_min': min(objects),
+            'object_max': max(objects),
+            'users': sorted({user for user in columns['user_id'] if user is not None}),
+        })
+        self.rows += len(rows)
+
+    def close(self):
+        """寫出剩餘資料與索引，以暫存檔取代的方式確保封存完整"""
+        self._flush()
+        self._file.close()
+        index = {
+            'version': FORMAT_VERSION,
+            'rows': self.rows,
+            'columns': list(COLUMNS),
+            'timestamp_min': min((c['timestamp_min'] for c in self.chunks), default=None),
+            'timestamp_max': max((c['timestamp_max'] for c in self.chunks), default=None),
+            'chunks': self.chunks,
+        }
+        with open(f'{index_path(self.path)}.tmp', 'w', encoding='utf-8') as output:
+            json.dump(index, output, separators=(',', ':'))
+        os.replace(f'{self.path}.tmp', self.path)
+        os.replace(f'{index_path(self.path)}.tmp', index_path(self.path))
+        return self.rows
+
+
+def write_archive(rows, path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """將已依 (model_name, object_id, timestamp) 排序的資料列寫為欄式封存，回傳筆數"""
+    writer = ArchiveWriter(path, chunk_rows)
+    try:
+        for row in rows:
+            writer.write(row)
+    except BaseException:
+        writer._file.close()
+        os.remove(f'{path}.tmp')
+        raise
+    return writer.close()
+
+
+def export_queryset(queryset, path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """以伺服器端游標將查詢集寫為欄式封存"""
+    rows = (
+        queryset.order_by('model_name', 'object_id', 'timestamp', 'id')
+        .values(*COLUMNS)
+        .iterator(chunk_size=2000)
+    )
+    return write_archive(rows, path, chunk_rows)
+
+
+class ArchiveQuery:
+    """封存查詢條件，時間範圍為 [since, until)"""
+
+    def __init__(self, model_name=None, object_id=None, user_id=None, since=None, until=None):
+        self.model_name = model_name
+        self.object_id = None if object_id is None else str(object_id)
+        self.user_id = user_id
+        self.since = None if since is None else to_micros(since)
+        self.until = None if until is None else to_micros(until)
+
+    def overlaps(self, entry):
+        """以索引的最小／最大值判斷區塊（或整個檔案）是否可能有符合的資料"""
+        if entry.get('timestamp_min') is None:
+            return False
+        if self.since is not None and entry['timestamp_max'] < self.since:
+            return False
+        if self.until is not None and entry['timestamp_min'] >= self.until:
+            return False
+        if 'object_min' in entry and self.model_name is not None:
+            if self.object_id is not None:
+                key = [self.model_name, self.object_id]
+                if not entry['object_min'] <= key <= entry['object_max']:
+                    return False
+            elif not entry['object_min'][0] <= self.model_name <= entry['object_max'][0]:
+                return False
+        if 'users' in entry and self.user_id is not None and self.user_id not in entry['users']:
+            return False
+        return True
+
+    def matches(self, user_id, model_name, object_id, timestamp):
+        if self.since is not None and timestamp < self.since:
+            return False
+        if self.until is not None and timestamp >= self.until:
+            return False
+        if self.model_name is not None and model_name != self.model_name:
+            return False
+        if self.object_id is not None and str(object_id) != self.object_id:
+            return False
+        if self.user_id is not None and user_id != self.user_id:
+            return False
+        return True
+
+
+class ArchiveReader:
+    """讀取單一欄式封存"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(index_path(path), encoding='utf-8') as source:
+            self.index = json.load(source)
+        if self.index.get('version') != FORMAT_VERSION:
+            raise ValueError(f'不支援的封存版本：{self.index.get("version")}')
+        self.stats = {'chunks': len(self.index['chunks']), 'chunks_read': 0}
+
+    def search(self, query):
+        """逐區塊產生符合條件的資料列"""
+        if not query.overlaps(self.index):
+            return
+        with open(self.path, 'rb') as source:
+            for chunk in self.index['chunks']:
+                if not query.overlaps(chunk):
+                    continue
+                self.stats['chunks_read'] += 1
+                yield from self._search_chunk(source, chunk, query)
+
+    @staticmethod
+    def _read_column(source, chunk, name):
+        offset, length = chunk['columns'][name]
+        source.seek(chunk['offset'] + offset)
+        return _decode_column(source.read(length))
+
+    def _search_chunk(self, source, chunk, query):
+        columns = {name: self._read_column(source, chunk, name) for name in FILTER_COLUMNS}
+        positions = [
+            position for position, values in enumerate(zip(*(columns[n] for n in FILTER_COLUMNS)))
+            if query.matches(*values)
+        ]
+        if not positions:
+            return
+        for name in COLUMNS:
+            if name not in columns:
+                columns[name] = self._read_column(source, chunk, name)
+        for position in positions:
+            row = {name: columns[name][position] for name in COLUMNS}
+            row['timestamp'] = from_micros(row['timestamp'])
+            yield row
+
+
+def archive_files(archive_dir):
+    return sorted(glob.glob(os.path.join(archive_dir, f'*{DATA_SUFFIX}')))
+
+
+def search_archives(archive_dir, query, limit=None):
+    """
+    搜尋目錄下的所有封存，依時間由新到舊回傳最多 limit 筆，並附上讀取統計
+
+    有 limit 時邊讀取邊保留最新的 limit 筆（最小堆積），記憶體用量不隨符合的筆數增加
+    """
+    stats = {'files': 0, 'files_read': 0, 'chunks': 0, 'chunks_read': 0}
+    # (時間, ID, 讀取順序, 資料列)；堆積頂端是目前保留的資料中最舊的一筆
+    heap = []
+    sequence = itertools.count()
+    for path in archive_files(archive_dir):
+        reader = ArchiveReader(path)
+        stats['files'] += 1
+        stats['chunks'] += reader.stats['chunks']
+        if not query.overlaps(reader.index):
+            continue
+        stats['files_read'] += 1
+        for row in reader.search(query):
+            entry = (row['timestamp'], row['id'], next(sequence), row)
+            if limit is None or len(heap) < limit:
+                heapq.heappush(heap, entry)
+            elif heap and entry[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, entry)
+        stats['chunks_read'] += reader.stats['chunks_read']
+
+    rows = [row for *_, row in sorted(heap, key=lambda entry: entry[:2], reverse=True)]
+    return rows, stats
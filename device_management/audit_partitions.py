@@ -0,0 +1,224 @@
+"""
+操作日誌的分割與保存期限
+
+PostgreSQL：device_management_auditlog 為依 timestamp 按月分割的資料表，
+查詢帶有時間範圍時只會掃描相關的分割區；過期的分割區匯出後直接卸除，不需逐列刪除。
+
+其他資料庫：不支援宣告式分割，改以 AuditLogArchive 作為滾動封存表，
+熱資料表只保留最近幾個月，較舊的資料分批移入封存表，過期後再匯出刪除。
+
+匯出格式為每月一個 gzip 壓縮的 JSONL 檔案（auditlog-YYYY-MM.jsonl.gz）。
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+PARENT_TABLE = 'device_management_auditlog'
+
+
+def uses_partitions(conn=connection):
+    """目前的資料庫是否使用宣告式分割"""
+    return conn.vendor == 'postgresql'
+
+
+def month_start(value):
+    """取得 value 所在月份的第一天（UTC）"""
+    value = value.astimezone(dt_timezone.utc) if value.tzinfo else value.replace(tzinfo=dt_timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    """月份加減，month 必須是月初"""
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f'{PARENT_TABLE}_p{month:%Y_%m}'
+
+
+def _quote(conn, name):
+    return conn.ops.quote_name(name)
+
+
+def list_partitions(conn=connection):
+    """列出月分割區，回傳 [(名稱, 月初)]，不含預設分割區"""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = %s
+            """,
+            [PARENT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    prefix = f'{PARENT_TABLE}_p'
+    partitions = []
+    for name in names:
+        if not name.startswith(prefix):
+            continue
+        month = datetime.strptime(name[len(prefix):], '%Y_%m').replace(tzinfo=dt_timezone.utc)
+        partitions.append((name, month))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def create_partition(month, conn=connection):
+    """建立指定月份的分割區；預設分割區中屬於該月的資料會一併移入"""
+    parent = _quote(conn, PARENT_TABLE)
+    default = _quote(conn, f'{PARENT_TABLE}_default')
+    partition = _quote(conn, partition_name(month))
+    bounds = [month, add_months(month, 1)]
+
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_class WHERE relname = %s', [partition_name(month)]
+        )
+        if cursor.fetchone():
+            return False
+
+        # 預設分割區若已有該月資料，直接建立分割區會失敗，須先卸離再搬移
+        cursor.execute(f'ALTER TABLE {parent} DETACH PARTITION {default}')
+        cursor.execute(
+            f'CREATE TABLE {partition} PARTITION OF {parent} FOR VALUES FROM (%s) TO (%s)',
+            bounds,
+        )
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {default} WHERE "timestamp" >= %s AND "timestamp" < %s '
+            f'RETURNING *) INSERT INTO {parent} SELECT * FROM moved',
+            bounds,
+        )
+        cursor.execute(f'ALTER TABLE {parent} ATTACH PARTITION {default} DEFAULT')
+    return True
+
+
+def ensure_partitions(months_ahead=3, conn=connection, now=None):
+    """確保本月與未來 months_ahead 個月的分割區存在，回傳新建立的分割區數"""
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    return sum(
+        create_partition(add_months(current, offset), conn)
+        for offset in range(months_ahead + 1)
+    )
+
+
+def convert_to_partitioned(conn, months_ahead=3):
+    """將既有的操作日誌資料表轉為依月分割的資料表（僅供遷移使用）"""
+    table = _quote(conn, PARENT_TABLE)
+    legacy_name = f'{PARENT_TABLE}_legacy'
+    legacy = _quote(conn, legacy_name)
+
+    with conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s',
+            [PARENT_TABLE, f'{PARENT_TABLE}_pkey'],
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            f'PARTITION BY RANGE ("timestamp")'
+        )
+        # 分割表的唯一鍵必須包含分割欄位
+        cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, "timestamp")')
+        cursor.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT {_quote(conn, PARENT_TABLE + "_user_id_fk")} '
+            f'FOREIGN KEY (user_id) REFERENCES {_quote(conn, "auth_user")} (id) '
+            f'DEFERRABLE INITIALLY DEFERRED'
+        )
+        cursor.execute(
+            f'CREATE TABLE {_quote(conn, PARENT_TABLE + "_default")} PARTITION OF {table} DEFAULT'
+        )
+
+        cursor.execute(f'SELECT MIN("timestamp") FROM {legacy}')
+        oldest = cursor.fetchone()[0]
+        first = month_start(oldest) if oldest else month_start(datetime.now(dt_timezone.utc))
+        last = add_months(month_start(datetime.now(dt_timezone.utc)), months_ahead)
+        month = first
+        while month <= last:
+            cursor.execute(
+                f'CREATE TABLE {_quote(conn, partition_name(month))} PARTITION OF {table} '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [month, add_months(month, 1)],
+            )
+            month = add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO {table} SELECT * FROM {legacy}')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) "
+            f'FROM {table}',
+            [PARENT_TABLE],
+        )
+        cursor.execute(f'DROP TABLE {legacy}')
+
+        # 索引建立於父資料表，會自動套用到每個分割區
+        for definition in index_definitions:
+            cursor.execute(definition)
+
+
+def revert_partitioned(conn):
+    """將分割表還原為一般資料表（僅供遷移回復使用）"""
+    table = _quote(conn, PARENT_TABLE)
+    legacy = _quote(conn, f'{PARENT_TABLE}_partitioned')
+
+    with conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s',
+            [PARENT_TABLE, f'{PARENT_TABLE}_pkey'],
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING IDENTITY)'
+        )
+        cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id)')
+        cursor.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT {_quote(conn, PARENT_TABLE + "_user_id_fk")} '
+            f'FOREIGN KEY (user_id) REFERENCES {_quote(conn, "auth_user")} (id) '
+            f'DEFERRABLE INITIALLY DEFERRED'
+        )
+        cursor.execute(f'INSERT INTO {table} SELECT * FROM {legacy}')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) "
+            f'FROM {table}',
+            [PARENT_TABLE],
+        )
+        cursor.execute(f'DROP TABLE {legacy} CASCADE')
+        for definition in index_definitions:
+            cursor.execute(definition)
+
+
+def export_rows(queryset, path, fields):
+    """以伺服器端游標逐列匯出為 gzip 壓縮的 JSONL，先寫入暫存檔再取代，回傳匯出筆數"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f'{path}.tmp'
+    count = 0
+    with gzip.open(temporary, 'wt', encoding='utf-8') as output:
+        for row in queryset.values(*fields).iterator(chunk_size=2000):
+            output.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+            output.write('\n')
+            count += 1
+    os.replace(temporary, path)
+    return count
+
+
+def archive_path(output_dir, month):
+    return os.path.join(output_dir, f'auditlog-{month:%Y-%m}.jsonl.gz')
+
+
+def drop_partition(name, conn=connection):
+    """卸離並刪除分割區"""
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        cursor.execute(
+            f'ALTER TABLE {_quote(conn, PARENT_TABLE)} DETACH PARTITION {_quote(conn, name)}'
+        )
+        cursor.execute(f'DROP TABLE {_quote(conn, name)}')
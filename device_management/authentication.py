@@ -0,0 +1,214 @@
+"""
+API 權杖認證
+
+機器用戶端以 `Authorization: Bearer <權杖>` 呼叫 API，不需每次進行密碼雜湊驗證。
+資料庫只保存權杖的 SHA-256 雜湊；驗證時依序查詢：
+1. 行程內快取（LRU，存活 LOCAL_TTL 秒）
+2. 共用快取（存活 CACHE_TTL 秒）
+3. 資料庫（同時更新最後使用時間）
+
+撤銷權杖或變更用戶時立即清除共用快取與本行程的快取，
+其他行程的行程內快取最多在 LOCAL_TTL 秒後失效。
+
+可透過 settings.API_TOKEN 設定 CACHE、CACHE_TTL、LOCAL_TTL 與 LOCAL_MAX_SIZE。
+"""
+
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .models import APIToken
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'CACHE_TTL': 300,
+    'LOCAL_TTL': 10,
+    'LOCAL_MAX_SIZE': 10000,
+}
+
+TOKEN_PREFIX = 'ipac_'
+CACHE_KEY = 'apitoken:{}'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'API_TOKEN', {})}
+
+
+def hash_token(token):
+    """權杖本身為高熵隨機字串，以 SHA-256 雜湊即可安全保存與查詢"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_token(user, name, expires_in=None):
+    """建立權杖，回傳 (APIToken, 原始權杖)；原始權杖不會保存"""
+    token = TOKEN_PREFIX + secrets.token_urlsafe(32)
+    instance = APIToken.objects.create(
+        user=user,
+        name=name,
+        prefix=token[:12],
+        key_hash=hash_token(token),
+        expires_at=timezone.now() + expires_in if expires_in else None,
+    )
+    return instance, token
+
+
+class PrincipalCache:
+    """行程內的權杖主體快取（依存活時間與 LRU 淘汰）"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+@lru_cache(maxsize=None)
+def get_local_cache():
+    """依 settings.API_TOKEN 建立行程內快取（每個行程一個實例）"""
+    return PrincipalCache(get_config()['LOCAL_MAX_SIZE'])
+
+
+def _ttl(principal, limit):
+    """快取存活時間不超過權杖的剩餘有效期"""
+    if principal['expires_at'] is None:
+        return limit
+    return min(limit, principal['expires_at'] - time.time())
+
+
+def _load_principal(key_hash):
+    """從資料庫查詢權杖與用戶，並更新最後使用時間"""
+    token = (
+        APIToken.objects.select_related('user')
+        .filter(key_hash=key_hash, revoked_at__isnull=True)
+        .first()
+    )
+    if token is None or not token.is_active or not token.user.is_active:
+        return None
+    APIToken.objects.filter(pk=token.pk).update(last_used_at=timezone.now())
+    return {
+        'token_id': token.pk,
+        'user_id': token.user_id,
+        'username': token.user.username,
+        'is_staff': token.user.is_staff,
+        'is_superuser': token.user.is_superuser,
+        'expires_at': token.expires_at.timestamp() if token.expires_at else None,
+    }
+
+
+def resolve_principal(token):
+    """取得權杖對應的主體；權杖無效、過期或已撤銷時回傳 None"""
+    config = get_config()
+    key_hash = hash_token(token)
+    local = get_local_cache()
+    principal = local.get(key_hash)
+    if principal is None:
+        shared = caches[config['CACHE']]
+        principal = shared.get(CACHE_KEY.format(key_hash))
+        if principal is None:
+            principal = _load_principal(key_hash)
+            if principal is None:
+                return None
+            shared.set(CACHE_KEY.format(key_hash), principal, _ttl(principal, config['CACHE_TTL']))
+        local.set(key_hash, principal, _ttl(principal, config['LOCAL_TTL']))
+
+    if principal['expires_at'] is not None and principal['expires_at'] <= time.time():
+        return None
+    return principal
+
+
+def invalidate(key_hashes):
+    """清除共用快取與本行程快取中的權杖主體"""
+    key_hashes = list(key_hashes)
+    if not key_hashes:
+        return
+    caches[get_config()['CACHE']].delete_many([CACHE_KEY.format(key) for key in key_hashes])
+    local = get_local_cache()
+    for key in key_hashes:
+        local.discard(key)
+
+
+def revoke_tokens(queryset):
+    """撤銷權杖並立即清除快取，回傳撤銷的數量"""
+    key_hashes = list(queryset.filter(revoked_at__isnull=True).values_list('key_hash', flat=True))
+    count = APIToken.objects.filter(key_hash__in=key_hashes).update(revoked_at=timezone.now())
+    invalidate(key_hashes)
+    return count
+
+
+def _refuse_save(*args, **kwargs):
+    raise RuntimeError('權杖認證的用戶物件只包含身分欄位，請重新查詢後再儲存')
+
+
+def build_user(principal):
+    """由快取的主體建立用戶物件（不查詢資料庫）"""
+    user = User(
+        id=principal['user_id'],
+        username=principal['username'],
+        is_staff=principal['is_staff'],
+        is_superuser=principal['is_superuser'],
+        is_active=True,
+    )
+    user._state.adding = False
+    user._state.db = User.objects.db
+    user.save = _refuse_save
+    return user
+
+
+class TokenAuthentication(BaseAuthentication):
+    """以 Authorization: Bearer <權杖>（或 Token <權杖>）認證"""
+    keywords = ('bearer', 'token')
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower().decode(errors='ignore') not in self.keywords:
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('無效的權杖標頭')
+        try:
+            token = auth[1].decode('ascii')
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('無效的權杖標頭')
+
+        principal = resolve_principal(token)
+        if principal is None:
+            raise exceptions.AuthenticationFailed('權杖無效、已過期或已撤銷')
+        return build_user(principal), principal
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
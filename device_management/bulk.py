@@ -0,0 +1,275 @@
+"""
+集合式批次操作
+
+Admin 批次動作（以及其他大量變更）以集合式 SQL 完成，不逐筆載入與儲存模型：
+1. 鎖定並讀取要變更的資料列的主鍵與負責人（推送事件用）
+2. 以一次 INSERT ... SELECT 由資料表本身產生操作日誌（舊值在 UPDATE 前讀取）
+3. 以一次 UPDATE 寫入新值並更新 updated_at（增量同步與條件式請求依此判斷變更）
+4. 交易提交後依負責人分組推送 *.bulk_updated 事件（不逐筆推送）
+
+QuerySet.update() 不會觸發 post_save，日誌與事件都由此模組負責。
+IP 記錄的刪除同樣以集合式 SQL 完成（delete_ip_records），推送 ip_record.bulk_deleted 事件。
+"""
+
+from collections import defaultdict
+
+from django.db import NotSupportedError, connections, models, transaction
+from django.db.models import Case, F, Func, Value, When
+from django.db.models.functions import Cast, Coalesce, Concat, JSONObject, Left
+from django.utils import timezone
+
+from . import events
+from .models import AuditLog, Device, IPRecord, Tombstone
+from .permissions import get_row_policy
+
+EVENT_BATCH_SIZE = 1000
+
+# 各模型的操作日誌顯示名稱（與模型的 __str__ 一致）與事件前綴
+OBJECT_REPRS = {
+    Device: lambda: Concat('name', Value(' ('), 'serial_number', Value(')'), output_field=models.TextField()),
+    IPRecord: lambda: Concat('device__name', Value(' - '), 'ip_address', output_field=models.TextField()),
+}
+EVENT_PREFIXES = {
+    Device: 'device',
+    IPRecord: 'ip_record',
+}
+
+
+def client_info(request):
+    """取得操作來源 IP 與用戶代理（與 ViewSet 的操作日誌相同）"""
+    if request is None:
+        return None, ''
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    ip = forwarded.split(',')[0] if forwarded else request.META.get('REMOTE_ADDR')
+    return ip, request.META.get('HTTP_USER_AGENT', '')
+
+
+def _typed(value, field):
+    """SELECT 清單中的參數需明確轉型，PostgreSQL 才能寫入 inet、jsonb 等欄位"""
+    return Cast(Value(value, output_field=field), field)
+
+
+def _old_value(model, name, labels):
+    """以 SQL 產生欄位舊值的字串（與單筆更新日誌的 str(舊值) 相同）"""
+    field = model._meta.get_field(name)
+    if field.is_relation:
+        return Case(
+            *[When(**{field.attname: pk}, then=Value(label)) for pk, label in labels.items()],
+            default=Value('None'),
+            output_field=models.TextField(),
+        )
+    if isinstance(field, models.BooleanField):
+        return Case(
+            When(**{name: True}, then=Value('True')),
+            When(**{name: False}, then=Value('False')),
+            default=Value('None'),
+            output_field=models.TextField(),
+        )
+    return Coalesce(Cast(name, models.TextField()), Value('None'))
+
+
+class JSONAppend(Func):
+    """在 UPDATE 中將 JSON 物件附加到 JSON 陣列欄位的結尾（空值視為空陣列），不需讀出整個陣列再寫回"""
+    output_field = models.JSONField()
+    
+    def __init__(self, array, item):
+        super().__init__(array, item)
+    
+    def _compile(self, compiler):
+        array, array_params = compiler.compile(self.source_expressions[0])
+        item, item_params = compiler.compile(self.source_expressions[1])
+        return array, item, [*array_params, *item_params]
+    
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(f'JSONAppend 不支援 {connection.vendor}')
+    
+    def as_postgresql(self, compiler, connection, **extra_context):
+        array, item, params = self._compile(compiler)
+        return f"COALESCE({array}, '[]'::jsonb) || jsonb_build_array({item})", params
+    
+    def as_sqlite(self, compiler, connection, **extra_context):
+        array, item, params = self._compile(compiler)
+        return f"json_insert(COALESCE({array}, '[]'), '$[#]', json({item}))", params
+    
+    def as_mysql(self, compiler, connection, **extra_context):
+        array, item, params = self._compile(compiler)
+        return f"JSON_ARRAY_APPEND(COALESCE({array}, JSON_ARRAY()), '$', {item})", params
+
+
+def insert_audit_logs(queryset, action, user, request=None, changes=None, labels=None, details=None):
+    """
+    以一次 INSERT ... SELECT 為查詢集的每一列寫入操作日誌
+
+    changes 為 {欄位: 新值}，日誌內容為 {欄位: {'old': 舊值, 'new': 新值}}；
+    labels 為外鍵欄位的 {主鍵: 顯示名稱}；
+    details 為每一列相同的日誌內容（沒有單一欄位舊值的變更，如標籤）
+    """
+    model = queryset.model
+    labels = labels or {}
+    ip_address, user_agent = client_info(request)
+    if changes:
+        change_log = JSONObject(**{
+            name: JSONObject(
+                old=_old_value(model, name, labels.get(name, {})),
+                new=Value(str(labels[name].get(getattr(value, 'pk', value)) if name in labels else value)),
+            )
+            for name, value in changes.items()
+        })
+    else:
+        change_log = _typed(details, models.JSONField())
+
+    columns = {
+        'user': _typed(user.pk if user else None, models.BigIntegerField()),
+        'action': Value(action),
+        'model_name': Value(model.__name__),
+        'object_id': Cast('pk', models.CharField(max_length=100)),
+        'object_pk': F('pk'),
+        'object_repr': Left(OBJECT_REPRS[model](), 200),
+        'changes': change_log,
+        'ip_address': _typed(ip_address, models.GenericIPAddressField()),
+        'user_agent': Value(user_agent),
+        'timestamp': _typed(timezone.now(), models.DateTimeField()),
+    }
+    select = (
+        queryset.select_related(None).order_by()
+        .annotate(**{f'audit_{name}': expression for name, expression in columns.items()})
+        .values(*[f'audit_{name}' for name in columns])
+    )
+    sql, params = select.query.sql_with_params()
+    conn = connections[queryset.db]
+    table = conn.ops.quote_name(AuditLog._meta.db_table)
+    names = ', '.join(conn.ops.quote_name(AuditLog._meta.get_field(name).column) for name in columns)
+    with conn.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({names}) {sql}', params)
+        return cursor.rowcount
+
+
+def publish_bulk_events(model, rows, changes, new_owner=None):
+    """
+    交易提交後依負責人分組推送 *.bulk_updated 事件
+
+    rows 為 (主鍵, 負責人 ID)；每位負責人只會收到自己的資料列 ID。
+    重新指派時 new_owner 為新的負責人 ID，原負責人與新負責人都會收到事件
+    """
+    data = {name: None if value is None else str(value) for name, value in changes.items()}
+    _publish_by_owner(f'{EVENT_PREFIXES[model]}.bulk_updated', rows, new_owner, changes=data)
+
+
+def _publish_by_owner(event_type, rows, new_owner=None, **data):
+    """rows 為 (主鍵, 負責人 ID)，依負責人分組、每批最多 EVENT_BATCH_SIZE 個 ID 推送事件"""
+    groups = defaultdict(list)
+    for pk, owner in rows:
+        groups[owner].append(pk)
+    for owner, ids in groups.items():
+        owners = [owner] if new_owner is None else [owner, new_owner]
+        for start in range(0, len(ids), EVENT_BATCH_SIZE):
+            events.publish_on_commit(
+                event_type, owners, ids=ids[start:start + EVENT_BATCH_SIZE], **data
+            )
+
+
+def bulk_update(queryset, changes, user, request=None):
+    """
+    以單一 UPDATE 變更查詢集的欄位，並以集合式 SQL 寫入操作日誌、推送事件
+
+    已是目標值的資料列不會更新也不記錄；回傳實際變更的數量
+    """
+    model = queryset.model
+    policy = get_row_policy(model)
+    values = {name: getattr(value, 'pk', value) for name, value in changes.items()}
+    relations = [name for name in changes if model._meta.get_field(name).is_relation]
+    # 不需要 Admin 列表的 JOIN 與排序
+    targets = queryset.select_related(None).order_by().exclude(**changes)
+
+    with transaction.atomic():
+        # 鎖定資料列，避免讀取舊值後被其他交易修改
+        rows = list(
+            targets.select_for_update(of=('self',))
+            .values_list('pk', policy.lookup, *[model._meta.get_field(name).attname for name in relations])
+        )
+        if not rows:
+            return 0
+
+        labels = {}
+        for index, name in enumerate(relations, start=2):
+            related = model._meta.get_field(name).related_model
+            ids = {row[index] for row in rows} | {values[name]}
+            ids.discard(None)
+            labels[name] = {pk: str(obj) for pk, obj in related.objects.in_bulk(ids).items()}
+
+        insert_audit_logs(targets, 'update', user, request, changes, labels)
+        count = targets.update(**changes, updated_at=timezone.now())
+        publish_bulk_events(
+            model, [row[:2] for row in rows], values, new_owner=values.get(policy.owner_path)
+        )
+    return count
+
+
+def retire_devices(queryset, user, request=None, retirement_date=None):
+    """
+    報廢裝置：停用其啟用中的 IP 記錄，並將狀態改為已報廢、報廢日期設為今天
+
+    兩個 UPDATE 在同一交易內完成，回傳 (報廢的裝置數, 停用的 IP 記錄數)
+    """
+    devices = queryset.exclude(status='retired')
+    with transaction.atomic():
+        # 先以子查詢停用 IP（裝置狀態更新後就無法以 status 篩選出這批裝置）
+        ip_count = bulk_update(
+            IPRecord.objects.filter(device__in=devices.order_by().values('pk'), is_active=True),
+            {'is_active': False}, user, request,
+        )
+        device_count = bulk_update(
+            devices,
+            {'status': 'retired', 'retirement_date': retirement_date or timezone.localdate()},
+            user, request,
+        )
+    return device_count, ip_count
+
+
+def log_deletions(queryset, user, request=None):
+    """刪除前以一次 INSERT ... SELECT 寫入刪除日誌"""
+    return insert_audit_logs(queryset, 'delete', user, request)
+
+
+def delete_ip_records(queryset, user, request=None):
+    """
+    以集合式 SQL 刪除 IP 記錄，回傳刪除的數量
+
+    一次 INSERT ... SELECT 寫入刪除日誌、一次批次寫入刪除記錄（Tombstone），
+    交易提交後依負責人分組推送 ip_record.bulk_deleted 事件；
+    以單一 DELETE 刪除，不逐筆觸發 post_delete（IP 記錄沒有連帶刪除的關聯）
+    """
+    policy = get_row_policy(IPRecord)
+    queryset = queryset.select_related(None).order_by()
+    with transaction.atomic():
+        rows = list(queryset.select_for_update(of=('self',)).values_list('pk', policy.lookup))
+        if not rows:
+            return 0
+        insert_audit_logs(queryset, 'delete', user, request)
+        Tombstone.objects.bulk_create(
+            [Tombstone(model_name='IPRecord', object_id=pk, owner_id=owner) for pk, owner in rows],
+            batch_size=EVENT_BATCH_SIZE,
+        )
+        pks = [pk for pk, _ in rows]
+        for start in range(0, len(pks), EVENT_BATCH_SIZE):
+            IPRecord.objects.filter(pk__in=pks[start:start + EVENT_BATCH_SIZE])._raw_delete(queryset.db)
+        _publish_by_owner('ip_record.bulk_deleted', rows)
+    return len(rows)
+
+
+def delete(queryset, user, request=None):
+    """
+    刪除查詢集並寫入刪除日誌
+
+    裝置的 IP 記錄先以 delete_ip_records 集合式刪除，裝置的連帶刪除就不會逐筆處理 IP 記錄
+    """
+    with transaction.atomic():
+        if queryset.model is IPRecord:
+            delete_ip_records(queryset, user, request)
+            return
+        if queryset.model is Device:
+            delete_ip_records(
+                IPRecord.objects.filter(device__in=queryset.order_by().values('pk')), user, request
+            )
+        log_deletions(queryset, user, request)
+        queryset.delete()
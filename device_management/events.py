@@ -0,0 +1,185 @@
+"""
+即時事件廣播
+
+資料變更在交易提交後發布為事件，由 SSE 端點（GET /api/events/stream/）推送給前端。
+發布端為同步程式碼（Model signals），訂閱端為 ASGI 事件迴圈中的非同步串流。
+
+後端可透過 settings.DEVICE_EVENTS 抽換：
+- InMemoryBackend：單一行程內廣播，適用開發、測試與單一 worker 部署
+- RedisBackend：透過 Redis Pub/Sub 在多個 worker 之間廣播，每個行程再於本地分送
+"""
+
+import asyncio
+import itertools
+import json
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .permissions import is_admin
+
+DEFAULT_BACKEND = 'device_management.events.InMemoryBackend'
+
+
+class Subscription:
+    """單一訂閱者的事件佇列，綁定建立時的事件迴圈"""
+
+    def __init__(self, backend, max_queue_size):
+        self._backend = backend
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=max_queue_size)
+        self.dropped = 0
+
+    def put(self, event):
+        """可從任何執行緒呼叫，事件會排入訂閱者所屬的事件迴圈"""
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # 事件迴圈已關閉，訂閱者已離線
+            self.close()
+
+    def _put(self, event):
+        if self._queue.full():
+            # 消費過慢時丟棄最舊的事件，避免拖累其他訂閱者
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    async def get(self):
+        return await self._queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+    def close(self):
+        self._backend.unsubscribe(self)
+
+
+class InMemoryBackend:
+    """單一行程內的事件廣播"""
+
+    def __init__(self, max_queue_size=256):
+        self.max_queue_size = max_queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        """將事件分送給本行程的所有訂閱者"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def subscribe(self):
+        """建立訂閱，必須在事件迴圈中呼叫"""
+        subscription = Subscription(self, self.max_queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+
+class RedisBackend(InMemoryBackend):
+    """透過 Redis Pub/Sub 在多個 worker 之間廣播（需安裝 redis 套件）"""
+
+    def __init__(self, url='redis://localhost:6379/0', channel='ipac:events', max_queue_size=256):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError('RedisBackend 需要安裝 redis 套件：pip install redis')
+        super().__init__(max_queue_size=max_queue_size)
+        self.url = url
+        self.channel = channel
+        self._client = redis.Redis.from_url(url)
+        self._listeners = {}
+
+    def publish(self, event):
+        """發布至 Redis，由各 worker 的監聽工作分送給本地訂閱者"""
+        self._client.publish(self.channel, json.dumps(event, default=str))
+
+    def subscribe(self):
+        """建立訂閱，並確保目前的事件迴圈已有監聽工作"""
+        loop = asyncio.get_running_loop()
+        listener = self._listeners.get(loop)
+        if listener is None or listener.done():
+            self._listeners[loop] = loop.create_task(self._listen())
+        return super().subscribe()
+
+    async def _listen(self):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for message in pubsub.listen():
+                if message.get('type') == 'message':
+                    super().publish(json.loads(message['data']))
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    """依 settings.DEVICE_EVENTS 建立事件後端（每個行程一個實例）"""
+    config = getattr(settings, 'DEVICE_EVENTS', {})
+    backend_class = import_string(config.get('BACKEND', DEFAULT_BACKEND))
+    return backend_class(**config.get('OPTIONS', {}))
+
+
+_sequence = itertools.count(1)
+
+
+def build_event(event_type, owners=(), **data):
+    """建立事件；owners 為可看到此事件的負責人 ID，管理員可看到所有事件"""
+    return {
+        'id': next(_sequence),
+        'type': event_type,
+        'owners': [owner for owner in owners if owner is not None],
+        'timestamp': timezone.now().isoformat(),
+        'data': data,
+    }
+
+
+def publish(event_type, owners=(), **data):
+    """立即發布事件"""
+    get_backend().publish(build_event(event_type, owners, **data))
+
+
+def publish_on_commit(event_type, owners=(), **data):
+    """在目前的交易提交後發布事件；交易回滾時不會發布"""
+    event = build_event(event_type, owners, **data)
+    transaction.on_commit(lambda: get_backend().publish(event))
+
+
+def is_visible(event, user):
+    """判斷使用者是否能看到此事件"""
+    if is_admin(user):
+        return True
+    return user.pk in event['owners']
+
+
+def format_sse(event):
+    """將事件編碼為 SSE 訊息"""
+    payload = json.dumps(
+        {key: value for key, value in event.items() if key != 'owners'},
+        ensure_ascii=False,
+        separators=(',', ':'),
+        default=str,
+    )
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
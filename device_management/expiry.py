@@ -0,0 +1,78 @@
+"""
+保固與報廢到期查詢
+
+warranty_end_date 與 retirement_date 皆有索引，到期查詢以日期範圍掃描，不需全表掃描。
+已報廢（status='retired'）的裝置不列入到期提醒。
+"""
+
+from datetime import timedelta
+from itertools import groupby
+
+from django.db.models import Q
+from django.utils import timezone
+
+# ?kind= 對應的到期欄位
+EXPIRY_FIELDS = {
+    'warranty': 'warranty_end_date',
+    'retirement': 'retirement_date',
+}
+
+EXPIRY_LABELS = {
+    'warranty': '保固到期',
+    'retirement': '預計報廢',
+}
+
+
+def window(days, today=None):
+    """到期查詢的日期範圍（含今天與第 days 天）"""
+    today = today or timezone.localdate()
+    return today, today + timedelta(days=days)
+
+
+def expiring(queryset, kind, days, today=None):
+    """篩選 days 天內到期的裝置，依到期日排序"""
+    field = EXPIRY_FIELDS[kind]
+    return (
+        queryset.filter(**{f'{field}__range': window(days, today)})
+        .exclude(status='retired')
+        .order_by(field, 'id')
+    )
+
+
+def upcoming_by_owner(queryset, days, today=None):
+    """
+    以一次查詢取得 days 天內的保固與報廢到期項目，依責任人分組
+
+    回傳 {責任人 ID: [{'device_id', 'serial_number', 'name', 'kind', 'date'}, ...]}，
+    同一裝置的保固與報廢都在範圍內時各列一項
+    """
+    start, end = window(days, today)
+    rows = (
+        queryset.filter(
+            Q(warranty_end_date__range=(start, end)) | Q(retirement_date__range=(start, end)),
+            responsible_person__isnull=False,
+        )
+        .exclude(status='retired')
+        .order_by('responsible_person_id', 'id')
+        .values_list(
+            'responsible_person_id', 'id', 'serial_number', 'name',
+            'warranty_end_date', 'retirement_date'
+        )
+    )
+
+    groups = {}
+    for owner_id, owner_rows in groupby(rows, key=lambda row: row[0]):
+        items = []
+        for _, pk, serial_number, name, *dates in owner_rows:
+            for kind, date in zip(EXPIRY_FIELDS, dates):
+                if date is not None and start <= date <= end:
+                    items.append({
+                        'device_id': pk,
+                        'serial_number': serial_number,
+                        'name': name,
+                        'kind': kind,
+                        'date': date,
+                    })
+        items.sort(key=lambda item: (item['date'], item['device_id']))
+        groups[owner_id] = items
+    return groups
@@ -1,5 +1,6 @@
 from django import forms
 from django.contrib import admin
+from . import property_validation
 from .models import (
     DeviceCategory,
     PropertyDefinition,
@@ -63,7 +64,7 @@ class DeviceForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         
         # 如果是編輯模式且有類別，顯示該類別的屬性定義
-        if self.instance and self.instance.category:
+        if self.instance and self.instance.category_id:
             category = self.instance.category
             properties = category.property_definitions.all()
             
@@ -75,24 +76,18 @@ class DeviceForm(forms.ModelForm):
                 self.fields['custom_properties'].help_text = help_text
     
     def clean_custom_properties(self):
-        """驗證自訂屬性"""
+        """驗證自訂屬性，一次列出所有錯誤"""
         custom_properties = self.cleaned_data.get('custom_properties', {})
         category = self.cleaned_data.get('category') or (
-            self.instance.category if self.instance else None
+            self.instance.category if self.instance and self.instance.category_id else None
         )
         
         if not category:
             return custom_properties
         
-        # 獲取該類別的屬性定義
-        property_definitions = category.property_definitions.all()
-        
-        # 驗證必填屬性
-        for prop_def in property_definitions:
-            if prop_def.is_required and prop_def.name not in custom_properties:
-                raise forms.ValidationError(
-                    f'必填屬性 "{prop_def.name}" 未提供'
-                )
+        errors = property_validation.PropertyValidator().validate(category.pk, custom_properties)
+        if errors:
+            raise forms.ValidationError(property_validation.messages(errors))
         
         return custom_properties
     
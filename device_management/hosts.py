@@ -0,0 +1,262 @@
+"""
+主機列表與網段歸屬
+
+主機是裝置與其啟用中 IP 記錄的投影（每筆啟用中的 IP 記錄為一台主機），
+以一次 JOIN 查詢取得前端 Host 需要的欄位，可依網段、狀態、服務類型與標籤篩選，
+並以（排序欄位, id）游標分頁（見 pagination.KeysetPagination），不需 OFFSET 與 COUNT。
+
+IP 記錄儲存時依位址歸屬於包含它的最小網段；網段新增、刪除或變更 CIDR 時重新歸屬。
+PostgreSQL 上以 inet 運算在一次 UPDATE 內完成，其他資料庫在 Python 中比對。
+
+搬移主機（move_hosts）在一個交易內完成：由目標網段的可用位址配置新 IP、
+以一次 UPDATE 停用原本的 IP 記錄並附加歷史、以一次 INSERT 建立新的 IP 記錄，
+操作日誌以 INSERT ... SELECT 批次寫入，不逐筆儲存模型。
+"""
+
+import ipaddress
+
+from django.db import connection, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce, JSONObject
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import bulk, tags
+from .models import Device, IPRecord, Subnet
+from .permissions import get_row_policy
+
+# 主機狀態對應的裝置狀態
+HOST_STATUSES = {
+    'online': ('active',),
+    'idle': ('inactive',),
+    'offline': ('maintenance', 'retired'),
+}
+DEVICE_HOST_STATUS = {status: host for host, statuses in HOST_STATUSES.items() for status in statuses}
+
+SERVICE_TYPES = {value for value, _ in Device.SERVICE_TYPES}
+
+# ?ordering= 可用的排序鍵（與前端的 HostSortKey 相同）對應的查詢欄位
+ORDERING_FIELDS = {
+    'hostname': 'device__name',
+    'ipAddress': 'ip_address',
+    'status': 'device__status',
+    'serviceType': 'device__service_type',
+    'lastSeenAt': 'seen_at',
+}
+DEFAULT_ORDERING = 'hostname'
+
+# 主機作業系統取自裝置的此動態屬性
+OS_PROPERTY = 'os'
+
+
+def host_queryset():
+    """啟用中的 IP 記錄與其裝置、網段；seen_at 為最後回應時間，未偵測過時為分配時間"""
+    return (
+        IPRecord.objects.filter(is_active=True)
+        .annotate(seen_at=Coalesce('last_seen_at', 'assigned_date'))
+    )
+
+
+def _split(params, name):
+    return [value for value in params.get(name, '').split(',') if value]
+
+
+def filter_hosts(queryset, params):
+    """
+    依查詢參數篩選主機（多個值以逗號分隔）：
+    subnet、status（online/idle/offline）、service_type、tags（任一）、tags_all（全部）、
+    search（主機名稱、IP 開頭或 MAC）
+    """
+    errors = {}
+    subnets = _split(params, 'subnet')
+    if subnets:
+        if not all(value.isdigit() for value in subnets):
+            errors['subnet'] = ['網段必須是 ID']
+        else:
+            queryset = queryset.filter(subnet_id__in=subnets)
+    statuses = _split(params, 'status')
+    if statuses:
+        unknown = set(statuses) - set(HOST_STATUSES)
+        if unknown:
+            errors['status'] = [f'未知的狀態：{", ".join(sorted(unknown))}']
+        else:
+            queryset = queryset.filter(
+                device__status__in=[status for host in statuses for status in HOST_STATUSES[host]]
+            )
+    service_types = _split(params, 'service_type')
+    if service_types:
+        unknown = set(service_types) - SERVICE_TYPES
+        if unknown:
+            errors['service_type'] = [f'未知的服務類型：{", ".join(sorted(unknown))}']
+        else:
+            queryset = queryset.filter(device__service_type__in=service_types)
+    any_tags, all_tags, tag_errors = tags.parse_params(params)
+    errors.update(tag_errors)
+    queryset = tags.filter_by_tags(queryset, any_tags, all_tags, device_ref='device_id')
+    search = params.get('search', '').strip()
+    if search:
+        queryset = queryset.filter(
+            Q(device__name__icontains=search) | Q(ip_address__startswith=search) | Q(mac_address__iexact=search)
+        )
+    if errors:
+        raise ValidationError(errors)
+    return queryset
+
+
+def order_hosts(queryset, ordering):
+    """依排序鍵排序，最後以 id 確保順序唯一（游標分頁需要）"""
+    descending = ordering.startswith('-')
+    key = ordering.lstrip('-') or DEFAULT_ORDERING
+    if key not in ORDERING_FIELDS:
+        raise ValidationError({'ordering': [f'無法排序的欄位：{key}，可用 {", ".join(ORDERING_FIELDS)}']})
+    prefix = '-' if descending else ''
+    return queryset.order_by(f'{prefix}{ORDERING_FIELDS[key]}', f'{prefix}id')
+
+
+def networks(subnets=None):
+    """解析網段的 CIDR，依網段大小由小到大排列（先比對到的即為最小網段）"""
+    subnets = Subnet.objects.only('pk', 'cidr') if subnets is None else subnets
+    parsed = [(subnet.network, subnet) for subnet in subnets]
+    return sorted(parsed, key=lambda item: item[0].prefixlen, reverse=True)
+
+
+def find_subnet(ip_address, parsed=None):
+    """取得包含 IP 位址的最小網段，沒有時回傳 None；parsed 為 networks() 的結果"""
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return None
+    for network, subnet in networks() if parsed is None else parsed:
+        if address in network:
+            return subnet
+    return None
+
+
+def assign_subnets(queryset=None):
+    """重新歸屬 IP 記錄的網段，回傳變更的數量"""
+    queryset = IPRecord.objects.all() if queryset is None else queryset
+    if connection.vendor == 'postgresql':
+        subnet_table = connection.ops.quote_name(Subnet._meta.db_table)
+        ip_table = connection.ops.quote_name(IPRecord._meta.db_table)
+        where, params = queryset.query.get_compiler(connection=connection).compile(queryset.query.where)
+        best = (
+            f'(SELECT s.id FROM {subnet_table} s WHERE {ip_table}.ip_address <<= s.cidr::inet '
+            f'ORDER BY masklen(s.cidr::inet) DESC LIMIT 1)'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {ip_table} SET subnet_id = {best} '
+                f'WHERE ({where or "TRUE"}) AND subnet_id IS DISTINCT FROM {best}',
+                params,
+            )
+            return cursor.rowcount
+
+    parsed = networks()
+    changed = []
+    for record in queryset.only('pk', 'ip_address', 'subnet').iterator(chunk_size=2000):
+        subnet = find_subnet(record.ip_address, parsed)
+        subnet_id = subnet.pk if subnet else None
+        if subnet_id != record.subnet_id:
+            record.subnet_id = subnet_id
+            changed.append(record)
+    IPRecord.objects.bulk_update(changed, ['subnet'], batch_size=1000)
+    return len(changed)
+
+
+def free_addresses(subnet, count):
+    """
+    由網段的可用位址中依序取出 count 個（不足時回傳全部可用位址）
+
+    排除啟用中的 IP 記錄已使用的位址，以及屬於其中較小網段的位址（該位址會歸屬於較小的網段）
+    """
+    network = subnet.network
+    nested = [
+        other for other, other_subnet in networks()
+        if other_subnet.pk != subnet.pk and other.version == network.version
+        and other.prefixlen > network.prefixlen and other.subnet_of(network)
+    ]
+    used = set(
+        IPRecord.objects.filter(is_active=True, subnet=subnet).values_list('ip_address', flat=True)
+    )
+    addresses = []
+    for address in network.hosts():
+        if len(addresses) >= count:
+            break
+        if str(address) in used or any(address in other for other in nested):
+            continue
+        addresses.append(str(address))
+    return addresses
+
+
+def _history_entry(action, user, timestamp):
+    """以資料列本身的位址產生 IP 記錄歷史項目（與 IPRecord.add_to_history 相同的格式）"""
+    return JSONObject(
+        timestamp=Value(timestamp.isoformat()),
+        action=Value(action),
+        ip_address=F('ip_address'),
+        mac_address=F('mac_address'),
+        user=Value(user.username if user else None),
+    )
+
+
+def move_hosts(records, subnet, user, request=None):
+    """
+    將主機（啟用中的 IP 記錄）搬移到目標網段，回傳 {原 IP 記錄 ID: 新 IP 記錄}
+
+    已在目標網段的主機不會變更。可用位址不足時拋出 ValidationError，不做任何變更
+    """
+    if subnet.network.version != 4:
+        raise ValidationError({'subnet': ['只能搬移到 IPv4 網段']})
+    policy = get_row_policy(IPRecord)
+    with transaction.atomic():
+        # 鎖定目標網段，同時搬移到同一網段的請求依序配置位址
+        subnet = Subnet.objects.select_for_update().get(pk=subnet.pk)
+        rows = list(
+            records.filter(is_active=True).exclude(subnet=subnet)
+            .select_related(None).select_for_update(of=('self',)).order_by('pk')
+            .values_list('pk', 'device_id', 'ip_address', 'mac_address', 'notes', policy.lookup)
+        )
+        if not rows:
+            return {}
+        addresses = free_addresses(subnet, len(rows))
+        if len(addresses) < len(rows):
+            raise ValidationError({
+                'subnet': [f'{subnet.name} 只剩 {len(addresses)} 個可用位址，無法搬移 {len(rows)} 台主機']
+            })
+
+        now = timezone.now()
+        sources = IPRecord.objects.filter(pk__in=[row[0] for row in rows])
+        bulk.insert_audit_logs(sources, 'update', user, request, changes={'is_active': False})
+        sources.update(
+            is_active=False,
+            updated_at=now,
+            history=bulk.JSONAppend('history', _history_entry(f'搬移至 {subnet.name}，停用', user, now)),
+        )
+
+        created = IPRecord.objects.bulk_create([
+            IPRecord(
+                device_id=device_id,
+                ip_address=address,
+                mac_address=mac_address,
+                notes=notes,
+                subnet=subnet,
+                assigned_date=now,
+                history=[{
+                    'timestamp': now.isoformat(),
+                    'action': f'由 {ip_address} 搬移',
+                    'ip_address': address,
+                    'mac_address': mac_address,
+                    'user': user.username if user else None,
+                }],
+            )
+            for (_, device_id, ip_address, mac_address, notes, _), address in zip(rows, addresses)
+        ])
+        bulk.insert_audit_logs(
+            IPRecord.objects.filter(pk__in=[record.pk for record in created]), 'create', user, request
+        )
+
+        bulk.publish_bulk_events(IPRecord, [(row[0], row[-1]) for row in rows], {'is_active': False})
+        bulk.publish_bulk_events(
+            IPRecord, [(record.pk, row[-1]) for row, record in zip(rows, created)], {'subnet': subnet.pk}
+        )
+    return {row[0]: record for row, record in zip(rows, created)}
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from device_management import authentication
+from device_management.models import APIToken
+
+
+class Command(BaseCommand):
+    help = '建立、列出或撤銷機器用戶端使用的 API 權杖'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='subcommand', required=True)
+
+        create = subparsers.add_parser('create', help='建立權杖（原始權杖只顯示一次）')
+        create.add_argument('username', help='權杖所屬的用戶名稱')
+        create.add_argument('--name', required=True, help='權杖名稱，例如整合腳本的用途')
+        create.add_argument('--expires-days', type=int, help='有效天數（預設不過期）')
+
+        listing = subparsers.add_parser('list', help='列出權杖')
+        listing.add_argument('--user', help='只列出此用戶的權杖')
+
+        revoke = subparsers.add_parser('revoke', help='撤銷權杖')
+        revoke.add_argument('prefix', nargs='?', help='權杖前綴')
+        revoke.add_argument('--user', help='撤銷此用戶的所有權杖')
+
+    def handle(self, *args, **options):
+        getattr(self, f"_{options['subcommand']}")(options)
+
+    def _create(self, options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"找不到用戶：{options['username']}")
+        days = options['expires_days']
+        if days is not None and days < 1:
+            raise CommandError('--expires-days 必須至少為 1')
+        token, raw = authentication.create_token(
+            user, options['name'], timedelta(days=days) if days else None
+        )
+        self.stdout.write(self.style.SUCCESS(f'已建立權杖 {token.prefix}（{token.name}）'))
+        self.stdout.write(raw)
+
+    def _list(self, options):
+        tokens = APIToken.objects.select_related('user')
+        if options['user']:
+            tokens = tokens.filter(user__username=options['user'])
+        for token in tokens:
+            state = '有效' if token.is_active else ('已撤銷' if token.revoked_at else '已過期')
+            last_used = f'{token.last_used_at:%Y-%m-%d %H:%M}' if token.last_used_at else '-'
+            self.stdout.write(
+                f'{token.prefix:<12} {token.user.username:<16} {token.name:<24} {state:<4} 最後使用 {last_used}'
+            )
+
+    def _revoke(self, options):
+        if bool(options['prefix']) == bool(options['user']):
+            raise CommandError('請指定權杖前綴或 --user 其中之一')
+        if options['prefix']:
+            tokens = APIToken.objects.filter(prefix=options['prefix'])
+        else:
+            tokens = APIToken.objects.filter(user__username=options['user'])
+        count = authentication.revoke_tokens(tokens)
+        self.stdout.write(self.style.SUCCESS(f'已撤銷 {count} 個權杖'))
@@ -0,0 +1,100 @@
+import gzip
+import json
+import os
+import time
+from datetime import datetime, time as dt_time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from device_management import audit_archive
+
+
+def parse_moment(value):
+    """解析 ISO 8601 日期或日期時間"""
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = datetime.combine(day, dt_time.min) if day else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise CommandError(f'日期時間格式錯誤：{value}')
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = '搜尋欄式封存的操作日誌，或將 JSONL 匯出檔轉換為欄式封存'
+
+    def add_arguments(self, parser):
+        default_dir = str(getattr(settings, 'AUDIT_LOG', {}).get('ARCHIVE_DIR', 'archives/audit_logs'))
+        subparsers = parser.add_subparsers(dest='subcommand', required=True)
+
+        search = subparsers.add_parser('search', help='依物件、用戶或時間範圍搜尋')
+        search.add_argument('--dir', default=default_dir, help='封存目錄')
+        search.add_argument('--model', help='模型名稱，例如 Device')
+        search.add_argument('--object', help='物件 ID（需搭配 --model）')
+        search.add_argument('--user', type=int, help='操作用戶 ID')
+        search.add_argument('--since', help='起始時間（含）')
+        search.add_argument('--until', help='結束時間（不含）')
+        search.add_argument('--limit', type=int, default=50, help='最多顯示筆數')
+        search.add_argument('--json', action='store_true', help='以 JSONL 輸出')
+
+        convert = subparsers.add_parser('convert', help='將 JSONL（.jsonl.gz）匯出檔轉為欄式封存')
+        convert.add_argument('files', nargs='+', help='JSONL 匯出檔')
+        convert.add_argument('--dir', help='輸出目錄（預設與來源相同）')
+        convert.add_argument('--chunk-rows', type=int, default=audit_archive.DEFAULT_CHUNK_ROWS)
+
+    def handle(self, *args, **options):
+        if options['subcommand'] == 'search':
+            self._search(options)
+        else:
+            self._convert(options)
+
+    def _search(self, options):
+        if options['object'] and not options['model']:
+            raise CommandError('--object 需要搭配 --model')
+        query = audit_archive.ArchiveQuery(
+            model_name=options['model'],
+            object_id=options['object'],
+            user_id=options['user'],
+            since=parse_moment(options['since']) if options['since'] else None,
+            until=parse_moment(options['until']) if options['until'] else None,
+        )
+
+        started = time.perf_counter()
+        rows, stats = audit_archive.search_archives(options['dir'], query, options['limit'])
+        elapsed = time.perf_counter() - started
+
+        for row in rows:
+            if options['json']:
+                self.stdout.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+            else:
+                self.stdout.write(
+                    f"{row['timestamp']:%Y-%m-%d %H:%M:%S} {row['action']:<6} "
+                    f"{row['model_name']}#{row['object_id']} {row['object_repr'] or ''} "
+                    f"(user {row['user_id']})"
+                )
+        self.stderr.write(
+            f"{len(rows)} 筆，讀取 {stats['files_read']}/{stats['files']} 個檔案、"
+            f"{stats['chunks_read']}/{stats['chunks']} 個區塊，耗時 {elapsed:.3f} 秒"
+        )
+
+    def _convert(self, options):
+        for source in options['files']:
+            if not source.endswith('.jsonl.gz'):
+                raise CommandError(f'不支援的檔案：{source}')
+            with gzip.open(source, 'rt', encoding='utf-8') as lines:
+                rows = [json.loads(line) for line in lines if line.strip()]
+            rows.sort(key=lambda row: (
+                row['model_name'], str(row['object_id']), row['timestamp'], row['id']
+            ))
+
+            name = os.path.basename(source)[:-len('.jsonl.gz')] + audit_archive.DATA_SUFFIX
+            target = os.path.join(options['dir'] or os.path.dirname(source), name)
+            count = audit_archive.write_archive(rows, target, options['chunk_rows'])
+            self.stdout.write(self.style.SUCCESS(f'{source} → {target}（{count} 筆）'))
@@ -0,0 +1,116 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from device_management.access_audit import AccessRecorder
+from device_management.management.commands.loadtest import percentile
+from device_management.models import AuditLog, Device, DeviceCategory
+from device_management.views import DeviceViewSet
+
+
+class _AuditOff(DeviceViewSet):
+    """不記錄讀取"""
+    access_audit_actions = ()
+
+
+class _AuditInMemory(DeviceViewSet):
+    """記憶體彙總（不啟動背景執行緒，寫入成本另外量測）"""
+    recorder = None
+
+    def get_access_recorder(self):
+        return self.recorder
+
+
+class _AuditSyncWrite(DeviceViewSet):
+    """對照組：每次讀取同步寫入操作日誌"""
+
+    def record_access(self, user, data):
+        AuditLog.objects.bulk_create([
+            AuditLog(user=user, action='view', model_name='Device', object_id=str(pk), object_pk=pk)
+            for pk in self._accessed_ids(data)
+        ])
+
+
+class Command(BaseCommand):
+    help = '比較讀取稽核對裝置列表與詳情延遲的影響（測試資料在結束後回滾）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=200, help='建立的測試裝置數量')
+        parser.add_argument('--requests', type=int, default=300, help='每種模式每個端點的請求數')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._run(options['devices'], options['requests'])
+            transaction.set_rollback(True)
+
+    def _run(self, device_count, total):
+        user = User.objects.create_user(username='benchmark-access-audit', is_staff=True)
+        category = DeviceCategory.objects.create(name='benchmark-access-audit')
+        Device.objects.bulk_create([
+            Device(serial_number=f'BENCH-AUDIT-{i:06d}', name=f'裝置 {i}', category=category)
+            for i in range(device_count)
+        ])
+        device_ids = list(Device.objects.filter(category=category).values_list('id', flat=True))
+
+        recorder = AccessRecorder(flush_interval=None)
+        _AuditInMemory.recorder = recorder
+        modes = [
+            ('關閉', _AuditOff),
+            ('記憶體彙總', _AuditInMemory),
+            ('同步寫入', _AuditSyncWrite),
+        ]
+
+        hosts = [host for host in settings.ALLOWED_HOSTS if not host.startswith(('*', '.'))]
+        factory = APIRequestFactory(SERVER_NAME=hosts[0] if hosts else 'localhost')
+        results = []
+        for name, viewset in modes:
+            list_view = viewset.as_view({'get': 'list'})
+            detail_view = viewset.as_view({'get': 'retrieve'})
+
+            def list_request(_):
+                request = factory.get('/api/devices/', {'category': category.id})
+                force_authenticate(request, user=user)
+                return list_view(request)
+
+            def detail_request(index):
+                pk = device_ids[index % len(device_ids)]
+                request = factory.get(f'/api/devices/{pk}/')
+                force_authenticate(request, user=user)
+                return detail_view(request, pk=pk)
+
+            list_latency = self._measure(list_request, total)
+            detail_latency = self._measure(detail_request, total)
+            results.append((name, list_latency, detail_latency))
+
+        pending = recorder.pending_count
+        started = time.perf_counter()
+        recorder.flush()
+        flush_ms = (time.perf_counter() - started) * 1000
+
+        self.stdout.write(
+            f"{'模式':<12} {'列表 p50':>10} {'列表 p95':>10} {'詳情 p50':>10} {'詳情 p95':>10}  (ms)"
+        )
+        for name, list_latency, detail_latency in results:
+            self.stdout.write(
+                f"{name:<12} {percentile(list_latency, 50):>10.3f} {percentile(list_latency, 95):>10.3f} "
+                f"{percentile(detail_latency, 50):>10.3f} {percentile(detail_latency, 95):>10.3f}"
+            )
+        self.stdout.write(
+            f'記憶體彙總：{total * 2} 次請求累積 {pending} 筆，批次寫入耗時 {flush_ms:.1f} ms'
+            f'（由背景執行緒執行，不計入請求延遲）'
+        )
+
+    @staticmethod
+    def _measure(send, total):
+        send(0)
+        latencies = []
+        for index in range(total):
+            started = time.perf_counter()
+            response = send(index)
+            response.render()
+            latencies.append((time.perf_counter() - started) * 1000)
+        return sorted(latencies)
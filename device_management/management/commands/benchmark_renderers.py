@@ -0,0 +1,121 @@
+import io
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from device_management import renderers
+from device_management.renderers import FastJSONParser, FastJSONRenderer
+
+
+class Command(BaseCommand):
+    help = '比較標準函式庫與 orjson 渲染器／解析器的編碼與解碼成本（不需要資料庫）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=500, help='列表中的裝置數量')
+        parser.add_argument('--history', type=int, default=20, help='每筆 IP 記錄的歷史筆數')
+        parser.add_argument('--repeat', type=int, default=5, help='每組重複次數（取最佳值）')
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            self.stdout.write(self.style.WARNING('未安裝 orjson，FastJSONRenderer 將退回標準函式庫'))
+
+        detail = self._device_payload(1, options['history'])
+        payloads = {
+            '裝置詳情': detail,
+            f"裝置列表 ({options['devices']} 筆)": [
+                self._device_payload(i, options['history']) for i in range(options['devices'])
+            ],
+        }
+
+        self.stdout.write(
+            f"{'資料':<24} {'json 渲染(ms)':>14} {'fast 渲染(ms)':>14} "
+            f"{'json 解析(ms)':>14} {'fast 解析(ms)':>14}"
+        )
+        for name, payload in payloads.items():
+            slow_bytes = JSONRenderer().render(payload)
+            fast_bytes = FastJSONRenderer().render(payload)
+            if json.loads(slow_bytes) != json.loads(fast_bytes):
+                raise CommandError(f'{name}：兩種渲染器的輸出不一致')
+
+            render_slow = self._best(lambda: JSONRenderer().render(payload), options['repeat'])
+            render_fast = self._best(lambda: FastJSONRenderer().render(payload), options['repeat'])
+            parse_slow = self._best(
+                lambda: JSONParser().parse(io.BytesIO(slow_bytes)), options['repeat']
+            )
+            parse_fast = self._best(
+                lambda: FastJSONParser().parse(io.BytesIO(slow_bytes)), options['repeat']
+            )
+            self.stdout.write(
+                f"{name:<24} {render_slow * 1000:>14.3f} {render_fast * 1000:>14.3f} "
+                f"{parse_slow * 1000:>14.3f} {parse_fast * 1000:>14.3f}"
+            )
+
+    def _best(self, func, repeat):
+        """回傳多次執行中的最短時間"""
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    def _device_payload(self, index, history_length):
+        """建立與 DeviceSerializer 輸出結構相同的資料"""
+        now = timezone.now()
+        history = [
+            {
+                'timestamp': (now - timedelta(days=day)).isoformat(),
+                'action': 'IP 記錄建立' if day == 0 else f'IP 變更 #{day}',
+                'ip_address': f'10.0.{index % 256}.{day % 256}',
+                'mac_address': 'AA:BB:CC:DD:EE:FF',
+                'user': 'admin',
+            }
+            for day in range(history_length)
+        ]
+        return {
+            'id': index,
+            'serial_number': f'SN-{index:06d}',
+            'name': f'辦公室電腦 {index}',
+            'category': 1,
+            'category_name': '電腦',
+            'status': 'active',
+            'responsible_person': 2,
+            'responsible_person_name': 'user1',
+            'custom_properties': {'作業系統': 'Windows 11', 'RAM': 16, '是否含螢幕': True},
+            'purchase_date': (now - timedelta(days=400)).date(),
+            'cost': '35000.00',
+            'department': 'IT部門',
+            'location': '3樓辦公室',
+            'depreciation_rate': '20.00',
+            'warranty_end_date': (now + timedelta(days=300)).date(),
+            'supplier': None,
+            'maintenance_info': None,
+            'retirement_date': None,
+            'created_at': now,
+            'updated_at': now,
+            'created_by': 1,
+            'created_by_name': 'admin',
+            'ip_records': [
+                {
+                    'id': index * 10 + n,
+                    'device': index,
+                    'device_name': f'辦公室電腦 {index}',
+                    'ip_address': f'10.0.{index % 256}.{n}',
+                    'mac_address': 'AA:BB:CC:DD:EE:FF',
+                    'assigned_date': now,
+                    'is_active': n == 0,
+                    'notes': None,
+                    'history': history,
+                    'created_at': now,
+                    'updated_at': now,
+                }
+                for n in range(2)
+            ],
+            'current_value': Decimal('28000.50'),
+        }
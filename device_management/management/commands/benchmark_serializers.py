@@ -0,0 +1,91 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from device_management.models import Device, DeviceCategory
+from device_management.serializers import DeviceListSerializer
+from device_management.views import DeviceViewSet
+
+
+class Command(BaseCommand):
+    help = '比較 DeviceListSerializer 與列表快速路徑的每列序列化成本（不需要資料庫）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            default='50,500,5000',
+            help='測試的資料列數，以逗號分隔'
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='每組重複次數（取最佳值）')
+
+    def handle(self, *args, **options):
+        mapper = DeviceViewSet.list_row_mapper
+        renderer = JSONRenderer()
+
+        self.stdout.write(
+            f"{'資料列':>8} {'DRF(µs/列)':>12} {'快速路徑(µs/列)':>16} {'加速':>8}"
+        )
+        for count in [int(value) for value in options['rows'].split(',') if value.strip()]:
+            devices, rows = self._build_rows(count, mapper.columns)
+
+            slow_output = renderer.render(DeviceListSerializer(devices, many=True).data)
+            fast_output = renderer.render(mapper.map_rows(rows))
+            if slow_output != fast_output:
+                raise CommandError('快速路徑的輸出與 DeviceListSerializer 不一致')
+
+            slow = self._best(
+                lambda: DeviceListSerializer(devices, many=True).data, options['repeat']
+            )
+            fast = self._best(lambda: mapper.map_rows(rows), options['repeat'])
+            self.stdout.write(
+                f"{count:>8} {slow / count * 1e6:>12.2f} {fast / count * 1e6:>16.2f} "
+                f"{slow / fast:>7.1f}x"
+            )
+
+    def _best(self, func, repeat):
+        """回傳多次執行中的最短時間"""
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    def _build_rows(self, count, columns):
+        """建立記憶體中的裝置物件，以及對應 values_list() 的資料列"""
+        now = timezone.now()
+        categories = [DeviceCategory(id=i, name=f'類別 {i}') for i in range(1, 6)]
+        users = [User(id=i, username=f'user{i}') for i in range(1, 11)]
+
+        devices = []
+        for i in range(count):
+            device = Device(
+                id=i + 1,
+                serial_number=f'SN-{i:06d}',
+                name=f'裝置 {i}',
+                category=categories[i % len(categories)],
+                status=Device.STATUS_CHOICES[i % len(Device.STATUS_CHOICES)][0],
+                responsible_person=users[i % len(users)] if i % 3 else None,
+                department='IT部門' if i % 2 else None,
+                location=f'{i % 10}樓',
+                cost=Decimal('1000.00') + i,
+            )
+            device.created_at = now - timedelta(minutes=i)
+            device.updated_at = now
+            devices.append(device)
+
+        rows = []
+        for device in devices:
+            row = []
+            for column in columns:
+                value = device
+                for attr in column.split('__'):
+                    value = getattr(value, attr) if value is not None else None
+                row.append(value)
+            rows.append(tuple(row))
+        return devices, rows
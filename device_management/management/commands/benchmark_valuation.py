@@ -0,0 +1,79 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from device_management import valuation
+from device_management.models import Device, DeviceCategory
+
+
+class Command(BaseCommand):
+    help = '量測估值引擎在大量裝置上的耗時（逐筆 Decimal 與 NumPy 向量化，測試資料在結束後回滾）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=100000, help='裝置數量')
+        parser.add_argument('--skip-db', action='store_true', help='只量測計算，不建立資料庫資料')
+
+    def handle(self, *args, **options):
+        rows = self._rows(options['devices'])
+        as_of = date.today()
+
+        started = time.perf_counter()
+        expected = valuation._compute_python(rows, as_of)
+        python_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f'逐筆 Decimal：{python_ms:.1f} ms')
+
+        if valuation.numpy is None:
+            self.stdout.write('未安裝 NumPy，略過向量化量測')
+        else:
+            started = time.perf_counter()
+            result = valuation._compute_numpy(rows, as_of)
+            numpy_ms = (time.perf_counter() - started) * 1000
+            mismatches = sum(1 for a, b in zip(expected, result) if a != b)
+            self.stdout.write(f'NumPy 向量化：{numpy_ms:.1f} ms（與 Decimal 結果不同：{mismatches} 筆）')
+
+        if not options['skip_db']:
+            with transaction.atomic():
+                self._report(rows, as_of)
+                transaction.set_rollback(True)
+
+    @staticmethod
+    def _rows(count):
+        rng = random.Random(42)
+        today = date.today()
+        methods = [valuation.STRAIGHT_LINE, valuation.DECLINING_BALANCE, valuation.SCHEDULE]
+        rows = []
+        for _ in range(count):
+            method = rng.choice(methods)
+            rows.append((
+                Decimal(rng.randint(1000, 10_000_000)) / 100,
+                Decimal(rng.randint(500, 4000)) / 100,
+                today - timedelta(days=rng.randint(0, 3650)),
+                method,
+                Decimal(rng.randint(0, 500)) if rng.random() < 0.3 else None,
+                [40, 30, 20, 10] if method == valuation.SCHEDULE else None,
+            ))
+        return rows
+
+    def _report(self, rows, as_of):
+        category = DeviceCategory.objects.create(name='benchmark-valuation')
+        Device.objects.bulk_create([
+            Device(
+                serial_number=f'BENCH-VAL-{index:07d}', name=f'裝置 {index}', category=category,
+                cost=cost, depreciation_rate=rate, purchase_date=purchase_date,
+                depreciation_method=method, salvage_value=salvage, depreciation_schedule=schedule,
+            )
+            for index, (cost, rate, purchase_date, method, salvage, schedule) in enumerate(rows)
+        ], batch_size=2000)
+        queryset = Device.objects.filter(category=category)
+
+        started = time.perf_counter()
+        report = valuation.valuation_report(queryset, as_of, 'depreciation_method')
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(
+            f"估值報表（含查詢）：{elapsed:.1f} ms，{report['device_count']} 筆，"
+            f"總價值 {report['total_value']:,}"
+        )
@@ -0,0 +1,62 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from device_management import expiry, notifications
+from device_management.models import Device, Notification
+
+KIND = 'expiry_digest'
+
+
+class Command(BaseCommand):
+    help = '依責任人彙整即將到期的保固與報廢項目，批次建立並送出到期摘要通知（可每日排程執行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='提醒幾天內到期的項目')
+        parser.add_argument('--date', help='摘要日期（YYYY-MM-DD，預設今天）')
+        parser.add_argument('--batch-size', type=int, help='每批建立與送出的通知數量')
+        parser.add_argument('--dry-run', action='store_true', help='只顯示將通知的人數與項目數')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days 不可為負數')
+        try:
+            today = date.fromisoformat(options['date']) if options['date'] else timezone.localdate()
+        except ValueError:
+            raise CommandError('--date 格式錯誤，請使用 YYYY-MM-DD')
+
+        groups = expiry.upcoming_by_owner(Device.objects.all(), options['days'], today)
+        item_count = sum(len(items) for items in groups.values())
+        if options['dry_run']:
+            self.stdout.write(f'{len(groups)} 位責任人，共 {item_count} 個到期項目')
+            return
+
+        key = today.isoformat()
+        notifications.create(
+            [self._build(owner_id, items, key, options['days']) for owner_id, items in groups.items()],
+            batch_size=options['batch_size'],
+        )
+        delivered = notifications.deliver_pending(KIND, key, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(groups)} 位責任人、{item_count} 個到期項目，本次送出 {delivered} 則通知'
+        ))
+
+    @staticmethod
+    def _build(owner_id, items, key, days):
+        lines = [
+            f"{item['date']:%Y-%m-%d} {expiry.EXPIRY_LABELS[item['kind']]}："
+            f"{item['name']}（{item['serial_number']}）"
+            for item in items
+        ]
+        return Notification(
+            user_id=owner_id,
+            kind=KIND,
+            key=key,
+            subject=f'{days} 天內到期的裝置：{len(items)} 項',
+            body='\n'.join(lines),
+            payload={
+                'days': days,
+                'items': [{**item, 'date': item['date'].isoformat()} for item in items],
+            },
+        )
@@ -0,0 +1,123 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from device_management import bulk, promoted_properties, property_validation
+from device_management.models import Device, DeviceCategory
+
+# 以查詢解析的關聯欄位，不交給 full_clean() 逐筆查詢
+RELATION_FIELDS = ('category', 'responsible_person')
+
+
+def read_rows(path):
+    """讀取 JSON 陣列或 JSONL 檔案"""
+    try:
+        with open(path, encoding='utf-8') as source:
+            text = source.read()
+    except OSError as exc:
+        raise CommandError(f'無法讀取 {path}：{exc}')
+    try:
+        if text.lstrip().startswith('['):
+            rows = json.loads(text)
+        else:
+            rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+    except json.JSONDecodeError as exc:
+        raise CommandError(f'JSON 格式錯誤：{exc}')
+    if not all(isinstance(row, dict) for row in rows):
+        raise CommandError('每一筆資料必須是 JSON 物件')
+    return rows
+
+
+def _key(value):
+    """關聯欄位可填 ID 或名稱，其他型態視為未提供"""
+    return value if isinstance(value, (int, str)) else None
+
+
+class Command(BaseCommand):
+    help = '從 JSON 或 JSONL 檔案批次匯入裝置；先驗證所有資料列並一次列出全部錯誤，全部通過才寫入'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON 陣列或 JSONL 檔案')
+        parser.add_argument('--batch-size', type=int, default=500, help='每批寫入的裝置數量')
+        parser.add_argument('--dry-run', action='store_true', help='只驗證，不寫入')
+
+    def handle(self, *args, **options):
+        rows = read_rows(options['path'])
+        devices, errors = self.build(rows)
+        for index, row_errors in sorted(errors.items()):
+            self.stderr.write(f"第 {index + 1} 筆（{rows[index].get('serial_number', '')}）：")
+            for field, messages in row_errors.items():
+                for message in messages:
+                    self.stderr.write(f'  {field}: {message}')
+        if errors:
+            raise CommandError(f'{len(errors)} 筆資料驗證失敗，未匯入任何裝置')
+        if options['dry_run']:
+            self.stdout.write(f'{len(devices)} 筆資料驗證通過')
+            return
+
+        with transaction.atomic():
+            created = Device.objects.bulk_create(devices, batch_size=options['batch_size'])
+            queryset = Device.objects.filter(serial_number__in=[device.serial_number for device in created])
+            promoted_properties.sync(queryset)
+            bulk.insert_audit_logs(queryset, 'create', None)
+        self.stdout.write(self.style.SUCCESS(f'已匯入 {len(created)} 台裝置'))
+
+    def build(self, rows):
+        """以共用的查詢解析類別、責任人與重複序號，驗證每一筆資料，回傳 (裝置, {列索引: 錯誤})"""
+        categories = self._lookup(DeviceCategory, 'name', [row.get('category') for row in rows])
+        users = self._lookup(User, 'username', [row.get('responsible_person') for row in rows])
+        serials = [row.get('serial_number') for row in rows]
+        existing = set(Device.objects.filter(serial_number__in=serials).values_list('serial_number', flat=True))
+        seen = set()
+
+        devices, errors = [], {}
+        field_names = {field.name for field in Device._meta.concrete_fields} - {'id', 'created_at', 'updated_at', 'created_by'}
+        for index, row in enumerate(rows):
+            row_errors = {}
+            unknown = set(row) - field_names
+            if unknown:
+                row_errors['__all__'] = [f'未知的欄位：{", ".join(sorted(unknown))}']
+            values = {name: value for name, value in row.items() if name in field_names and name not in RELATION_FIELDS}
+            device = Device(**values)
+            category = categories.get(_key(row.get('category')))
+            if category is None:
+                row_errors['category'] = ['指定的裝置類別不存在']
+            else:
+                device.category = category
+            if row.get('responsible_person') not in (None, ''):
+                device.responsible_person = users.get(_key(row['responsible_person']))
+                if device.responsible_person is None:
+                    row_errors['responsible_person'] = ['指定的責任人不存在']
+            if device.serial_number in existing or device.serial_number in seen:
+                row_errors['serial_number'] = ['序號已存在']
+            seen.add(device.serial_number)
+            try:
+                device.full_clean(exclude=[*RELATION_FIELDS, 'custom_properties'], validate_unique=False)
+            except ValidationError as exc:
+                for field, messages in exc.message_dict.items():
+                    row_errors.setdefault(field, []).extend(messages)
+            devices.append(device)
+            if row_errors:
+                errors[index] = row_errors
+
+        property_errors = property_validation.PropertyValidator().validate_many(
+            (device.category_id, device.custom_properties) for device in devices
+        )
+        for index, row_property_errors in enumerate(property_errors):
+            if row_property_errors:
+                errors.setdefault(index, {})['custom_properties'] = property_validation.messages(row_property_errors)
+        return devices, errors
+
+    @staticmethod
+    def _lookup(model, name_field, keys):
+        """以一次查詢解析 ID 或名稱，回傳 {原始值: 物件}"""
+        keys = {_key(key) for key in keys} - {None, ''}
+        ids = {key for key in keys if isinstance(key, int) or str(key).isdigit()}
+        names = {key for key in keys if isinstance(key, str)}
+        found = {}
+        for obj in model.objects.filter(pk__in=[int(key) for key in ids]) | model.objects.filter(**{f'{name_field}__in': names}):
+            found[obj.pk] = found[str(obj.pk)] = found[getattr(obj, name_field)] = obj
+        return {key: found[key] for key in keys if key in found}
@@ -0,0 +1,131 @@
+import base64
+import http.client
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(sorted_values, pct):
+    """計算已排序數列的百分位數（最近秩法）"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = '對 API 端點進行壓力測試，比較不同部署方式的吞吐量與尾端延遲'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            action='append',
+            required=True,
+            help='測試目標，可重複指定以比較多個部署（格式：[名稱=]URL）'
+        )
+        parser.add_argument('--requests', type=int, default=1000, help='每個目標的請求總數')
+        parser.add_argument(
+            '--concurrency',
+            default='16',
+            help='同時連線數，可用逗號分隔多個值以觀察擴展性（例如 1,8,32,128）'
+        )
+        parser.add_argument('--warmup', type=int, default=20, help='正式測試前的暖身請求數')
+        parser.add_argument('--user', help='Basic Auth 使用者名稱')
+        parser.add_argument('--password', default='', help='Basic Auth 密碼')
+        parser.add_argument('--token', help='API 權杖（以 Bearer 認證，避免每個請求驗證密碼雜湊）')
+        parser.add_argument('--timeout', type=float, default=30.0, help='單一請求逾時秒數')
+
+    def handle(self, *args, **options):
+        headers = {'Accept': 'application/json', 'Connection': 'keep-alive'}
+        if options['token']:
+            headers['Authorization'] = f"Bearer {options['token']}"
+        elif options['user']:
+            token = base64.b64encode(
+                f"{options['user']}:{options['password']}".encode()
+            ).decode()
+            headers['Authorization'] = f'Basic {token}'
+
+        try:
+            levels = [int(value) for value in options['concurrency'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError('--concurrency 必須是以逗號分隔的整數')
+
+        results = []
+        for target in options['url']:
+            name, sep, url = target.partition('=')
+            if not sep or '://' in name:
+                name, url = target, target
+            for concurrency in levels:
+                self.stdout.write(f'測試 {name}（並行 {concurrency}）...')
+                self._run(url, headers, options['warmup'], concurrency, options['timeout'])
+                results.append((name, concurrency, self._run(
+                    url, headers, options['requests'], concurrency, options['timeout']
+                )))
+
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'目標':<30} {'並行':>6} {'req/s':>10} {'p50(ms)':>10} {'p95(ms)':>10} "
+            f"{'p99(ms)':>10} {'max(ms)':>10} {'錯誤':>6}"
+        )
+        for name, concurrency, stats in results:
+            self.stdout.write(
+                f"{name[:30]:<30} {concurrency:>6} {stats['throughput']:>10.1f} "
+                f"{stats['p50']:>10.1f} {stats['p95']:>10.1f} {stats['p99']:>10.1f} "
+                f"{stats['max']:>10.1f} {stats['errors']:>6}"
+            )
+
+    def _run(self, url, headers, total, concurrency, timeout):
+        """以固定連線數發送請求，每個執行緒重用自己的 keep-alive 連線"""
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise CommandError(f'不支援的 URL：{url}')
+        path = parts.path or '/'
+        if parts.query:
+            path = f'{path}?{parts.query}'
+        connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        )
+
+        local = threading.local()
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def send(_):
+            conn = getattr(local, 'conn', None)
+            if conn is None:
+                conn = local.conn = connection_class(parts.netloc, timeout=timeout)
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                local.conn = None
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(elapsed)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(send, range(total)))
+        duration = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'throughput': len(latencies) / duration if duration else 0.0,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1] if latencies else 0.0,
+            'errors': len(errors),
+        }
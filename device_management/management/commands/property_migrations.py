@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+
+from device_management import property_schema
+from device_management.models import PropertyMigration
+
+
+class Command(BaseCommand):
+    help = '列出或執行動態屬性結構演進工作（失敗或中斷的工作會從游標繼續）'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='subcommand', required=True)
+
+        subparsers.add_parser('list', help='列出未完成的工作')
+
+        run = subparsers.add_parser('run', help='執行待執行與失敗的工作')
+        run.add_argument('--batch-size', type=int, help='每批處理的裝置數量')
+        run.add_argument(
+            '--reset-running', action='store_true',
+            help='將執行中的工作視為已中斷（僅在確定沒有其他行程執行時使用）'
+        )
+
+    def handle(self, *args, **options):
+        getattr(self, f"_{options['subcommand']}")(options)
+
+    def _list(self, options):
+        migrations = PropertyMigration.objects.exclude(status='completed').select_related('category').order_by('id')
+        for migration in migrations:
+            self.stdout.write(
+                f'#{migration.pk:<6} {migration.category.name:<20} {migration.get_status_display():<4} '
+                f'{migration.processed}/{migration.total}（改寫 {migration.updated}，'
+                f'無法轉換 {migration.invalid}，缺少必填 {migration.missing}）'
+            )
+
+    def _run(self, options):
+        if options['reset_running']:
+            PropertyMigration.objects.filter(status='running').update(status='failed')
+        category_ids = (
+            PropertyMigration.objects.exclude(status__in=('completed', 'running'))
+            .order_by('category_id')
+            .values_list('category_id', flat=True)
+            .distinct()
+        )
+        for category_id in category_ids:
+            while True:
+                migration = (
+                    PropertyMigration.objects.filter(category_id=category_id)
+                    .exclude(status='completed')
+                    .order_by('id')
+                    .first()
+                )
+                if migration is None or migration.status == 'running':
+                    break
+                if not property_schema.run(migration, options['batch_size']):
+                    self.stderr.write(f'#{migration.pk} 失敗：{PropertyMigration.objects.get(pk=migration.pk).error}')
+                    break
+                migration.refresh_from_db()
+                self.stdout.write(self.style.SUCCESS(
+                    f'#{migration.pk} 完成：處理 {migration.processed} 台，改寫 {migration.updated} 台，'
+                    f'無法轉換 {migration.invalid}，缺少必填 {migration.missing}'
+                ))
@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from device_management import audit_archive, audit_partitions
+from device_management.audit_partitions import add_months, archive_path, month_start
+from device_management.models import AuditLog, AuditLogArchive
+
+
+class Command(BaseCommand):
+    help = '依保存期限匯出並刪除過期的操作日誌，並維護分割區或封存表'
+
+    def add_arguments(self, parser):
+        config = getattr(settings, 'AUDIT_LOG', {})
+        parser.add_argument(
+            '--retention-months',
+            type=int,
+            default=config.get('RETENTION_MONTHS', 12),
+            help='保留最近幾個月的日誌，更早的月份匯出後刪除'
+        )
+        parser.add_argument(
+            '--hot-months',
+            type=int,
+            default=config.get('HOT_MONTHS', 3),
+            help='不支援分割的資料庫：熱資料表保留的月數，更早的日誌移入封存表'
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=3,
+            help='PostgreSQL：預先建立未來幾個月的分割區'
+        )
+        parser.add_argument(
+            '--output-dir',
+            default=config.get('ARCHIVE_DIR', 'archives/audit_logs'),
+            help='匯出檔案的目錄'
+        )
+        parser.add_argument(
+            '--format',
+            choices=['columnar', 'jsonl'],
+            default=config.get('ARCHIVE_FORMAT', 'columnar'),
+            help='匯出格式：可供 audit_archive 指令查詢的欄式封存，或 gzip 壓縮的 JSONL'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='移入封存表的批次大小')
+        parser.add_argument('--dry-run', action='store_true', help='只顯示將執行的動作')
+
+    def handle(self, *args, **options):
+        if options['retention_months'] < 1:
+            raise CommandError('--retention-months 必須至少為 1')
+        if not 0 < options['hot_months'] <= options['retention_months']:
+            raise CommandError('--hot-months 必須介於 1 與 --retention-months 之間')
+
+        self.dry_run = options['dry_run']
+        self.output_dir = str(options['output_dir'])
+        self.format = options['format']
+        current = month_start(timezone.now())
+        cutoff = add_months(current, -options['retention_months'])
+        self.stdout.write(f'保存期限：刪除 {cutoff:%Y-%m} 之前的日誌')
+
+        if audit_partitions.uses_partitions():
+            self._prune_partitions(cutoff, options['months_ahead'])
+        else:
+            hot_cutoff = add_months(current, -options['hot_months'])
+            self._move_to_archive(hot_cutoff, options['batch_size'])
+            self._export_and_delete(AuditLogArchive.objects.all(), cutoff)
+
+    def _prune_partitions(self, cutoff, months_ahead):
+        """PostgreSQL：建立未來的分割區，匯出並卸除過期的分割區"""
+        if not self.dry_run:
+            created = audit_partitions.ensure_partitions(months_ahead)
+            self.stdout.write(f'新建分割區：{created} 個')
+
+        for name, month in audit_partitions.list_partitions():
+            if add_months(month, 1) > cutoff:
+                continue
+            rows = AuditLog.objects.filter(
+                timestamp__gte=month, timestamp__lt=add_months(month, 1)
+            )
+            path = self._archive_path(month)
+            if self.dry_run:
+                self.stdout.write(f'[dry-run] 匯出並卸除 {name} → {path}')
+                continue
+            count = self._export(rows, path)
+            audit_partitions.drop_partition(name)
+            self.stdout.write(self.style.SUCCESS(f'已匯出 {count} 筆並卸除 {name} → {path}'))
+
+        # 預設分割區中可能仍有超出月分割區範圍的舊資料
+        self._export_and_delete(AuditLog.objects.all(), cutoff)
+
+    def _move_to_archive(self, hot_cutoff, batch_size):
+        """將熱資料表中早於 hot_cutoff 的日誌分批移入封存表"""
+        expired = AuditLog.objects.filter(timestamp__lt=hot_cutoff)
+        if self.dry_run:
+            self.stdout.write(f'[dry-run] 移入封存表：{expired.count()} 筆')
+            return
+
+        fields = self._fields(AuditLog)
+        moved = 0
+        while True:
+            with transaction.atomic():
+                batch = list(expired.order_by('timestamp', 'id').values(*fields)[:batch_size])
+                if not batch:
+                    break
+                # 保留原始 ID，重複執行時略過已移入的資料
+                AuditLogArchive.objects.bulk_create(
+                    [AuditLogArchive(**row) for row in batch], ignore_conflicts=True
+                )
+                AuditLog.objects.filter(id__in=[row['id'] for row in batch]).delete()
+            moved += len(batch)
+        self.stdout.write(f'移入封存表：{moved} 筆')
+
+    def _export_and_delete(self, queryset, cutoff):
+        """依月份匯出並刪除早於 cutoff 的資料"""
+        oldest = queryset.order_by('timestamp').values_list('timestamp', flat=True).first()
+        if oldest is None:
+            return
+
+        month = month_start(oldest)
+        while month < cutoff:
+            rows = queryset.filter(timestamp__gte=month, timestamp__lt=add_months(month, 1))
+            path = self._archive_path(month)
+            if self.dry_run:
+                self.stdout.write(f'[dry-run] 匯出並刪除 {month:%Y-%m} → {path}')
+            elif rows.exists():
+                with transaction.atomic():
+                    count = self._export(rows, path)
+                    rows.delete()
+                self.stdout.write(self.style.SUCCESS(f'已匯出 {count} 筆 {month:%Y-%m} → {path}'))
+            month = add_months(month, 1)
+
+    def _archive_path(self, month):
+        path = archive_path(self.output_dir, month)
+        if self.format == 'columnar':
+            return path[:-len('.jsonl.gz')] + audit_archive.DATA_SUFFIX
+        return path
+
+    def _export(self, queryset, path):
+        if self.format == 'columnar':
+            return audit_archive.export_queryset(queryset, path)
+        return audit_partitions.export_rows(queryset, path, self._fields(queryset.model))
+
+    @staticmethod
+    def _fields(model):
+        return [field.attname for field in model._meta.concrete_fields]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('device_management', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=100, verbose_name='模型名稱')),
+                ('object_id', models.BigIntegerField(verbose_name='物件 ID')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='刪除時間')),
+            ],
+            options={
+                'verbose_name': '刪除記錄',
+                'verbose_name_plural': '刪除記錄',
+                'ordering': ['deleted_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['updated_at', 'id'], name='device_mana_updated_213ce2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='iprecord',
+            index=models.Index(fields=['updated_at', 'id'], name='device_mana_updated_710bf4_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='責任人'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['model_name', 'deleted_at', 'id'], name='device_mana_model_n_4e2532_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from device_management import audit_partitions
+
+
+def partition_audit_log(apps, schema_editor):
+    """PostgreSQL：將操作日誌轉為依月分割的資料表"""
+    if audit_partitions.uses_partitions(schema_editor.connection):
+        audit_partitions.convert_to_partitioned(schema_editor.connection)
+
+
+def unpartition_audit_log(apps, schema_editor):
+    if audit_partitions.uses_partitions(schema_editor.connection):
+        audit_partitions.revert_partitioned(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('device_management', '0002_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditLogArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('create', '建立'), ('update', '更新'), ('delete', '刪除'), ('view', '查看')], max_length=20, verbose_name='操作類型')),
+                ('model_name', models.CharField(max_length=100, verbose_name='模型名稱')),
+                ('object_id', models.CharField(max_length=100, verbose_name='物件 ID')),
+                ('object_repr', models.CharField(blank=True, max_length=200, null=True, verbose_name='物件表示')),
+                ('changes', models.JSONField(blank=True, null=True, verbose_name='變更內容')),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True, verbose_name='操作 IP')),
+                ('user_agent', models.TextField(blank=True, null=True, verbose_name='用戶代理')),
+                ('timestamp', models.DateTimeField(verbose_name='操作時間')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='操作用戶')),
+            ],
+            options={
+                'verbose_name': '封存操作日誌',
+                'verbose_name_plural': '封存操作日誌',
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['timestamp', 'id'], name='device_mana_timesta_dc38f4_idx')],
+            },
+        ),
+        migrations.RunPython(partition_audit_log, unpartition_audit_log),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:21
+
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+def backfill_object_pk(apps, schema_editor):
+    """由 object_id 回填 object_pk（僅限整數 ID）"""
+    connection = schema_editor.connection
+    for model_name in ('AuditLog', 'AuditLogArchive'):
+        model = apps.get_model('device_management', model_name)
+        table = connection.ops.quote_name(model._meta.db_table)
+
+        if connection.vendor == 'postgresql':
+            # 一次以集合式 UPDATE 完成，分割表會自動套用到各分割區
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {table} SET object_pk = object_id::bigint "
+                    f"WHERE object_pk IS NULL AND object_id ~ '^[0-9]{{1,18}}$'"
+                )
+            continue
+
+        last_id = 0
+        while True:
+            batch = list(
+                model.objects.filter(id__gt=last_id, object_pk__isnull=True)
+                .order_by('id')
+                .values_list('id', 'object_id')[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            updates = [
+                model(id=pk, object_pk=int(object_id))
+                for pk, object_id in batch
+                if object_id.isascii() and object_id.isdigit() and len(object_id) <= 18
+            ]
+            model.objects.bulk_update(updates, ['object_pk'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('device_management', '0003_audit_log_partitioning'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='object_pk',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='物件主鍵'),
+        ),
+        migrations.AddField(
+            model_name='auditlogarchive',
+            name='object_pk',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='物件主鍵'),
+        ),
+        migrations.RunPython(backfill_object_pk, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['model_name', 'object_pk', '-timestamp'], name='device_mana_model_n_6703b9_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('device_management', '0004_audit_log_object_pk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=100, verbose_name='模型名稱')),
+                ('object_pk', models.BigIntegerField(verbose_name='物件主鍵')),
+                ('bucket', models.DateTimeField(verbose_name='時間區間')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='讀取次數')),
+                ('first_seen', models.DateTimeField(verbose_name='首次讀取')),
+                ('last_seen', models.DateTimeField(verbose_name='最後讀取')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='access_counts', to=settings.AUTH_USER_MODEL, verbose_name='讀取用戶')),
+            ],
+            options={
+                'verbose_name': '讀取紀錄',
+                'verbose_name_plural': '讀取紀錄',
+                'ordering': ['-bucket'],
+                'indexes': [models.Index(fields=['model_name', 'object_pk', '-bucket'], name='device_mana_model_n_e6c3f1_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='accesscount',
+            constraint=models.UniqueConstraint(fields=('user', 'model_name', 'object_pk', 'bucket'), name='unique_access_count_bucket'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('device_management', '0005_access_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='名稱')),
+                ('prefix', models.CharField(max_length=12, verbose_name='前綴')),
+                ('key_hash', models.CharField(max_length=64, unique=True, verbose_name='權杖雜湊')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='到期時間')),
+                ('last_used_at', models.DateTimeField(blank=True, null=True, verbose_name='最後使用時間')),
+                ('revoked_at', models.DateTimeField(blank=True, null=True, verbose_name='撤銷時間')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='api_tokens', to=settings.AUTH_USER_MODEL, verbose_name='用戶')),
+            ],
+            options={
+                'verbose_name': 'API 權杖',
+                'verbose_name_plural': 'API 權杖',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:36
+
+import device_management.valuation
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('device_management', '0006_api_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='depreciation_method',
+            field=models.CharField(choices=[('straight_line', '直線法'), ('declining_balance', '定率遞減法'), ('schedule', '折舊表')], default='straight_line', max_length=20, verbose_name='折舊方法'),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='depreciation_schedule',
+            field=models.JSONField(blank=True, help_text='折舊表：每一年折舊成本的百分比，例如 [40, 30, 20, 10]', null=True, validators=[device_management.valuation.validate_schedule], verbose_name='折舊表'),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='salvage_value',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='折舊後的最低價值', max_digits=12, null=True, verbose_name='殘值'),
+        ),
+    ]
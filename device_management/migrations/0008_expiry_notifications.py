@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('device_management', '0007_depreciation_methods'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50, verbose_name='類型')),
+                ('key', models.CharField(help_text='同一類型的通知以此去重，例如摘要日期', max_length=100, verbose_name='識別鍵')),
+                ('subject', models.CharField(max_length=200, verbose_name='主旨')),
+                ('body', models.TextField(verbose_name='內容')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='資料')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='送出時間')),
+            ],
+            options={
+                'verbose_name': '通知',
+                'verbose_name_plural': '通知',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['warranty_end_date'], name='device_mana_warrant_35ff05_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['retirement_date'], name='device_mana_retirem_a87075_idx'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL, verbose_name='收件人'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['kind', 'key', 'delivered_at'], name='device_mana_kind_899f3c_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('user', 'kind', 'key'), name='unique_notification_key'),
+        ),
+    ]
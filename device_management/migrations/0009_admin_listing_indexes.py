@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('device_management', '0008_expiry_notifications'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['-timestamp'], name='device_mana_timesta_0fdeb9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['-created_at'], name='device_mana_created_a962fb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='iprecord',
+            index=models.Index(fields=['-assigned_date'], name='device_mana_assigne_402d7b_idx'),
+        ),
+    ]
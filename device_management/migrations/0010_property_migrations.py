@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('device_management', '0009_admin_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyMigration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operations', models.JSONField(verbose_name='操作')),
+                ('status', models.CharField(choices=[('pending', '待執行'), ('running', '執行中'), ('completed', '已完成'), ('failed', '失敗')], default='pending', max_length=20, verbose_name='狀態')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='裝置總數')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='已處理')),
+                ('updated', models.PositiveIntegerField(default=0, verbose_name='已改寫')),
+                ('invalid', models.PositiveIntegerField(default=0, help_text='無法轉換為新型態的值', verbose_name='無法轉換')),
+                ('missing', models.PositiveIntegerField(default=0, help_text='缺少必填屬性的裝置', verbose_name='缺少必填')),
+                ('samples', models.JSONField(blank=True, default=list, help_text='無法轉換或缺少必填屬性的裝置 ID（部分）', verbose_name='問題裝置')),
+                ('last_pk', models.BigIntegerField(default=0, verbose_name='游標')),
+                ('error', models.TextField(blank=True, default='', verbose_name='錯誤訊息')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始時間')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完成時間')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='property_migrations', to='device_management.devicecategory', verbose_name='類別')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='建立者')),
+                ('definition', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='migrations', to='device_management.propertydefinition', verbose_name='屬性定義')),
+            ],
+            options={
+                'verbose_name': '屬性結構演進',
+                'verbose_name_plural': '屬性結構演進',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['category', 'status', 'id'], name='device_mana_categor_a33f06_idx')],
+            },
+        ),
+    ]
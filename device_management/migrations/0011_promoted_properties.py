@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('device_management', '0010_property_migrations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertydefinition',
+            name='is_promoted',
+            field=models.BooleanField(default=False, help_text='以型態化、有索引的欄位同步保存此屬性的值，加速篩選與排序', verbose_name='提升為索引欄位'),
+        ),
+        migrations.CreateModel(
+            name='PromotedPropertyValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text_value', models.CharField(blank=True, max_length=255, null=True, verbose_name='文字值')),
+                ('number_value', models.FloatField(blank=True, null=True, verbose_name='數字值')),
+                ('date_value', models.DateField(blank=True, null=True, verbose_name='日期值')),
+                ('boolean_value', models.BooleanField(blank=True, null=True, verbose_name='布林值')),
+                ('definition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='promoted_values', to='device_management.propertydefinition', verbose_name='屬性定義')),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='promoted_values', to='device_management.device', verbose_name='裝置')),
+            ],
+            options={
+                'verbose_name': '提升屬性值',
+                'verbose_name_plural': '提升屬性值',
+                'indexes': [models.Index(fields=['definition', 'text_value', 'device'], name='promoted_text_idx'), models.Index(fields=['definition', 'number_value', 'device'], name='promoted_number_idx'), models.Index(fields=['definition', 'date_value', 'device'], name='promoted_date_idx'), models.Index(fields=['definition', 'boolean_value', 'device'], name='promoted_boolean_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='promotedpropertyvalue',
+            constraint=models.UniqueConstraint(fields=('device', 'definition'), name='unique_promoted_value'),
+        ),
+    ]
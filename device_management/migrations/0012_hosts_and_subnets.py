@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('device_management', '0011_promoted_properties'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Subnet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='網段名稱')),
+                ('cidr', models.CharField(help_text='例如 192.168.1.0/24', max_length=43, unique=True, verbose_name='CIDR')),
+                ('description', models.TextField(blank=True, default='', verbose_name='描述')),
+                ('color', models.CharField(default='#64748b', max_length=20, verbose_name='顏色')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+            ],
+            options={
+                'verbose_name': '網段',
+                'verbose_name_plural': '網段',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='service_type',
+            field=models.CharField(choices=[('Web', 'Web'), ('Database', '資料庫'), ('Application', '應用程式'), ('File', '檔案'), ('Monitoring', '監控'), ('Security', '資安'), ('Other', '其他')], default='Other', max_length=20, verbose_name='服務類型'),
+        ),
+        migrations.AddField(
+            model_name='iprecord',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='最後回應時間'),
+        ),
+        migrations.AddField(
+            model_name='iprecord',
+            name='subnet',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ip_records', to='device_management.subnet', verbose_name='網段'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['service_type', 'status'], name='device_mana_service_86df80_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='iprecord',
+            index=models.Index(fields=['is_active', 'subnet', 'ip_address', 'id'], name='device_mana_is_acti_715bcb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='iprecord',
+            index=models.Index(fields=['is_active', 'ip_address', 'id'], name='device_mana_is_acti_c619c7_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('device_management', '0012_hosts_and_subnets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='標籤名稱')),
+                ('color', models.CharField(default='#64748b', max_length=20, verbose_name='顏色')),
+                ('description', models.TextField(blank=True, default='', verbose_name='描述')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+            ],
+            options={
+                'verbose_name': '標籤',
+                'verbose_name_plural': '標籤',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DeviceTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='標記時間')),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='device_management.device', verbose_name='裝置')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='device_links', to='device_management.tag', verbose_name='標籤')),
+            ],
+            options={
+                'verbose_name': '裝置標籤',
+                'verbose_name_plural': '裝置標籤',
+            },
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='devices', through='device_management.DeviceTag', to='device_management.tag', verbose_name='標籤'),
+        ),
+        migrations.AddIndex(
+            model_name='devicetag',
+            index=models.Index(fields=['tag', 'device'], name='device_tag_reverse_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='devicetag',
+            constraint=models.UniqueConstraint(fields=('device', 'tag'), name='unique_device_tag'),
+        ),
+    ]
@@ -0,0 +1,449 @@
+import base64
+import binascii
+import hashlib
+import json
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date, parse_etags
+from rest_framework import permissions, relations, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from . import access_audit
+from .models import AuditLog, Tombstone
+from .pagination import HistoryCursorPagination
+from .permissions import get_row_policy, is_admin
+from .serializers import AuditLogSerializer
+
+
+def _digest(*parts):
+    """將版本狀態雜湊為簡短的識別字串"""
+    return hashlib.blake2b(repr(parts).encode(), digest_size=10).hexdigest()
+
+
+class RowPermissionMixin:
+    """
+    列級權限：依模型的 RowPolicy 在查詢集上篩選可存取的資料列
+
+    列表、詳情、自訂動作與批次操作都經由 get_queryset 取得資料，因此套用同一規則；
+    寫入時關聯欄位的可選範圍也依關聯模型的規則限制
+    """
+
+    def get_row_policy(self):
+        return get_row_policy(self.queryset.model)
+
+    def get_queryset(self):
+        return self.get_row_policy().filter_queryset(super().get_queryset(), self.request.user)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.request.method not in permissions.SAFE_METHODS:
+            self.restrict_related_fields(serializer)
+        return serializer
+
+    def restrict_related_fields(self, serializer):
+        """寫入時關聯欄位只能指向使用者可存取的資料（例如 IP 記錄只能綁定自己負責的裝置）"""
+        fields = getattr(serializer, 'child', serializer).fields
+        for field in fields.values():
+            if isinstance(field, relations.ManyRelatedField):
+                field = field.child_relation
+            if not isinstance(field, relations.RelatedField) or field.queryset is None:
+                continue
+            policy = get_row_policy(field.queryset.model)
+            if policy.owner_path is not None:
+                field.queryset = policy.filter_queryset(field.queryset, self.request.user)
+
+
+class FastListMixin:
+    """列表快速路徑：以 values_list() 查詢並透過 RowMapper 輸出"""
+    list_fast_path = True
+    list_row_mapper = None
+
+    def get_list_row_mapper(self):
+        """取得列表使用的資料列對應表"""
+        return self.list_row_mapper
+
+    def list(self, request, *args, **kwargs):
+        """列出資料，啟用快速路徑時略過 ModelSerializer 的逐欄處理"""
+        if not self.list_fast_path or self.list_row_mapper is None:
+            return super().list(request, *args, **kwargs)
+
+        mapper = self.get_list_row_mapper()
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values_list(*mapper.columns)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(mapper.map_rows(page))
+        return Response(mapper.map_rows(rows))
+
+
+class ConditionalRequestMixin:
+    """
+    HTTP 條件式請求：
+    列表與詳情回應附帶 ETag / Last-Modified，資料未變更時只需一次輕量查詢即可回應 304；
+    PUT / PATCH 支援 If-Match，版本不符時回應 412 以避免覆寫他人的修改
+    """
+    conditional_timestamp_field = 'updated_at'
+
+    def get_conditional_related(self):
+        """額外納入版本計算的關聯，取其 updated_at 最大值與數量"""
+        return ()
+
+    def _related_aggregates(self):
+        aggregates = {}
+        for relation in self.get_conditional_related():
+            aggregates[f'{relation}__modified'] = Max(
+                f'{relation}__{self.conditional_timestamp_field}'
+            )
+            aggregates[f'{relation}__count'] = Count(relation, distinct=True)
+        return aggregates
+
+    def get_conditional_date(self):
+        """
+        詳情內容依日期計算（如預設為今天的估值）時回傳該日期：
+        日期納入 ETag，且不使用 Last-Modified（資料未變更但隔天內容仍會改變）
+        """
+        return None
+
+    def _variant(self):
+        """同一資源的不同表示：使用者可見範圍與查詢參數"""
+        user = self.request.user
+        scope = 'all' if is_admin(user) else f'user:{user.pk}'
+        return scope, sorted(self.request.query_params.lists())
+
+    def _object_queryset(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return (
+            self.get_queryset()
+            .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            .order_by()
+            .prefetch_related(None)
+        )
+
+    def get_list_validators(self):
+        """以篩選後查詢集的數量與最後更新時間計算列表的 ETag 與 Last-Modified"""
+        field = self.conditional_timestamp_field
+        queryset = self.filter_queryset(self.get_queryset()).order_by().prefetch_related(None)
+        state = queryset.aggregate(
+            _count=Count('pk'),
+            _modified=Max(field),
+            **self._related_aggregates()
+        )
+        timestamps = [value for value in state.values() if isinstance(value, datetime)]
+        last_modified = max(timestamps) if timestamps else None
+        etag = 'W/"%s"' % _digest(sorted(state.items()), self._variant())
+        return etag, last_modified
+
+    def get_object_validators(self):
+        """計算單一物件的 ETag 與 Last-Modified；物件不存在時回傳 None"""
+        field = self.conditional_timestamp_field
+        related = self._related_aggregates()
+        row = (
+            self._object_queryset()
+            .annotate(**related)
+            .values_list('pk', field, *related.keys())
+            .first()
+        )
+        if row is None:
+            return None
+        pk, modified, related_state = row[0], row[1], row[2:]
+        timestamps = [modified] + [value for value in related_state if isinstance(value, datetime)]
+        date = self.get_conditional_date()
+        if date is not None:
+            etag = '"%s-%s"' % (_digest(pk, modified), _digest(related_state, self._variant(), date))
+            return etag, None
+        etag = '"%s-%s"' % (_digest(pk, modified), _digest(related_state, self._variant()))
+        return etag, max(value for value in timestamps if value is not None)
+
+    def _current_version(self):
+        """鎖定物件並取得目前版本（ETag 的第一段）"""
+        row = (
+            self._object_queryset()
+            .select_for_update()
+            .values_list('pk', self.conditional_timestamp_field)
+            .first()
+        )
+        return None if row is None else _digest(*row)
+
+    def _set_validators(self, response, validators):
+        if validators is None or response.status_code >= 400:
+            return response
+        etag, last_modified = validators
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        # 回應因使用者而異，瀏覽器可快取但每次都必須重新驗證
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
+
+    def _conditional(self, request, validators, handler, *args, **kwargs):
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        etag, last_modified = validators
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        return self._set_validators(response, validators)
+
+    def list(self, request, *args, **kwargs):
+        """列表支援 If-None-Match / If-Modified-Since"""
+        return self._conditional(request, self.get_list_validators(), super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        """詳情支援 If-None-Match / If-Modified-Since"""
+        return self._conditional(
+            request, self.get_object_validators(), super().retrieve, *args, **kwargs
+        )
+
+    def update(self, request, *args, **kwargs):
+        """更新支援 If-Match 樂觀鎖定"""
+        if_match = request.META.get('HTTP_IF_MATCH')
+        if not if_match:
+            response = super().update(request, *args, **kwargs)
+            return self._set_validators(response, self.get_object_validators())
+
+        with transaction.atomic():
+            version = self._current_version()
+            if version is not None:
+                etags = parse_etags(if_match)
+                versions = {etag.removeprefix('W/').strip('"').split('-')[0] for etag in etags}
+                if '*' not in etags and version not in versions:
+                    return Response(
+                        {'detail': '資源已被修改，請重新取得最新版本後再更新'},
+                        status=status.HTTP_412_PRECONDITION_FAILED
+                    )
+            response = super().update(request, *args, **kwargs)
+        return self._set_validators(response, self.get_object_validators())
+
+
+class ChangeFeedMixin:
+    """
+    增量同步：GET changes/?since=<cursor> 只回傳游標之後新增、修改或刪除的資料。
+    修改依 (updated_at, id) 排序，刪除來自 Tombstone，兩者各自記錄位置於游標中
+
+    updated_at 在交易內決定、提交後才可見，較晚提交的資料可能排在已回傳的資料之前。
+    因此游標不會超過 change_feed_lag 之前的時間點：最近的資料仍會回傳，
+    但下次請求會再次回傳（用戶端以 (id, updated_at) 去除重複）
+    """
+    change_feed_default_limit = 500
+    change_feed_max_limit = 5000
+    change_feed_lag = timedelta(seconds=30)
+
+    @staticmethod
+    def _encode_cursor(position):
+        raw = json.dumps(position, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        """解析游標，回傳 {'changed': (時間, id) | None, 'deleted': (時間, id) | None}"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            position = json.loads(raw)
+            return {
+                key: (datetime.fromisoformat(position[key][0]), int(position[key][1]))
+                if position.get(key) else None
+                for key in ('changed', 'deleted')
+            }
+        except (binascii.Error, ValueError, TypeError, KeyError, IndexError, AttributeError):
+            raise ValidationError({'since': ['無效的同步游標']})
+
+    def _get_change_limit(self):
+        try:
+            limit = int(self.request.query_params.get('limit', self.change_feed_default_limit))
+        except ValueError:
+            raise ValidationError({'limit': ['必須是整數']})
+        return max(1, min(limit, self.change_feed_max_limit))
+
+    @staticmethod
+    def _after(queryset, field, position):
+        """篩選排序位置在 position 之後的資料"""
+        if position is None:
+            return queryset
+        timestamp, pk = position
+        return queryset.filter(Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'pk__gt': pk}))
+
+    @staticmethod
+    def _settle(rows, positions, position, limit, horizon):
+        """
+        截取一頁並計算新位置，回傳 (資料列, 新位置, 是否還有更多)
+
+        rows 最多 limit + 1 筆、positions 為對應的 (時間, id)；新位置只前進到 horizon 之前的最後一筆，
+        之後的資料可能還有未提交的交易，此時不回報還有更多，避免用戶端反覆取得同一頁
+        """
+        has_more = len(rows) > limit
+        rows, positions = rows[:limit], positions[:limit]
+        settled = [row_position for row_position in positions if row_position[0] <= horizon]
+        if len(settled) < len(positions):
+            has_more = False
+        return rows, settled[-1] if settled else position, has_more
+
+    def get_tombstone_queryset(self):
+        """可見的刪除記錄：一般用戶只能看到自己負責的資料"""
+        queryset = Tombstone.objects.filter(model_name=self.get_queryset().model.__name__)
+        return get_row_policy(Tombstone).filter_queryset(queryset, self.request.user)
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """取得游標之後的變更與刪除"""
+        since = request.query_params.get('since')
+        position = self._decode_cursor(since) if since else {'changed': None, 'deleted': None}
+        limit = self._get_change_limit()
+        horizon = timezone.now() - self.change_feed_lag
+
+        changed = list(
+            self._after(self.get_queryset(), 'updated_at', position['changed'])
+            .order_by('updated_at', 'pk')[:limit + 1]
+        )
+        deleted = list(
+            self._after(self.get_tombstone_queryset(), 'deleted_at', position['deleted'])
+            .order_by('deleted_at', 'pk')
+            .values_list('deleted_at', 'pk', 'object_id')[:limit + 1]
+        )
+        next_position = {}
+        changed, next_position['changed'], more_changed = self._settle(
+            changed, [(row.updated_at, row.pk) for row in changed], position['changed'], limit, horizon
+        )
+        deleted, next_position['deleted'], more_deleted = self._settle(
+            deleted, [row[:2] for row in deleted], position['deleted'], limit, horizon
+        )
+        has_more = more_changed or more_deleted
+
+        serializer = self.get_serializer(changed, many=True)
+        return Response({
+            'changed': serializer.data,
+            'deleted': [object_id for _, _, object_id in deleted],
+            'cursor': self._encode_cursor({
+                key: [value[0].isoformat(), value[1]] if value else None
+                for key, value in next_position.items()
+            }),
+            'has_more': has_more,
+        })
+
+
+class TimeWindowMixin:
+    """since / until 查詢參數：以 [since, until) 限制依時間排序的查詢"""
+    default_window_days = None
+
+    def get_default_window_days(self):
+        """未指定 since 時的預設查詢天數，None 表示不限制"""
+        return self.default_window_days
+
+    def get_time_window(self):
+        """解析 since / until，接受 ISO 8601 日期或日期時間"""
+        params = self.request.query_params
+        window = {}
+        errors = {}
+        for name in ('since', 'until'):
+            value = params.get(name)
+            if not value:
+                continue
+            try:
+                parsed = parse_datetime(value)
+                if parsed is None:
+                    day = parse_date(value)
+                    parsed = datetime.combine(day, time.min) if day else None
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                errors[name] = ['日期時間格式錯誤，請使用 ISO 8601 格式']
+                continue
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed)
+            window[name] = parsed
+        if errors:
+            raise ValidationError(errors)
+
+        if 'since' not in window:
+            days = self.get_default_window_days()
+            if days:
+                window['since'] = timezone.now() - timedelta(days=days)
+        return window.get('since'), window.get('until')
+
+    def filter_time_window(self, queryset, field='timestamp'):
+        since, until = self.get_time_window()
+        if since is not None:
+            queryset = queryset.filter(**{f'{field}__gte': since})
+        if until is not None:
+            queryset = queryset.filter(**{f'{field}__lt': until})
+        return queryset
+
+
+class HistoryMixin(TimeWindowMixin):
+    """
+    GET {id}/history/：依 (model_name, object_pk, timestamp) 索引查詢單一物件的操作歷史，
+    以游標分頁由新到舊回傳，並可用 since / until 限定時間範圍
+
+    日誌套用 AuditLog 的列級權限（與操作日誌列表相同）：一般用戶只看得到自己的操作
+    """
+    history_model_name = None
+    history_pagination_class = HistoryCursorPagination
+
+    def get_history_queryset(self, instance):
+        model_name = self.history_model_name or type(instance).__name__
+        queryset = AuditLog.objects.filter(
+            model_name=model_name,
+            object_pk=instance.pk
+        ).select_related('user')
+        queryset = get_row_policy(AuditLog).filter_queryset(queryset, self.request.user)
+        return self.filter_time_window(queryset)
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """獲取物件的操作歷史"""
+        instance = self.get_object()
+        paginator = self.history_pagination_class()
+        # 不傳入 view，避免分頁沿用 ViewSet 的 OrderingFilter 排序欄位
+        page = paginator.paginate_queryset(self.get_history_queryset(instance), request)
+        serializer = AuditLogSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class AccessAuditMixin:
+    """
+    讀取稽核：access_audit_actions 中的動作成功回應後，
+    將回傳的物件 ID 交給記憶體中的 AccessRecorder 彙總，不在請求中寫入資料庫
+    """
+    access_audit_actions = ()
+    access_audit_model_name = None
+
+    def audits_access(self, action_name):
+        return action_name in self.access_audit_actions
+
+    @staticmethod
+    def _accessed_ids(data):
+        """從列表、分頁或單一物件的回應資料取出 ID"""
+        if isinstance(data, dict):
+            items = data['results'] if isinstance(data.get('results'), list) else [data]
+        elif isinstance(data, list):
+            items = data
+        else:
+            return []
+        return [item['id'] for item in items if isinstance(item, dict) and 'id' in item]
+
+    def get_access_recorder(self):
+        return access_audit.get_recorder()
+
+    def record_access(self, user, data):
+        if not user or not user.is_authenticated:
+            return
+        model_name = self.access_audit_model_name or self.queryset.model.__name__
+        self.get_access_recorder().record(user.pk, model_name, self._accessed_ids(data))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK and self.audits_access(getattr(self, 'action', None)):
+            self.record_access(request.user, response.data)
+        return response
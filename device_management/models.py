@@ -1,8 +1,13 @@
+import ipaddress
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import validate_ipv4_address
 from django.utils import timezone
 
+from . import valuation
+
 
 class DeviceCategory(models.Model):
     """裝置類別模型，定義不同類型的裝置（如印表機、電腦等）"""
@@ -65,6 +70,11 @@ class PropertyDefinition(models.Model):
     )
     help_text = models.TextField(blank=True, null=True, verbose_name='說明文字')
     order = models.IntegerField(default=0, verbose_name='排序')
+    is_promoted = models.BooleanField(
+        default=False,
+        help_text='以型態化、有索引的欄位同步保存此屬性的值，加速篩選與排序',
+        verbose_name='提升為索引欄位'
+    )
     
     class Meta:
         verbose_name = '屬性定義'
@@ -74,6 +84,19 @@ class PropertyDefinition(models.Model):
     
     def __str__(self):
         return f'{self.category.name} - {self.name}'
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._touch_category()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self._touch_category()
+        return result
+    
+    def _touch_category(self):
+        """屬性定義變更時更新類別的時間戳記，使類別的 ETag 失效"""
+        DeviceCategory.objects.filter(pk=self.category_id).update(updated_at=timezone.now())
 
 
 class Device(models.Model):
@@ -84,6 +107,15 @@ class Device(models.Model):
         ('maintenance', '維修中'),
         ('retired', '已報廢'),
     ]
+    SERVICE_TYPES = [
+        ('Web', 'Web'),
+        ('Database', '資料庫'),
+        ('Application', '應用程式'),
+        ('File', '檔案'),
+        ('Monitoring', '監控'),
+        ('Security', '資安'),
+        ('Other', '其他'),
+    ]
     
     # 基本資訊
     serial_number = models.CharField(
@@ -112,6 +144,19 @@ class Device(models.Model):
         related_name='responsible_devices',
         verbose_name='責任人'
     )
+    service_type = models.CharField(
+        max_length=20,
+        choices=SERVICE_TYPES,
+        default='Other',
+        verbose_name='服務類型'
+    )
+    tags = models.ManyToManyField(
+        'Tag',
+        through='DeviceTag',
+        blank=True,
+        related_name='devices',
+        verbose_name='標籤'
+    )
     
     # 動態屬性（使用 JSONB 儲存）
     custom_properties = models.JSONField(
@@ -149,6 +194,27 @@ class Device(models.Model):
         help_text='年折舊率（百分比）',
         verbose_name='折舊率'
     )
+    depreciation_method = models.CharField(
+        max_length=20,
+        choices=valuation.METHOD_CHOICES,
+        default=valuation.STRAIGHT_LINE,
+        verbose_name='折舊方法'
+    )
+    depreciation_schedule = models.JSONField(
+        null=True,
+        blank=True,
+        validators=[valuation.validate_schedule],
+        help_text='折舊表：每一年折舊成本的百分比，例如 [40, 30, 20, 10]',
+        verbose_name='折舊表'
+    )
+    salvage_value = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text='折舊後的最低價值',
+        verbose_name='殘值'
+    )
     warranty_end_date = models.DateField(
         null=True,
         blank=True,
@@ -192,20 +258,50 @@ class Device(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['department']),
             models.Index(fields=['location']),
+            models.Index(fields=['updated_at', 'id']),
+            # 預設排序與 Admin 的日期階層篩選
+            models.Index(fields=['-created_at']),
+            # 到期查詢（expiring 動作與到期摘要）以日期範圍掃描
+            models.Index(fields=['warranty_end_date']),
+            models.Index(fields=['retirement_date']),
+            # 主機列表依服務類型篩選
+            models.Index(fields=['service_type', 'status']),
         ]
     
     def __str__(self):
         return f'{self.name} ({self.serial_number})'
     
-    def get_current_depreciation(self):
-        """計算當前折舊值"""
-        if not self.cost or not self.depreciation_rate or not self.purchase_date:
-            return None
-        
-        years_passed = (timezone.now().date() - self.purchase_date).days / 365.25
-        depreciation_amount = float(self.cost) * float(self.depreciation_rate) / 100 * years_passed
-        current_value = float(self.cost) - depreciation_amount
-        return max(current_value, 0)
+    def get_current_depreciation(self, as_of=None):
+        """計算折舊後的價值（預設為今天，可指定日期）"""
+        return valuation.value_as_of(self, as_of)
+
+
+class Subnet(models.Model):
+    """網段模型，IP 記錄依位址自動歸屬於包含它的最小網段"""
+    name = models.CharField(max_length=100, verbose_name='網段名稱')
+    cidr = models.CharField(max_length=43, unique=True, help_text='例如 192.168.1.0/24', verbose_name='CIDR')
+    description = models.TextField(blank=True, default='', verbose_name='描述')
+    color = models.CharField(max_length=20, default='#64748b', verbose_name='顏色')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新時間')
+    
+    class Meta:
+        verbose_name = '網段'
+        verbose_name_plural = '網段'
+        ordering = ['name']
+    
+    def __str__(self):
+        return f'{self.name} ({self.cidr})'
+    
+    @property
+    def network(self):
+        return ipaddress.ip_network(self.cidr, strict=False)
+    
+    def clean(self):
+        try:
+            self.cidr = str(ipaddress.ip_network(self.cidr, strict=False))
+        except ValueError:
+            raise ValidationError({'cidr': 'CIDR 格式錯誤'})
 
 
 class IPRecord(models.Model):
@@ -230,6 +326,17 @@ class IPRecord(models.Model):
         verbose_name='分配日期'
     )
     is_active = models.BooleanField(default=True, verbose_name='是否啟用')
+    # 依 IP 位址自動歸屬（見 hosts.assign_subnets）
+    subnet = models.ForeignKey(
+        Subnet,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='ip_records',
+        verbose_name='網段'
+    )
+    last_seen_at = models.DateTimeField(null=True, blank=True, verbose_name='最後回應時間')
     notes = models.TextField(blank=True, null=True, verbose_name='備註')
     
     # 歷史記錄
@@ -251,6 +358,12 @@ class IPRecord(models.Model):
             models.Index(fields=['ip_address']),
             models.Index(fields=['mac_address']),
             models.Index(fields=['is_active']),
+            models.Index(fields=['updated_at', 'id']),
+            # 預設排序與 Admin 的日期階層篩選
+            models.Index(fields=['-assigned_date']),
+            # 主機列表：依網段篩選並以 IP 位址游標分頁
+            models.Index(fields=['is_active', 'subnet', 'ip_address', 'id']),
+            models.Index(fields=['is_active', 'ip_address', 'id']),
         ]
     
     def __str__(self):
@@ -295,6 +408,8 @@ class AuditLog(models.Model):
     )
     model_name = models.CharField(max_length=100, verbose_name='模型名稱')
     object_id = models.CharField(max_length=100, verbose_name='物件 ID')
+    # 數值型的物件主鍵，供依物件查詢歷史時使用索引；object_id 非整數時為空
+    object_pk = models.BigIntegerField(null=True, blank=True, verbose_name='物件主鍵')
     object_repr = models.CharField(
         max_length=200,
         blank=True,
@@ -322,8 +437,341 @@ class AuditLog(models.Model):
             models.Index(fields=['user', '-timestamp']),
             models.Index(fields=['model_name', '-timestamp']),
             models.Index(fields=['action', '-timestamp']),
+            models.Index(fields=['model_name', 'object_pk', '-timestamp']),
+            # 預設排序與 Admin 的日期階層篩選
+            models.Index(fields=['-timestamp']),
+        ]
+    
+    def __str__(self):
+        return f'{self.user} - {self.action} - {self.model_name} ({self.timestamp})'
+    
+    @staticmethod
+    def parse_object_pk(object_id):
+        """將 object_id 轉為整數主鍵，非整數時回傳 None"""
+        value = str(object_id)
+        if value.isascii() and value.isdigit() and len(value) <= 18:
+            return int(value)
+        return None
+    
+    def save(self, *args, **kwargs):
+        """儲存時自動填入 object_pk"""
+        if self.object_pk is None:
+            self.object_pk = self.parse_object_pk(self.object_id)
+        super().save(*args, **kwargs)
+
+
+class AuditLogArchive(models.Model):
+    """
+    操作日誌封存表（不支援分割的資料庫使用）
+    保留原始 ID，超過熱資料期間的日誌由 prune_audit_logs 指令分批移入
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name='ID')
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='操作用戶'
+    )
+    action = models.CharField(
+        max_length=20,
+        choices=AuditLog.ACTION_CHOICES,
+        verbose_name='操作類型'
+    )
+    model_name = models.CharField(max_length=100, verbose_name='模型名稱')
+    object_id = models.CharField(max_length=100, verbose_name='物件 ID')
+    object_pk = models.BigIntegerField(null=True, blank=True, verbose_name='物件主鍵')
+    object_repr = models.CharField(
+        max_length=200,
+        blank=True,
+        null=True,
+        verbose_name='物件表示'
+    )
+    changes = models.JSONField(blank=True, null=True, verbose_name='變更內容')
+    ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name='操作 IP')
+    user_agent = models.TextField(blank=True, null=True, verbose_name='用戶代理')
+    timestamp = models.DateTimeField(verbose_name='操作時間')
+    
+    class Meta:
+        verbose_name = '封存操作日誌'
+        verbose_name_plural = '封存操作日誌'
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp', 'id']),
         ]
     
     def __str__(self):
         return f'{self.user} - {self.action} - {self.model_name} ({self.timestamp})'
 
+
+class AccessCount(models.Model):
+    """讀取稽核：每位用戶在每個時間區間內讀取各物件的次數（由記憶體彙總後批次寫入）"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='access_counts',
+        verbose_name='讀取用戶'
+    )
+    model_name = models.CharField(max_length=100, verbose_name='模型名稱')
+    object_pk = models.BigIntegerField(verbose_name='物件主鍵')
+    bucket = models.DateTimeField(verbose_name='時間區間')
+    count = models.PositiveIntegerField(default=0, verbose_name='讀取次數')
+    first_seen = models.DateTimeField(verbose_name='首次讀取')
+    last_seen = models.DateTimeField(verbose_name='最後讀取')
+    
+    class Meta:
+        verbose_name = '讀取紀錄'
+        verbose_name_plural = '讀取紀錄'
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'model_name', 'object_pk', 'bucket'],
+                name='unique_access_count_bucket'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['model_name', 'object_pk', '-bucket']),
+        ]
+    
+    def __str__(self):
+        return f'{self.user} - {self.model_name} #{self.object_pk} ({self.bucket}): {self.count}'
+
+
+class Tombstone(models.Model):
+    """刪除記錄，供增量同步回報已刪除的資料"""
+    model_name = models.CharField(max_length=100, verbose_name='模型名稱')
+    object_id = models.BigIntegerField(verbose_name='物件 ID')
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='責任人'
+    )
+    deleted_at = models.DateTimeField(default=timezone.now, verbose_name='刪除時間')
+    
+    class Meta:
+        verbose_name = '刪除記錄'
+        verbose_name_plural = '刪除記錄'
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            models.Index(fields=['model_name', 'deleted_at', 'id']),
+        ]
+    
+    def __str__(self):
+        return f'{self.model_name} #{self.object_id} ({self.deleted_at})'
+
+
+class APIToken(models.Model):
+    """機器用戶端的 API 權杖（只保存雜湊值，原始權杖僅在建立時顯示一次）"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='api_tokens',
+        verbose_name='用戶'
+    )
+    name = models.CharField(max_length=100, verbose_name='名稱')
+    prefix = models.CharField(max_length=12, verbose_name='前綴')
+    key_hash = models.CharField(max_length=64, unique=True, verbose_name='權杖雜湊')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name='到期時間')
+    last_used_at = models.DateTimeField(null=True, blank=True, verbose_name='最後使用時間')
+    revoked_at = models.DateTimeField(null=True, blank=True, verbose_name='撤銷時間')
+    
+    class Meta:
+        verbose_name = 'API 權杖'
+        verbose_name_plural = 'API 權杖'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f'{self.user} - {self.name} ({self.prefix}…)'
+    
+    @property
+    def is_active(self):
+        if self.revoked_at is not None:
+            return False
+        return self.expires_at is None or self.expires_at > timezone.now()
+
+
+class Notification(models.Model):
+    """站內通知（由到期摘要等排程指令批次建立，再由通知後端送出）"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        verbose_name='收件人'
+    )
+    kind = models.CharField(max_length=50, verbose_name='類型')
+    key = models.CharField(max_length=100, help_text='同一類型的通知以此去重，例如摘要日期', verbose_name='識別鍵')
+    subject = models.CharField(max_length=200, verbose_name='主旨')
+    body = models.TextField(verbose_name='內容')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='資料')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    delivered_at = models.DateTimeField(null=True, blank=True, verbose_name='送出時間')
+    
+    class Meta:
+        verbose_name = '通知'
+        verbose_name_plural = '通知'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'kind', 'key'], name='unique_notification_key'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'key', 'delivered_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.user} - {self.subject}'
+
+
+class PropertyMigration(models.Model):
+    """動態屬性結構演進工作：屬性定義變更後分批改寫該類別裝置的 custom_properties"""
+    STATUS_CHOICES = [
+        ('pending', '待執行'),
+        ('running', '執行中'),
+        ('completed', '已完成'),
+        ('failed', '失敗'),
+    ]
+    
+    category = models.ForeignKey(
+        DeviceCategory,
+        on_delete=models.CASCADE,
+        related_name='property_migrations',
+        verbose_name='類別'
+    )
+    definition = models.ForeignKey(
+        PropertyDefinition,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='migrations',
+        verbose_name='屬性定義'
+    )
+    operations = models.JSONField(verbose_name='操作')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='狀態')
+    total = models.PositiveIntegerField(default=0, verbose_name='裝置總數')
+    processed = models.PositiveIntegerField(default=0, verbose_name='已處理')
+    updated = models.PositiveIntegerField(default=0, verbose_name='已改寫')
+    invalid = models.PositiveIntegerField(default=0, help_text='無法轉換為新型態的值', verbose_name='無法轉換')
+    missing = models.PositiveIntegerField(default=0, help_text='缺少必填屬性的裝置', verbose_name='缺少必填')
+    samples = models.JSONField(default=list, blank=True, help_text='無法轉換或缺少必填屬性的裝置 ID（部分）', verbose_name='問題裝置')
+    last_pk = models.BigIntegerField(default=0, verbose_name='游標')
+    error = models.TextField(blank=True, default='', verbose_name='錯誤訊息')
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='建立者'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='開始時間')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='完成時間')
+    
+    class Meta:
+        verbose_name = '屬性結構演進'
+        verbose_name_plural = '屬性結構演進'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['category', 'status', 'id']),
+        ]
+    
+    def __str__(self):
+        return f'{self.category} #{self.pk} ({self.get_status_display()})'
+    
+    @property
+    def progress(self):
+        """完成比例（0–1）"""
+        if self.status == 'completed':
+            return 1.0
+        return min(self.processed / self.total, 1.0) if self.total else 0.0
+
+
+class PromotedPropertyValue(models.Model):
+    """提升屬性的型態化值（每台裝置、每個屬性一列），由 custom_properties 同步產生"""
+    device = models.ForeignKey(
+        Device,
+        on_delete=models.CASCADE,
+        related_name='promoted_values',
+        verbose_name='裝置'
+    )
+    definition = models.ForeignKey(
+        PropertyDefinition,
+        on_delete=models.CASCADE,
+        related_name='promoted_values',
+        verbose_name='屬性定義'
+    )
+    text_value = models.CharField(max_length=255, null=True, blank=True, verbose_name='文字值')
+    number_value = models.FloatField(null=True, blank=True, verbose_name='數字值')
+    date_value = models.DateField(null=True, blank=True, verbose_name='日期值')
+    boolean_value = models.BooleanField(null=True, blank=True, verbose_name='布林值')
+    
+    class Meta:
+        verbose_name = '提升屬性值'
+        verbose_name_plural = '提升屬性值'
+        constraints = [
+            models.UniqueConstraint(fields=['device', 'definition'], name='unique_promoted_value'),
+        ]
+        indexes = [
+            # 依屬性篩選值的範圍並取得裝置 ID，只需掃描索引
+            models.Index(fields=['definition', 'text_value', 'device'], name='promoted_text_idx'),
+            models.Index(fields=['definition', 'number_value', 'device'], name='promoted_number_idx'),
+            models.Index(fields=['definition', 'date_value', 'device'], name='promoted_date_idx'),
+            models.Index(fields=['definition', 'boolean_value', 'device'], name='promoted_boolean_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.device_id} - {self.definition_id}'
+
+
+class Tag(models.Model):
+    """標籤模型，裝置可有多個標籤，可依標籤篩選裝置與主機"""
+    name = models.CharField(max_length=50, unique=True, verbose_name='標籤名稱')
+    color = models.CharField(max_length=20, default='#64748b', verbose_name='顏色')
+    description = models.TextField(blank=True, default='', verbose_name='描述')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    
+    class Meta:
+        verbose_name = '標籤'
+        verbose_name_plural = '標籤'
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
+class DeviceTag(models.Model):
+    """裝置與標籤的關聯"""
+    device = models.ForeignKey(
+        Device,
+        on_delete=models.CASCADE,
+        related_name='tag_links',
+        verbose_name='裝置'
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='device_links',
+        verbose_name='標籤'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='標記時間')
+    
+    class Meta:
+        verbose_name = '裝置標籤'
+        verbose_name_plural = '裝置標籤'
+        constraints = [
+            # (裝置, 標籤) 的唯一索引同時用於查詢裝置的標籤與「裝置是否有此標籤」的 EXISTS 子查詢
+            models.UniqueConstraint(fields=['device', 'tag'], name='unique_device_tag'),
+        ]
+        indexes = [
+            # 反向：依標籤取得裝置，只需掃描索引
+            models.Index(fields=['tag', 'device'], name='device_tag_reverse_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.device_id} - {self.tag_id}'
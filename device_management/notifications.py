@@ -0,0 +1,128 @@
+"""
+通知送出
+
+排程指令先以 bulk_create 批次建立 Notification（同一收件人、類型與識別鍵只建立一次），
+再依批次交給通知後端送出並標記送出時間；中途失敗時重新執行指令只會補送尚未送出的通知。
+
+後端可透過 settings.NOTIFICATIONS 抽換：
+- ConsoleBackend：輸出至標準輸出，適用開發環境
+- FileBackend：以 JSONL 附加寫入檔案，可離線檢查與測試
+- LocMemBackend：保存在記憶體（outbox），供測試使用
+"""
+
+import json
+import sys
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Notification
+
+DEFAULTS = {
+    'BACKEND': 'device_management.notifications.ConsoleBackend',
+    'OPTIONS': {},
+    'BATCH_SIZE': 500,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATIONS', {})}
+
+
+def serialize(notification):
+    """通知的輸出格式"""
+    return {
+        'id': notification.pk,
+        'user_id': notification.user_id,
+        'username': notification.user.username,
+        'email': notification.user.email,
+        'kind': notification.kind,
+        'key': notification.key,
+        'subject': notification.subject,
+        'body': notification.body,
+        'payload': notification.payload,
+    }
+
+
+class ConsoleBackend:
+    """將通知輸出至標準輸出"""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def send(self, notifications):
+        stream = self.stream or sys.stdout
+        for notification in notifications:
+            stream.write(f'收件人：{notification.user.username} <{notification.user.email}>\n')
+            stream.write(f'主旨：{notification.subject}\n\n{notification.body}\n')
+            stream.write('-' * 40 + '\n')
+        stream.flush()
+
+
+class FileBackend:
+    """將通知以 JSONL 附加寫入檔案"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def send(self, notifications):
+        lines = [
+            json.dumps(serialize(notification), ensure_ascii=False, default=str) + '\n'
+            for notification in notifications
+        ]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, self.path.open('a', encoding='utf-8') as output:
+            output.writelines(lines)
+
+
+outbox = []
+
+
+class LocMemBackend:
+    """將通知保存在模組層級的 outbox 清單"""
+
+    def send(self, notifications):
+        outbox.extend(serialize(notification) for notification in notifications)
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    """依 settings.NOTIFICATIONS 建立通知後端（每個行程一個實例）"""
+    config = get_config()
+    return import_string(config['BACKEND'])(**config['OPTIONS'])
+
+
+def create(notifications, batch_size=None):
+    """批次建立通知；已存在相同（收件人、類型、識別鍵）的通知會略過"""
+    Notification.objects.bulk_create(
+        notifications,
+        batch_size=batch_size or get_config()['BATCH_SIZE'],
+        ignore_conflicts=True,
+    )
+
+
+def deliver_pending(kind, key, backend=None, batch_size=None):
+    """依批次送出尚未送出的通知，每批送出後以一次 UPDATE 標記送出時間，回傳送出數量"""
+    backend = backend or get_backend()
+    batch_size = batch_size or get_config()['BATCH_SIZE']
+    pending = (
+        Notification.objects.filter(kind=kind, key=key, delivered_at__isnull=True)
+        .select_related('user')
+        .order_by('id')
+    )
+    delivered = 0
+    last_id = 0
+    while True:
+        batch = list(pending.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return delivered
+        backend.send(batch)
+        ids = [notification.pk for notification in batch]
+        Notification.objects.filter(id__in=ids).update(delivered_at=timezone.now())
+        delivered += len(batch)
+        last_id = ids[-1]
@@ -0,0 +1,171 @@
+import base64
+import datetime
+import json
+
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class HistoryCursorPagination(CursorPagination):
+    """操作歷史的游標分頁：依時間由新到舊，深層分頁不需 OFFSET 掃描"""
+    ordering = ('-timestamp', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class KeysetPagination(BasePagination):
+    """
+    複合鍵游標分頁：游標記錄上一頁最後一列的所有排序欄位值，下一頁以
+    (a > x) OR (a = x AND id > y) 條件接續，任何深度都只需索引範圍掃描
+
+    CursorPagination 只以第一個排序欄位定位，重複值多的欄位（如狀態）需以 OFFSET 跳過，
+    此類別適用於可依低基數欄位排序的列表。查詢集必須已排序，且最後一個排序欄位唯一；
+    資料列可為模型、values() 字典或 values_list() 元組（排序欄位需包含在查詢欄位中）
+    """
+    cursor_query_param = 'cursor'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    invalid_cursor_message = '游標無效'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if isinstance(position, list):
+                position = [self._decode_value(value) for value in position]
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, values):
+        values = [self._encode_value(value) for value in values]
+        return base64.urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode()
+
+    @staticmethod
+    def _encode_value(value):
+        """日期時間以完整精度的 isoformat() 保存（DjangoJSONEncoder 會截斷到毫秒，游標將無法接續）"""
+        if isinstance(value, datetime.datetime):
+            return {'datetime': value.isoformat()}
+        if isinstance(value, datetime.date):
+            return {'date': value.isoformat()}
+        return value
+
+    @staticmethod
+    def _decode_value(value):
+        if not isinstance(value, dict):
+            return value
+        if set(value) == {'datetime'}:
+            parsed = parse_datetime(value['datetime'])
+        elif set(value) == {'date'}:
+            parsed = parse_date(value['date'])
+        else:
+            parsed = None
+        if parsed is None:
+            raise ValueError(value)
+        return parsed
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = [(name.lstrip('-'), name.startswith('-')) for name in queryset.query.order_by]
+        if not self.ordering:
+            raise ValueError('KeysetPagination 需要已排序的查詢集')
+        self.fields = getattr(queryset, '_fields', None)
+        size = self.get_page_size(request)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(self._after(position))
+
+        rows = list(queryset[:size + 1])
+        self.has_next = len(rows) > size
+        rows = rows[:size]
+        self.next_position = self._position(rows[-1]) if self.has_next else None
+        return rows
+
+    def _after(self, position):
+        """排在 position 之後的資料列條件；第一個欄位另加範圍條件，讓資料庫可使用索引"""
+        (first, first_descending), first_value = self.ordering[0], position[0]
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self.ordering, position):
+            condition |= Q(**equal, **{f'{name}__{"lt" if descending else "gt"}': value})
+            equal[name] = value
+        return Q(**{f'{first}__{"lte" if first_descending else "gte"}': first_value}) & condition
+
+    def _position(self, row):
+        names = [name for name, _ in self.ordering]
+        if isinstance(row, dict):
+            return [row[name] for name in names]
+        if isinstance(row, tuple):
+            return [row[self.fields.index(name)] for name in names]
+        return [getattr(row, name) for name in names]
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+
+def estimate_row_count(model, using='default'):
+    """
+    由 PostgreSQL 統計資訊估算資料表列數（分割表加總各分割區），不需掃描資料表
+
+    其他資料庫或尚未 ANALYZE 時回傳 None
+    """
+    conn = connections[using]
+    if conn.vendor != 'postgresql':
+        return None
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT SUM(GREATEST(reltuples, 0))::bigint
+            FROM pg_class
+            WHERE oid = %s::regclass
+               OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)
+            """,
+            [model._meta.db_table, model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row[0] if row and row[0] else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin 列表的分頁器：未篩選時以統計資訊估算總數，避免大型資料表的 COUNT(*) 全表掃描；
+    有篩選條件、估算值小於 exact_threshold 或資料庫不支援估算時仍精確計數
+    """
+    exact_threshold = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimate_row_count(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate >= self.exact_threshold:
+                return estimate
+        return super().count
@@ -1,5 +1,80 @@
 from rest_framework import permissions
 
+from .models import AuditLog, Device, IPRecord, Tombstone
+
+
+def is_admin(user):
+    """管理員（staff 或 superuser）不受列級權限限制"""
+    return bool(user and (user.is_staff or user.is_superuser))
+
+
+class RowPolicy:
+    """
+    列級權限規則：以擁有者外鍵的查詢路徑描述一般用戶可存取的資料列
+
+    篩選時比對外鍵欄位（*_id），不需要載入用戶物件；
+    owner_path 為 None 表示所有已認證用戶皆可存取。
+    """
+
+    def __init__(self, owner_path=None):
+        self.owner_path = owner_path
+
+    @property
+    def lookup(self):
+        return f'{self.owner_path}_id'
+
+    def filter_queryset(self, queryset, user):
+        """將規則編譯為查詢條件，列表、詳情、批次與匯出皆使用同一個篩選"""
+        if self.owner_path is None or is_admin(user):
+            return queryset
+        if user is None or user.pk is None:
+            return queryset.none()
+        return queryset.filter(**{self.lookup: user.pk})
+
+    def permitted_pks(self, queryset, user, pks):
+        """批次操作：以單一查詢取得 pks 中使用者可存取的主鍵"""
+        queryset = self.filter_queryset(queryset.filter(pk__in=pks), user)
+        return set(queryset.values_list('pk', flat=True))
+
+    def owner_id(self, obj):
+        """取得物件擁有者的 ID；中間關聯未載入時只查詢外鍵 ID"""
+        *relations, owner = self.owner_path.split('__')
+        target = obj
+        for index, name in enumerate(relations):
+            field = target._meta.get_field(name)
+            if not field.is_cached(target):
+                remaining = '__'.join(relations[index + 1:] + [owner]) + '_id'
+                return (
+                    field.related_model._default_manager
+                    .filter(pk=getattr(target, field.attname))
+                    .values_list(remaining, flat=True)
+                    .first()
+                )
+            target = getattr(target, name)
+            if target is None:
+                return None
+        return getattr(target, target._meta.get_field(owner).attname)
+
+    def has_object_access(self, obj, user):
+        if self.owner_path is None or is_admin(user):
+            return True
+        return user is not None and user.pk is not None and self.owner_id(obj) == user.pk
+
+
+# 各模型的列級權限規則；未列出的模型所有已認證用戶皆可存取（寫入另由權限類別限制）
+ROW_POLICIES = {
+    Device: RowPolicy('responsible_person'),
+    IPRecord: RowPolicy('device__responsible_person'),
+    AuditLog: RowPolicy('user'),
+    Tombstone: RowPolicy('owner'),
+}
+UNRESTRICTED = RowPolicy()
+
+
+def get_row_policy(model):
+    """取得模型的列級權限規則"""
+    return ROW_POLICIES.get(model._meta.concrete_model, UNRESTRICTED)
+
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     """
@@ -12,12 +87,12 @@ class IsAdminOrReadOnly(permissions.BasePermission):
             return True
         
         # 只有管理員可以寫入
-        return request.user and (request.user.is_staff or request.user.is_superuser)
+        return is_admin(request.user)
 
 
 class IsOwnerOrAdmin(permissions.BasePermission):
     """
-    自訂權限：物件擁有者或管理員可以編輯
+    自訂權限：物件擁有者或管理員可以編輯（只比對外鍵 ID，不載入用戶物件）
     """
     
     def has_object_permission(self, request, view, obj):
@@ -26,15 +101,16 @@ class IsOwnerOrAdmin(permissions.BasePermission):
             return True
         
         # 管理員有完整權限
-        if request.user and (request.user.is_staff or request.user.is_superuser):
+        if is_admin(request.user):
             return True
         
         # 檢查是否為物件擁有者
-        if hasattr(obj, 'responsible_person'):
-            return obj.responsible_person == request.user
+        policy = get_row_policy(type(obj))
+        if policy.owner_path is not None:
+            return policy.has_object_access(obj, request.user)
         
-        if hasattr(obj, 'created_by'):
-            return obj.created_by == request.user
+        if hasattr(obj, 'created_by_id'):
+            return obj.created_by_id == request.user.pk
         
         return False
 
@@ -45,4 +121,4 @@ class IsAdminUser(permissions.BasePermission):
     """
     
     def has_permission(self, request, view):
-        return request.user and (request.user.is_staff or request.user.is_superuser)
+        return is_admin(request.user)
@@ -0,0 +1,218 @@
+"""
+提升的動態屬性
+
+常用於篩選與排序的屬性（如記憶體、作業系統版本）可將屬性定義設為 is_promoted，
+其值會依型態同步寫入 PromotedPropertyValue 的文字／數字／日期／布林欄位，
+並以（屬性定義, 值, 裝置）建立索引，範圍查詢與排序可使用索引而不需逐列解析 custom_properties。
+
+同步時機：
+- 裝置儲存後（post_save）重建該裝置的值
+- 屬性結構演進工作每批改寫後重建該批裝置的值；設為提升時由結構演進工作回填既有裝置
+- 取消提升或移到其他類別時刪除原本的值
+
+裝置列表以 ?prop.<名稱>[__lookup]=值 篩選、?ordering=-prop.<名稱> 排序：
+同名屬性皆已提升且型態相同時 JOIN 型態化欄位，否則退回 custom_properties 的 JSON 查詢。
+值符合屬性型態時兩者結果相同；型態化欄位會將 "16" 這類字串轉為數字，無法轉換的值視為空值。
+"""
+
+import hashlib
+from collections import defaultdict
+from datetime import date
+
+from django.db.models import F, FilteredRelation, Q
+from django.db.models.fields.json import KeyTransform
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from . import property_schema
+from .models import PromotedPropertyValue, PropertyDefinition
+
+# 各屬性型態使用的型態化欄位
+VALUE_FIELDS = {
+    'text': 'text_value',
+    'choice': 'text_value',
+    'number': 'number_value',
+    'date': 'date_value',
+    'boolean': 'boolean_value',
+}
+
+PARAM_PREFIX = 'prop.'
+LOOKUPS = {'exact', 'gt', 'gte', 'lt', 'lte', 'in', 'isnull', 'icontains'}
+
+TEXT_LENGTH = PromotedPropertyValue._meta.get_field('text_value').max_length
+
+
+def typed_value(field_type, value, choices=None):
+    """將屬性值轉為型態化欄位的值，無法轉換時回傳 None"""
+    try:
+        value = property_schema.coerce(field_type, value, choices)
+    except ValueError:
+        return None
+    if field_type == 'number':
+        return float(value)
+    if field_type == 'date':
+        return date.fromisoformat(value)
+    if VALUE_FIELDS[field_type] == 'text_value':
+        return str(value)[:TEXT_LENGTH]
+    return value
+
+
+def _build(rows, definitions):
+    """rows 為 (裝置 ID, 類別 ID, custom_properties)，產生型態化值"""
+    values = []
+    for pk, category_id, properties in rows:
+        for definition in definitions.get(category_id, ()):
+            if not properties or definition.name not in properties:
+                continue
+            value = typed_value(definition.field_type, properties[definition.name], definition.choices)
+            if value is not None:
+                values.append(PromotedPropertyValue(
+                    device_id=pk, definition=definition, **{VALUE_FIELDS[definition.field_type]: value}
+                ))
+    return values
+
+
+def _promoted_definitions(category_ids):
+    definitions = defaultdict(list)
+    for definition in PropertyDefinition.objects.filter(category_id__in=category_ids, is_promoted=True):
+        definitions[definition.category_id].append(definition)
+    return definitions
+
+
+def sync_device(device):
+    """重建單一裝置的提升屬性值（類別變更時一併清除原類別的值）"""
+    values = _build(
+        [(device.pk, device.category_id, device.custom_properties)],
+        _promoted_definitions([device.category_id]),
+    )
+    PromotedPropertyValue.objects.filter(device_id=device.pk).delete()
+    PromotedPropertyValue.objects.bulk_create(values)
+
+
+def sync(devices):
+    """依裝置查詢集目前的 custom_properties 重建提升屬性值，回傳寫入的數量"""
+    rows = list(devices.order_by().values_list('pk', 'category_id', 'custom_properties'))
+    definitions = _promoted_definitions({category_id for _, category_id, _ in rows})
+    if not definitions:
+        return 0
+    values = _build(rows, definitions)
+    PromotedPropertyValue.objects.filter(device__in=devices.order_by().values('pk')).delete()
+    PromotedPropertyValue.objects.bulk_create(values, batch_size=500)
+    return len(values)
+
+
+def clear(definition):
+    """刪除屬性定義的所有型態化值（取消提升或移到其他類別時）"""
+    PromotedPropertyValue.objects.filter(definition=definition).delete()
+
+
+def resolve(name, category=None):
+    """
+    解析篩選或排序使用的屬性，回傳 (屬性型態, 提升的屬性定義 ID)
+
+    同名屬性型態不一致時型態為 None；有任一同名屬性未提升時 ID 為 None（使用 JSON 查詢）
+    """
+    definitions = PropertyDefinition.objects.filter(name=name)
+    if category:
+        definitions = definitions.filter(category_id=category)
+    rows = list(definitions.values_list('pk', 'field_type', 'is_promoted'))
+    types = {field_type for _, field_type, _ in rows}
+    field_type = types.pop() if len(types) == 1 else None
+    if field_type is None or not all(is_promoted for _, _, is_promoted in rows):
+        return field_type, None
+    return field_type, [pk for pk, _, _ in rows]
+
+
+def _category(request):
+    category = request.query_params.get('category', '')
+    return int(category) if category.isdigit() else None
+
+
+def column(queryset, name, request):
+    """
+    取得屬性值的查詢欄位，回傳 (查詢集, 欄位名稱, 屬性型態, 是否為提升的屬性)
+
+    提升的屬性以 FilteredRelation JOIN 型態化欄位，否則以 JSON 鍵取值；
+    同一屬性的篩選與排序共用同一個別名
+    """
+    field_type, ids = resolve(name, _category(request))
+    alias = f'property_{hashlib.md5(name.encode()).hexdigest()[:12]}'
+    if ids is None:
+        if alias not in queryset.query.annotations:
+            queryset = queryset.alias(**{alias: KeyTransform(name, 'custom_properties')})
+        return queryset, alias, field_type, False
+    if alias not in queryset.query._filtered_relations:
+        queryset = queryset.alias(**{alias: FilteredRelation(
+            'promoted_values', condition=Q(promoted_values__definition__in=ids)
+        )})
+    return queryset, f'{alias}__{VALUE_FIELDS[field_type]}', field_type, True
+
+
+def parse_value(field_type, lookup, raw, promoted):
+    """將查詢參數轉為屬性型態的值，無法轉換時拋出 ValueError"""
+    if lookup == 'isnull':
+        return property_schema.coerce('boolean', raw)
+    if lookup == 'in':
+        return [parse_value(field_type, 'exact', item, promoted) for item in raw.split(',') if item.strip()]
+    if lookup == 'icontains' or field_type is None:
+        return raw
+    if promoted:
+        value = typed_value(field_type, raw)
+        if value is None:
+            raise ValueError(raw)
+        return value
+    return property_schema.coerce(field_type, raw)
+
+
+class PropertyFilterBackend(filters.BaseFilterBackend):
+    """以 ?prop.<名稱>[__lookup]=值 篩選動態屬性"""
+
+    def filter_queryset(self, request, queryset, view):
+        errors = {}
+        for key, raw in request.query_params.items():
+            if not key.startswith(PARAM_PREFIX):
+                continue
+            name, _, lookup = key[len(PARAM_PREFIX):].rpartition('__')
+            if lookup not in LOOKUPS:
+                name, lookup = key[len(PARAM_PREFIX):], 'exact'
+            queryset, path, field_type, promoted = column(queryset, name, request)
+            try:
+                value = parse_value(field_type, lookup, raw, promoted)
+            except ValueError:
+                label = dict(PropertyDefinition.FIELD_TYPES).get(field_type, field_type)
+                errors[key] = [f'無法轉換為{label}：{raw}']
+                continue
+            queryset = queryset.filter(**{f'{path}__{lookup}': value})
+        if errors:
+            raise ValidationError(errors)
+        return queryset
+
+
+class PropertyOrderingFilter(filters.OrderingFilter):
+    """排序支援 ?ordering=-prop.<名稱>（空值排在最後）"""
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        valid = []
+        for term in fields:
+            if term.lstrip('-').startswith(PARAM_PREFIX):
+                valid.append(term)
+            else:
+                valid.extend(super().remove_invalid_fields(queryset, [term], view, request))
+        return valid
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+        terms = []
+        for term in ordering:
+            name = term.lstrip('-')
+            if not name.startswith(PARAM_PREFIX):
+                terms.append(term)
+                continue
+            queryset, path, _, _ = column(queryset, name[len(PARAM_PREFIX):], request)
+            if term.startswith('-'):
+                terms.append(F(path).desc(nulls_last=True))
+            else:
+                terms.append(F(path).asc(nulls_last=True))
+        return queryset.order_by(*terms)
@@ -0,0 +1,360 @@
+"""
+動態屬性的結構演進
+
+屬性定義更名、變更型態、設為必填或設定預設值時，比較變更前後的定義產生操作（diff），
+並建立 PropertyMigration 工作，依主鍵分批改寫該類別裝置的 custom_properties：
+- rename：舊鍵改為新鍵（新鍵已存在時保留原值）
+- convert：依新型態轉換既有值，無法轉換時改用預設值，沒有預設值則保留原值並計入 invalid
+- default：缺少此屬性的裝置補上預設值
+- require：統計缺少必填屬性（且沒有預設值可補）的裝置數量
+- promote：設為提升時回填型態化欄位（見 promoted_properties.py）
+
+每批在獨立的短交易內完成並記錄游標（last_pk），不會長時間鎖定資料表；
+中斷後可由 property_migrations 指令從游標繼續。類別有提升的屬性時，每批改寫後一併重建其型態化值。PostgreSQL 上不需轉換型態的工作
+以 jsonb 運算在資料庫內完成，每批只需一次 UPDATE。
+
+可透過 settings.PROPERTY_MIGRATIONS 設定 BATCH_SIZE 與 BACKGROUND（是否在背景執行緒執行）。
+"""
+
+import json
+import logging
+import threading
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import promoted_properties
+from .models import Device, PropertyMigration
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 1000,
+    'BACKGROUND': True,
+}
+
+# 比較變更前後定義時使用的欄位
+SNAPSHOT_FIELDS = ('category_id', 'name', 'field_type', 'is_required', 'default_value', 'choices', 'is_promoted')
+
+TRUE_VALUES = {'true', '1', 'yes', 'y', 'on', '是'}
+FALSE_VALUES = {'false', '0', 'no', 'n', 'off', '否'}
+
+# 記錄無法轉換的裝置 ID 上限
+MAX_SAMPLES = 100
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'PROPERTY_MIGRATIONS', {})}
+
+
+def coerce(field_type, value, choices=None):
+    """將值轉換為屬性型態的 JSON 表示，無法轉換時拋出 ValueError"""
+    if value is None:
+        raise ValueError('空值')
+    if field_type == 'number':
+        if isinstance(value, bool):
+            raise ValueError('布林值不是數字')
+        if isinstance(value, (int, float)):
+            return value
+        text = str(value).strip()
+        try:
+            return int(text)
+        except ValueError:
+            number = float(text)
+            if number != number or number in (float('inf'), float('-inf')):
+                raise ValueError('不是有限的數字')
+            return number
+    if field_type == 'boolean':
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, (int, float)) and value in (0, 1):
+            return bool(value)
+        text = str(value).strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+        raise ValueError('不是布林值')
+    if field_type == 'date':
+        if isinstance(value, (bool, int, float)):
+            raise ValueError('不是日期')
+        return date.fromisoformat(str(value).strip()[:10]).isoformat()
+    if field_type == 'choice':
+        if choices and value not in choices:
+            text = str(value)
+            if text not in choices:
+                raise ValueError('不在選項中')
+            return text
+        return value
+    # text
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def snapshot(definition):
+    """擷取定義的比較欄位"""
+    return {field: getattr(definition, field) for field in SNAPSHOT_FIELDS}
+
+
+def typed_default(state):
+    """將預設值（字串）轉為屬性型態；無法轉換時保留字串，沒有預設值時回傳 None"""
+    if state['default_value'] in (None, ''):
+        return None
+    try:
+        return coerce(state['field_type'], state['default_value'], state['choices'])
+    except ValueError:
+        return state['default_value']
+
+
+def diff(old, new):
+    """比較變更前後的定義（None 表示新建立），產生依序套用的操作"""
+    if old is not None and old['category_id'] != new['category_id']:
+        # 移到其他類別時視為新屬性
+        old = None
+    default = typed_default(new)
+    operations = []
+    if old is not None and old['name'] != new['name']:
+        operations.append({'op': 'rename', 'from': old['name'], 'to': new['name']})
+    if old is not None and (
+        old['field_type'] != new['field_type']
+        or (new['field_type'] == 'choice' and old['choices'] != new['choices'])
+    ):
+        operations.append({
+            'op': 'convert', 'name': new['name'], 'type': new['field_type'],
+            'choices': new['choices'], 'default': default,
+        })
+    if default is not None and (
+        old is None
+        or old['default_value'] != new['default_value']
+        or old['name'] != new['name']
+        or (new['is_required'] and not old['is_required'])
+    ):
+        operations.append({'op': 'default', 'name': new['name'], 'value': default})
+    if new['is_required'] and default is None and (old is None or not old['is_required'] or old['name'] != new['name']):
+        operations.append({'op': 'require', 'name': new['name']})
+    if new['is_promoted'] and (old is None or not old['is_promoted']):
+        operations.append({'op': 'promote', 'name': new['name']})
+    return operations
+
+
+def apply(properties, operations, stats):
+    """在 Python 中套用操作，回傳新的屬性字典（未變更時回傳原物件）"""
+    result = properties
+    for operation in operations:
+        kind = operation['op']
+        if kind == 'rename':
+            if operation['from'] in result and operation['to'] not in result:
+                result = dict(result)
+                result[operation['to']] = result.pop(operation['from'])
+        elif kind == 'convert':
+            name = operation['name']
+            if name not in result:
+                continue
+            try:
+                value = coerce(operation['type'], result[name], operation['choices'])
+            except ValueError:
+                if operation['default'] is None:
+                    stats['invalid'] += 1
+                    continue
+                value = operation['default']
+            if value != result[name] or type(value) is not type(result[name]):
+                result = {**result, name: value}
+        elif kind == 'default':
+            if operation['name'] not in result:
+                result = {**result, operation['name']: operation['value']}
+        elif kind == 'require':
+            if operation['name'] not in result:
+                stats['missing'] += 1
+    return result
+
+
+def plan(definition, old=None, user=None):
+    """依定義的變更建立結構演進工作；沒有需要改寫的資料時回傳 None"""
+    operations = diff(old, snapshot(definition))
+    if not operations:
+        return None
+    devices = Device.objects.filter(category_id=definition.category_id)
+    return PropertyMigration.objects.create(
+        category_id=definition.category_id,
+        definition=definition,
+        operations=operations,
+        total=devices.count(),
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def schedule(migration):
+    """在目前的交易提交後開始執行（同一類別的工作依建立順序逐一執行）"""
+    transaction.on_commit(lambda: start(migration.category_id))
+
+
+def start(category_id):
+    """開始執行類別中最早的待執行工作；已有工作執行中時由該工作結束後接續"""
+    if PropertyMigration.objects.filter(category_id=category_id, status='running').exists():
+        return
+    if get_config()['BACKGROUND']:
+        threading.Thread(target=_run_in_thread, args=(category_id,), daemon=True).start()
+    else:
+        run_pending(category_id)
+
+
+def _run_in_thread(category_id):
+    try:
+        run_pending(category_id)
+    finally:
+        close_old_connections()
+        connection.close()
+
+
+def run_pending(category_id):
+    """
+    依建立順序執行類別的待執行工作，回傳執行的工作數
+
+    較早的工作執行中或失敗時停止（後續工作依賴其結果），失敗的工作需以 run() 繼續
+    """
+    count = 0
+    while True:
+        migration = (
+            PropertyMigration.objects.filter(category_id=category_id)
+            .exclude(status='completed')
+            .order_by('id')
+            .first()
+        )
+        if migration is None or migration.status != 'pending' or not run(migration):
+            return count
+        count += 1
+
+
+def run(migration, batch_size=None):
+    """
+    執行（或從游標繼續）一個工作；成功時回傳 True
+
+    以條件式 UPDATE 取得工作，避免多個行程同時執行同一工作；
+    失敗時記錄錯誤並保留游標，之後可從中斷處繼續
+    """
+    claimed = PropertyMigration.objects.filter(
+        pk=migration.pk, status__in=('pending', 'failed')
+    ).update(status='running', started_at=timezone.now(), error='')
+    if not claimed:
+        return False
+    migration.refresh_from_db()
+    batch_size = batch_size or get_config()['BATCH_SIZE']
+    try:
+        while _run_batch(migration, batch_size):
+            pass
+    except Exception as exc:
+        logger.exception('屬性結構演進 #%s 失敗，可從游標繼續', migration.pk)
+        PropertyMigration.objects.filter(pk=migration.pk).update(status='failed', error=str(exc)[:1000])
+        return False
+    PropertyMigration.objects.filter(pk=migration.pk).update(
+        status='completed', finished_at=timezone.now()
+    )
+    return True
+
+
+def uses_database_operations(operations, conn=connection):
+    """PostgreSQL 上不需轉換型態的工作以 jsonb 運算在資料庫內完成"""
+    return conn.vendor == 'postgresql' and all(operation['op'] != 'convert' for operation in operations)
+
+
+def _run_batch(migration, batch_size):
+    """處理下一批裝置並記錄游標；沒有剩餘裝置時回傳 False"""
+    with transaction.atomic():
+        devices = Device.objects.filter(category_id=migration.category_id, pk__gt=migration.last_pk)
+        pks = list(devices.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return False
+        batch = devices.filter(pk__lte=pks[-1])
+        stats = {'updated': 0, 'invalid': 0, 'missing': 0, 'samples': []}
+        if uses_database_operations(migration.operations):
+            _apply_in_database(batch, migration.operations, stats)
+        else:
+            _apply_in_python(batch, migration.operations, stats)
+        promoted_properties.sync(batch)
+
+        migration.last_pk = pks[-1]
+        migration.processed += len(pks)
+        migration.updated += stats['updated']
+        migration.invalid += stats['invalid']
+        migration.missing += stats['missing']
+        migration.samples = (migration.samples + stats['samples'])[:MAX_SAMPLES]
+        migration.save(update_fields=['last_pk', 'processed', 'updated', 'invalid', 'missing', 'samples'])
+    return True
+
+
+def _apply_in_python(batch, operations, stats):
+    """載入這一批的屬性並在 Python 中改寫，以 bulk_update 寫回"""
+    now = timezone.now()
+    changed = []
+    for pk, properties in batch.select_for_update().order_by('pk').values_list('pk', 'custom_properties'):
+        properties = properties or {}
+        before = dict(stats)
+        result = apply(properties, operations, stats)
+        if stats['invalid'] != before['invalid'] or stats['missing'] != before['missing']:
+            stats['samples'].append(pk)
+        if result is not properties:
+            changed.append(Device(pk=pk, custom_properties=result, updated_at=now))
+    Device.objects.bulk_update(changed, ['custom_properties', 'updated_at'], batch_size=500)
+    stats['updated'] += len(changed)
+
+
+# SQL NULL 與 JSON null 都視為空物件
+EMPTY_AS_OBJECT = "COALESCE(NULLIF({}, 'null'::jsonb), '{{}}'::jsonb)"
+
+
+def _jsonb_rewrite(operations, table, where, where_params):
+    """
+    將操作組合為 SELECT id, value 的子查詢，回傳 (SQL, 參數)
+
+    每個操作是一層子查詢、只引用上一層的 value，SQL 長度隨操作數線性增加；
+    null 視為空物件（與 Python 的 properties or {} 相同），因此也會補上預設值
+    """
+    sql = f"SELECT id, {EMPTY_AS_OBJECT.format('custom_properties')} AS value FROM {table} WHERE {where}"
+    params = list(where_params)
+    for step, operation in enumerate(operations):
+        if operation['op'] == 'rename':
+            value = (
+                'CASE WHEN value ? %s::text AND NOT value ? %s::text '
+                'THEN (value - %s::text) || jsonb_build_object(%s::text, value -> %s::text) '
+                'ELSE value END'
+            )
+            value_params = [
+                operation['from'], operation['to'], operation['from'], operation['to'], operation['from'],
+            ]
+        elif operation['op'] == 'default':
+            value = 'CASE WHEN value ? %s::text THEN value ELSE value || jsonb_build_object(%s::text, %s::jsonb) END'
+            value_params = [operation['name'], operation['name'], json.dumps(operation['value'])]
+        else:
+            continue
+        sql = f'SELECT id, {value} AS value FROM ({sql}) AS step_{step}'
+        params = [*value_params, *params]
+    return sql, params
+
+
+def _apply_in_database(batch, operations, stats):
+    """以一次 UPDATE 在資料庫內改寫這一批的屬性（PostgreSQL）"""
+    table = connection.ops.quote_name(Device._meta.db_table)
+    where, where_params = batch.query.get_compiler(connection=connection).compile(batch.query.where)
+    rewrites = [operation for operation in operations if operation['op'] in ('rename', 'default')]
+    with connection.cursor() as cursor:
+        if rewrites:
+            rewrite, params = _jsonb_rewrite(rewrites, table, where, where_params)
+            cursor.execute(
+                f'UPDATE {table} SET custom_properties = rewritten.value, updated_at = %s '
+                f'FROM ({rewrite}) AS rewritten '
+                f'WHERE {table}.id = rewritten.id '
+                f"AND rewritten.value IS DISTINCT FROM {EMPTY_AS_OBJECT.format(f'{table}.custom_properties')}",
+                [timezone.now(), *params],
+            )
+            stats['updated'] += cursor.rowcount
+    for operation in operations:
+        if operation['op'] == 'require':
+            missing = list(batch.filter(~Q(custom_properties__has_key=operation['name'])).values_list('pk', flat=True))
+            stats['missing'] += len(missing)
+            stats['samples'].extend(missing[:MAX_SAMPLES])
@@ -0,0 +1,106 @@
+"""
+動態屬性驗證
+
+PropertyValidator 依類別的屬性定義編譯各屬性的檢查函式（每個類別只查詢一次屬性定義），
+一次收集裝置的所有錯誤（缺少的必填屬性與型態不符的值），不會在第一個錯誤就停止；
+validate_many 以一次查詢載入所有類別的定義後驗證整批裝置。
+
+DeviceSerializer、DeviceForm 與 import_devices 指令共用此驗證。
+錯誤格式為 {屬性名稱: [訊息, ...]}；custom_properties 不是物件時以 NON_PROPERTY_KEY 回報。
+"""
+
+from datetime import datetime
+
+from .models import PropertyDefinition
+
+NON_PROPERTY_KEY = '__all__'
+
+
+def _is_number(value):
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def _is_date(value):
+    try:
+        datetime.fromisoformat(str(value))
+    except ValueError:
+        return False
+    return True
+
+
+def _compile(definition):
+    """將屬性定義編譯為 (檢查函式, 錯誤訊息)；不需檢查型態時檢查函式為 None"""
+    name = definition.name
+    if definition.field_type == 'number':
+        return _is_number, f'屬性 "{name}" 必須是數字'
+    if definition.field_type == 'boolean':
+        return (lambda value: isinstance(value, bool)), f'屬性 "{name}" 必須是布林值'
+    if definition.field_type == 'date':
+        return _is_date, f'屬性 "{name}" 必須是有效的日期格式'
+    if definition.field_type == 'choice' and definition.choices:
+        choices = definition.choices
+        return (lambda value: value in choices), f'屬性 "{name}" 的值必須是 {choices} 中的一個'
+    return None, None
+
+
+class Rule:
+    """單一屬性編譯後的檢查"""
+    __slots__ = ('name', 'required', 'check', 'message')
+
+    def __init__(self, definition):
+        self.name = definition.name
+        self.required = definition.is_required
+        self.check, self.message = _compile(definition)
+
+
+class PropertyValidator:
+    """
+    依屬性定義驗證動態屬性
+
+    同一實例會快取已載入的類別定義，可在一個請求或一次匯入中重複使用
+    """
+
+    def __init__(self):
+        self._rules = {}
+
+    def load(self, category_ids):
+        """以一次查詢載入尚未快取的類別定義"""
+        missing = {category_id for category_id in category_ids if category_id is not None} - set(self._rules)
+        if not missing:
+            return
+        for category_id in missing:
+            self._rules[category_id] = {}
+        for definition in PropertyDefinition.objects.filter(category_id__in=missing):
+            self._rules[definition.category_id][definition.name] = Rule(definition)
+
+    def rules(self, category_id):
+        self.load([category_id])
+        return self._rules.get(category_id, {})
+
+    def validate(self, category_id, properties):
+        """驗證一台裝置的動態屬性，回傳 {屬性名稱: [訊息]}（沒有錯誤時為空字典）"""
+        if not isinstance(properties, dict):
+            return {NON_PROPERTY_KEY: ['動態屬性必須是 JSON 物件']}
+        errors = {}
+        for name, rule in self.rules(category_id).items():
+            if name not in properties:
+                if rule.required:
+                    errors[name] = [f'必填屬性 "{name}" 未提供']
+            elif rule.check is not None and not rule.check(properties[name]):
+                errors[name] = [rule.message]
+        return errors
+
+    def validate_many(self, items):
+        """驗證多台裝置，items 為 (類別 ID, 動態屬性)；回傳與 items 順序相同的錯誤清單"""
+        items = list(items)
+        self.load({category_id for category_id, _ in items})
+        return [self.validate(category_id, properties) for category_id, properties in items]
+
+
+def messages(errors):
+    """將錯誤攤平為訊息清單（表單欄位錯誤使用）"""
+    return [message for field_messages in errors.values() for message in field_messages]
@@ -0,0 +1,65 @@
+"""
+JSON 渲染器與解析器
+
+安裝 orjson 時使用 orjson 編碼與解碼，否則自動退回 DRF 預設的標準函式庫 json。
+兩種實作的輸出在語意上相同：Decimal、日期時間、UUID 等型別的處理方式
+與 DRF 的 JSONEncoder 一致。
+"""
+
+from django.conf import settings
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# orjson 原生不支援的型別（Decimal、延遲翻譯字串、QuerySet 等）交由 DRF 的編碼器處理
+_drf_encoder = encoders.JSONEncoder()
+
+# UTC 時間輸出為 Z（與 DRF 相同），並允許非字串的字典鍵（與 json 模組相同）
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """以 orjson 加速的 JSON 渲染器"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """渲染為 JSON；需要縮排或非預設格式時退回標準函式庫"""
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_drf_encoder.default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # 例如超過 64 位元的整數，交由標準函式庫處理
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # 與 DRF 相同：跳脫 U+2028 / U+2029，確保輸出為合法的 JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """以 orjson 加速的 JSON 解析器"""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """解析 JSON 請求內容；非 UTF-8 編碼時退回標準函式庫"""
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -1,13 +1,23 @@
+import ipaddress
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework import ISO_8601
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.utils import timezone
 from .models import (
     DeviceCategory,
     PropertyDefinition,
     Device,
     IPRecord,
-    AuditLog
+    AuditLog,
+    PropertyMigration,
+    Subnet,
+    Tag
 )
-from datetime import datetime
+from . import hosts, valuation
+from .property_validation import PropertyValidator
 
 
 class PropertyDefinitionSerializer(serializers.ModelSerializer):
@@ -17,7 +27,7 @@ class PropertyDefinitionSerializer(serializers.ModelSerializer):
         model = PropertyDefinition
         fields = [
             'id', 'category', 'name', 'field_type', 'is_required',
-            'default_value', 'choices', 'help_text', 'order'
+            'default_value', 'choices', 'help_text', 'order', 'is_promoted'
         ]
     
     def validate_choices(self, value):
@@ -27,6 +37,21 @@ class PropertyDefinitionSerializer(serializers.ModelSerializer):
         return value
 
 
+class PropertyMigrationSerializer(serializers.ModelSerializer):
+    """屬性結構演進工作序列化器（進度）"""
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    progress = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = PropertyMigration
+        fields = [
+            'id', 'category', 'category_name', 'definition', 'operations', 'status',
+            'total', 'processed', 'updated', 'invalid', 'missing', 'samples', 'progress',
+            'error', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+
 class DeviceCategorySerializer(serializers.ModelSerializer):
     """裝置類別序列化器"""
     property_definitions = PropertyDefinitionSerializer(many=True, read_only=True)
@@ -61,7 +86,7 @@ class IPRecordSerializer(serializers.ModelSerializer):
         model = IPRecord
         fields = [
             'id', 'device', 'device_name', 'ip_address', 'mac_address',
-            'assigned_date', 'is_active', 'notes', 'history',
+            'assigned_date', 'is_active', 'subnet', 'last_seen_at', 'notes', 'history',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at', 'history']
@@ -100,7 +125,160 @@ class IPRecordSerializer(serializers.ModelSerializer):
         return instance
 
 
-class DeviceSerializer(serializers.ModelSerializer):
+class SubnetSerializer(serializers.ModelSerializer):
+    """網段序列化器（欄位名稱與前端 Subnet 相同）"""
+    totalHosts = serializers.SerializerMethodField()
+    usedHosts = serializers.IntegerField(source='used_hosts', read_only=True, default=0)
+    
+    class Meta:
+        model = Subnet
+        fields = ['id', 'name', 'cidr', 'description', 'color', 'totalHosts', 'usedHosts']
+    
+    def get_totalHosts(self, obj):
+        """可分配的位址數（扣除網路位址與廣播位址）"""
+        network = obj.network
+        return network.num_addresses - 2 if network.prefixlen < network.max_prefixlen - 1 else network.num_addresses
+    
+    def validate_cidr(self, value):
+        """驗證並正規化 CIDR"""
+        try:
+            return str(ipaddress.ip_network(value, strict=False))
+        except ValueError:
+            raise serializers.ValidationError('CIDR 格式錯誤，例如 192.168.1.0/24')
+
+
+class TagSerializer(serializers.ModelSerializer):
+    """標籤序列化器"""
+    device_count = serializers.IntegerField(read_only=True, default=0)
+    
+    class Meta:
+        model = Tag
+        fields = ['id', 'name', 'color', 'description', 'device_count', 'created_at']
+        read_only_fields = ['created_at']
+
+
+class TagSummarySerializer(serializers.ModelSerializer):
+    """裝置詳情中的標籤"""
+    
+    class Meta:
+        model = Tag
+        fields = ['id', 'name', 'color']
+
+
+class TagAssignmentSerializer(serializers.Serializer):
+    """批次標記：為 devices 加上 add 的標籤、移除 remove 的標籤"""
+    devices = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=10000)
+    add = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True, required=False)
+    remove = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True, required=False)
+    
+    def validate(self, data):
+        add = {tag.pk for tag in data.get('add', [])}
+        remove = {tag.pk for tag in data.get('remove', [])}
+        if not add and not remove:
+            raise serializers.ValidationError('請指定要加上或移除的標籤')
+        if add & remove:
+            raise serializers.ValidationError('同一個標籤不能同時加上與移除')
+        return data
+
+
+class HostStatusField(serializers.Field):
+    """將裝置狀態輸出為主機狀態（online / idle / offline）"""
+    
+    def to_representation(self, value):
+        return hosts.DEVICE_HOST_STATUS.get(value, 'offline')
+
+
+class HostOSField(serializers.Field):
+    """作業系統取自動態屬性，可能是任何 JSON 值：數字轉為字串，其他非字串的值輸出 null"""
+    
+    def to_representation(self, value):
+        if isinstance(value, str):
+            return value
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        return None
+
+
+class HostSerializer(serializers.Serializer):
+    """主機（裝置與其啟用中的 IP 記錄），欄位名稱與前端 Host 相同，供 RowMapper 快速輸出"""
+    id = serializers.IntegerField(read_only=True)
+    deviceId = serializers.IntegerField(source='device_id', read_only=True)
+    hostname = serializers.CharField(source='device.name', read_only=True)
+    ipAddress = serializers.CharField(source='ip_address', read_only=True)
+    macAddress = serializers.CharField(source='mac_address', read_only=True)
+    subnetId = serializers.IntegerField(source='subnet_id', read_only=True)
+    subnetName = serializers.CharField(source='subnet.name', read_only=True)
+    status = HostStatusField(source='device.status', read_only=True)
+    serviceType = serializers.CharField(source='device.service_type', read_only=True)
+    os = HostOSField(source=f'device.custom_properties.{hosts.OS_PROPERTY}', read_only=True)
+    lastSeenAt = serializers.DateTimeField(source='seen_at', read_only=True)
+    description = serializers.CharField(source='notes', read_only=True)
+
+
+class HostMoveSerializer(serializers.Serializer):
+    """搬移主機：hosts 為主機（IP 記錄）ID，subnet 為目標網段"""
+    hosts = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+    subnet = serializers.PrimaryKeyRelatedField(queryset=Subnet.objects.all())
+
+
+class SparseFieldsMixin:
+    """
+    稀疏欄位集：fields 只輸出指定欄位（id 永遠輸出），
+    expandable_fields 中的欄位只有在 expand 或 fields 指定時才輸出
+    """
+    expandable_fields = ()
+    # 沒有對應資料庫欄位的計算欄位，列出計算時需要的模型欄位
+    field_dependencies = {}
+    
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = set(expand or ())
+        if fields:
+            expand |= set(fields)
+        for name in self.expandable_fields:
+            if name not in expand:
+                self.fields.pop(name, None)
+        if fields:
+            for name in list(self.fields):
+                if name != 'id' and name not in fields:
+                    self.fields.pop(name)
+    
+    @classmethod
+    def get_available_fields(cls):
+        """所有可透過 fields / expand 選擇的欄位名稱"""
+        return set(cls(expand=cls.expandable_fields).fields)
+    
+    @classmethod
+    def get_query_plan(cls, fields=None, expand=None):
+        """
+        計算輸出所選欄位需要的查詢：
+        回傳 (only() 欄位, select_related 關聯, prefetch_related 關聯)
+        """
+        serializer = cls(fields=fields, expand=expand)
+        opts = cls.Meta.model._meta
+        only_fields = {'id'}
+        select_related = set()
+        prefetch_related = set()
+        
+        for name, field in serializer.fields.items():
+            only_fields.update(cls.field_dependencies.get(name, ()))
+            if isinstance(field, serializers.ListSerializer):
+                prefetch_related.add(field.source)
+                continue
+            if name in cls.field_dependencies:
+                continue
+            attrs = field.source_attrs
+            model_field = opts.get_field(attrs[0])
+            if model_field.is_relation and len(attrs) > 1:
+                select_related.add(attrs[0])
+                only_fields.add('__'.join(attrs))
+            else:
+                only_fields.add(attrs[0])
+        
+        return only_fields, select_related, prefetch_related
+
+
+class DeviceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """裝置序列化器，支援動態屬性驗證"""
     category_name = serializers.CharField(source='category.name', read_only=True)
     responsible_person_name = serializers.CharField(
@@ -114,84 +292,60 @@ class DeviceSerializer(serializers.ModelSerializer):
         allow_null=True
     )
     ip_records = IPRecordSerializer(many=True, read_only=True)
+    tags = TagSummarySerializer(many=True, read_only=True)
     current_value = serializers.SerializerMethodField()
     
     class Meta:
         model = Device
         fields = [
             'id', 'serial_number', 'name', 'category', 'category_name',
-            'status', 'responsible_person', 'responsible_person_name',
+            'status', 'service_type', 'responsible_person', 'responsible_person_name',
             'custom_properties', 'purchase_date', 'cost', 'department',
-            'location', 'depreciation_rate', 'warranty_end_date',
+            'location', 'depreciation_rate', 'depreciation_method',
+            'depreciation_schedule', 'salvage_value', 'warranty_end_date',
             'supplier', 'maintenance_info', 'retirement_date',
             'created_at', 'updated_at', 'created_by', 'created_by_name',
-            'ip_records', 'current_value'
+            'ip_records', 'tags', 'current_value'
         ]
         read_only_fields = ['created_at', 'updated_at', 'created_by']
     
+    # IP 記錄與標籤需要額外查詢，只在 ?expand=ip_records,tags 時輸出
+    expandable_fields = ('ip_records', 'tags')
+    field_dependencies = {
+        'current_value': valuation.FIELDS,
+        # IPRecordSerializer.device_name 會讀取所屬裝置的名稱
+        'ip_records': ('name',),
+    }
+    
     def get_current_value(self, obj):
-        """獲取當前折舊後的價值"""
-        return obj.get_current_depreciation()
+        """獲取折舊後的價值；多筆輸出時由 View 預先批次計算，?as_of= 可指定日期"""
+        values = self.context.get('valuations')
+        if values is not None and obj.pk in values:
+            return values[obj.pk]
+        return obj.get_current_depreciation(self.context.get('as_of'))
+    
+    def get_property_validator(self):
+        """取得動態屬性驗證器；存放在 context 中，批次驗證（many=True）時共用已載入的屬性定義"""
+        return self.context.setdefault('property_validator', PropertyValidator())
     
     def validate_custom_properties(self, value):
-        """驗證動態屬性是否符合類別定義"""
-        # 在更新時，從 instance 獲取 category
-        if self.instance:
-            category = self.instance.category
-        # 在建立時，從 initial_data 獲取 category
-        elif 'category' in self.initial_data:
-            try:
-                category = DeviceCategory.objects.get(id=self.initial_data['category'])
-            except DeviceCategory.DoesNotExist:
+        """驗證動態屬性是否符合類別定義，一次回報所有錯誤"""
+        initial = getattr(self, 'initial_data', None)
+        # 請求中有類別時以請求的類別驗證，否則使用既有裝置的類別
+        if isinstance(initial, dict) and initial.get('category') not in (None, ''):
+            category_id = str(initial['category'])
+            if not category_id.isdigit() or not DeviceCategory.objects.filter(pk=category_id).exists():
                 raise serializers.ValidationError('指定的裝置類別不存在')
+            category_id = int(category_id)
+        elif self.instance is not None:
+            category_id = self.instance.category_id
         else:
             # 如果沒有提供 category，跳過驗證（將由其他驗證處理）
             return value
         
-        # 獲取該類別的所有屬性定義
-        property_definitions = category.property_definitions.all()
-        
-        # 驗證必填屬性
-        for prop_def in property_definitions:
-            if prop_def.is_required and prop_def.name not in value:
-                raise serializers.ValidationError(
-                    f'必填屬性 "{prop_def.name}" 未提供'
-                )
-        
-        # 驗證屬性型態
-        for prop_name, prop_value in value.items():
-            try:
-                prop_def = property_definitions.get(name=prop_name)
-            except PropertyDefinition.DoesNotExist:
-                # 允許額外的屬性，但發出警告
-                continue
-            
-            # 根據型態驗證值
-            if prop_def.field_type == 'number':
-                try:
-                    float(prop_value)
-                except (ValueError, TypeError):
-                    raise serializers.ValidationError(
-                        f'屬性 "{prop_name}" 必須是數字'
-                    )
-            elif prop_def.field_type == 'boolean':
-                if not isinstance(prop_value, bool):
-                    raise serializers.ValidationError(
-                        f'屬性 "{prop_name}" 必須是布林值'
-                    )
-            elif prop_def.field_type == 'date':
-                try:
-                    datetime.fromisoformat(str(prop_value))
-                except (ValueError, TypeError):
-                    raise serializers.ValidationError(
-                        f'屬性 "{prop_name}" 必須是有效的日期格式'
-                    )
-            elif prop_def.field_type == 'choice':
-                if prop_def.choices and prop_value not in prop_def.choices:
-                    raise serializers.ValidationError(
-                        f'屬性 "{prop_name}" 的值必須是 {prop_def.choices} 中的一個'
-                    )
-        
+        errors = self.get_property_validator().validate(category_id, value)
+        if errors:
+            raise serializers.ValidationError(errors)
         return value
     
     def validate(self, data):
@@ -212,6 +366,13 @@ class DeviceSerializer(serializers.ModelSerializer):
             if data['depreciation_rate'] < 0 or data['depreciation_rate'] > 100:
                 raise serializers.ValidationError('折舊率必須在 0-100 之間')
         
+        # 驗證殘值
+        if data.get('salvage_value') is not None:
+            if data['salvage_value'] < 0:
+                raise serializers.ValidationError('殘值不能為負數')
+            if data.get('cost') is not None and data['salvage_value'] > data['cost']:
+                raise serializers.ValidationError('殘值不能高於成本')
+        
         return data
 
 
@@ -233,6 +394,106 @@ class DeviceListSerializer(serializers.ModelSerializer):
         ]
 
 
+class DeviceExpirySerializer(DeviceListSerializer):
+    """到期裝置列表序列化器（列表欄位加上保固與報廢日期）"""
+    
+    class Meta(DeviceListSerializer.Meta):
+        fields = DeviceListSerializer.Meta.fields + ['warranty_end_date', 'retirement_date']
+
+
+class RowMapper:
+    """
+    列表快速路徑：以 values_list() 只查詢需要的欄位，
+    並透過預先編譯的欄位對應表直接將資料列轉為字典，
+    輸出與原序列化器完全相同
+    """
+    # 對資料庫原生型別而言 to_representation 不會改變值的欄位
+    IDENTITY_FIELDS = (
+        serializers.IntegerField,
+        serializers.CharField,
+        serializers.ChoiceField,
+        serializers.BooleanField,
+    )
+    
+    def __init__(self, serializer_class, fields=None):
+        self.serializer_class = serializer_class
+        self.fields = frozenset(fields) if fields else None
+        self._compiled = None
+        self._subsets = {}
+    
+    def subset(self, fields):
+        """取得只輸出指定欄位的對應表（id 永遠輸出）"""
+        key = frozenset(fields)
+        if key not in self._subsets:
+            self._subsets[key] = RowMapper(self.serializer_class, key)
+        return self._subsets[key]
+    
+    def _compile(self):
+        """解析序列化器欄位，產生 (輸出鍵, 查詢欄位, 轉換器) 對應表"""
+        serializer = self.serializer_class()
+        selected = [
+            (name, field) for name, field in serializer.fields.items()
+            if self.fields is None or name == 'id' or name in self.fields
+        ]
+        keys = []
+        columns = []
+        converters = []
+        for index, (name, field) in enumerate(selected):
+            if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+                raise TypeError(f'欄位 "{name}" 無法使用快速路徑輸出')
+            keys.append(name)
+            columns.append('__'.join(field.source_attrs))
+            if not isinstance(field, self.IDENTITY_FIELDS):
+                converters.append((index, field))
+        self._compiled = (tuple(keys), tuple(columns), tuple(converters))
+        return self._compiled
+    
+    @staticmethod
+    def _converter(field):
+        """取得欄位的轉換函式；ISO 8601 日期時間使用內聯版本"""
+        is_iso_datetime = (
+            type(field) is serializers.DateTimeField
+            and getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601
+            and getattr(field, 'timezone', None) is None
+        )
+        if not is_iso_datetime:
+            return field.to_representation
+        
+        # 與 DateTimeField.to_representation 相同：轉換為目前時區後輸出 ISO 8601
+        current_tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        
+        def convert(value):
+            if current_tz is None or timezone.is_naive(value):
+                return field.to_representation(value)
+            value = value.astimezone(current_tz).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return convert
+    
+    @property
+    def columns(self):
+        """需要查詢的資料庫欄位"""
+        return (self._compiled or self._compile())[1]
+    
+    def map_rows(self, rows):
+        """將 values_list() 的資料列轉為輸出字典"""
+        keys, _, fields = self._compiled or self._compile()
+        if not fields:
+            return [dict(zip(keys, row)) for row in rows]
+        
+        converters = [(index, self._converter(field)) for index, field in fields]
+        results = []
+        for row in rows:
+            row = list(row)
+            for index, convert in converters:
+                value = row[index]
+                if value is not None:
+                    row[index] = convert(value)
+            results.append(dict(zip(keys, row)))
+        return results
+
+
 class AuditLogSerializer(serializers.ModelSerializer):
     """操作日誌序列化器"""
     user_name = serializers.CharField(source='user.username', read_only=True, allow_null=True)
@@ -258,3 +519,24 @@ class DeviceStatisticsSerializer(serializers.Serializer):
     devices_by_department = serializers.DictField()
     total_cost = serializers.DecimalField(max_digits=15, decimal_places=2)
     total_current_value = serializers.DecimalField(max_digits=15, decimal_places=2)
+
+
+class ValuationSummarySerializer(serializers.Serializer):
+    """估值彙總"""
+    device_count = serializers.IntegerField()
+    valued_count = serializers.IntegerField()
+    total_cost = serializers.DecimalField(max_digits=18, decimal_places=2)
+    total_value = serializers.DecimalField(max_digits=18, decimal_places=2)
+    total_depreciation = serializers.DecimalField(max_digits=18, decimal_places=2)
+
+
+class ValuationGroupSerializer(ValuationSummarySerializer):
+    """估值報表的分組"""
+    key = serializers.CharField(allow_null=True)
+
+
+class ValuationReportSerializer(ValuationSummarySerializer):
+    """估值報表"""
+    as_of = serializers.DateField()
+    group_by = serializers.CharField(allow_null=True)
+    groups = ValuationGroupSerializer(many=True, required=False)
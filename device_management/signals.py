@@ -0,0 +1,170 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from . import authentication, events, hosts, promoted_properties, property_schema
+from .models import APIToken, Device, IPRecord, PropertyDefinition, Subnet, Tombstone
+
+
+def _ip_record_owner(instance):
+    """取得 IP 記錄所屬裝置的負責人 ID"""
+    if IPRecord.device.is_cached(instance):
+        return instance.device.responsible_person_id
+    return (
+        Device.objects.filter(pk=instance.device_id)
+        .values_list('responsible_person_id', flat=True)
+        .first()
+    )
+
+
+@receiver(post_delete, sender=Device)
+def record_device_tombstone(sender, instance, **kwargs):
+    """刪除裝置時寫入刪除記錄"""
+    Tombstone.objects.create(
+        model_name='Device',
+        object_id=instance.pk,
+        owner_id=instance.responsible_person_id
+    )
+
+
+@receiver(post_delete, sender=IPRecord)
+def record_ip_record_tombstone(sender, instance, **kwargs):
+    """刪除 IP 記錄時寫入刪除記錄（包含隨裝置連帶刪除的記錄）"""
+    owner_id = _ip_record_owner(instance)
+    Tombstone.objects.create(
+        model_name='IPRecord',
+        object_id=instance.pk,
+        owner_id=owner_id
+    )
+    events.publish_on_commit(
+        'ip_record.deleted', [owner_id],
+        id=instance.pk, device_id=instance.device_id, ip_address=instance.ip_address
+    )
+
+
+@receiver(post_save, sender=Device)
+def publish_device_saved(sender, instance, created, **kwargs):
+    """裝置新增或修改後推送事件"""
+    events.publish_on_commit(
+        'device.created' if created else 'device.updated',
+        [instance.responsible_person_id],
+        id=instance.pk, name=instance.name, status=instance.status
+    )
+
+
+@receiver(post_save, sender=Device)
+def sync_promoted_properties(sender, instance, raw=False, update_fields=None, **kwargs):
+    """裝置儲存後重建提升屬性的型態化值"""
+    if raw or (update_fields is not None and not {'custom_properties', 'category'} & set(update_fields)):
+        return
+    promoted_properties.sync_device(instance)
+
+
+@receiver(post_delete, sender=Device)
+def publish_device_deleted(sender, instance, **kwargs):
+    """裝置刪除後推送事件"""
+    events.publish_on_commit(
+        'device.deleted', [instance.responsible_person_id], id=instance.pk
+    )
+
+
+@receiver(post_save, sender=IPRecord)
+def publish_ip_record_saved(sender, instance, created, **kwargs):
+    """IP 記錄新增或修改後推送事件，啟用中的 IP 與其他記錄重複時另外推送衝突事件"""
+    owner_id = _ip_record_owner(instance)
+    events.publish_on_commit(
+        'ip_record.created' if created else 'ip_record.updated',
+        [owner_id],
+        id=instance.pk, device_id=instance.device_id,
+        ip_address=instance.ip_address, is_active=instance.is_active
+    )
+    if not instance.is_active:
+        return
+
+    conflicts = list(
+        IPRecord.objects.filter(ip_address=instance.ip_address, is_active=True)
+        .exclude(pk=instance.pk)
+        .values_list('device_id', 'device__responsible_person_id')
+    )
+    if conflicts:
+        events.publish_on_commit(
+            'ip_conflict',
+            [owner_id] + [owner for _, owner in conflicts],
+            ip_address=instance.ip_address,
+            device_ids=sorted({instance.device_id} | {device_id for device_id, _ in conflicts}),
+        )
+
+
+@receiver(post_save, sender=APIToken)
+@receiver(post_delete, sender=APIToken)
+def invalidate_api_token(sender, instance, **kwargs):
+    """權杖變更或刪除時清除快取的主體"""
+    authentication.invalidate([instance.key_hash])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """用戶停用或權限變更時清除其權杖的快取主體"""
+    update_fields = kwargs.get('update_fields')
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    authentication.invalidate(
+        APIToken.objects.filter(user_id=instance.pk).values_list('key_hash', flat=True)
+    )
+
+
+@receiver(pre_save, sender=PropertyDefinition)
+def capture_property_definition(sender, instance, raw=False, **kwargs):
+    """記錄變更前的屬性定義，供產生結構演進操作"""
+    instance._schema_before = None
+    if raw or instance.pk is None:
+        return
+    instance._schema_before = (
+        PropertyDefinition.objects.filter(pk=instance.pk)
+        .values(*property_schema.SNAPSHOT_FIELDS)
+        .first()
+    )
+
+
+@receiver(post_save, sender=PropertyDefinition)
+def plan_property_migration(sender, instance, created, raw=False, **kwargs):
+    """屬性定義變更後建立結構演進工作，於交易提交後分批改寫裝置的動態屬性"""
+    if raw:
+        return
+    before = getattr(instance, '_schema_before', None)
+    if before and before['is_promoted'] and (
+        not instance.is_promoted or before['category_id'] != instance.category_id
+    ):
+        promoted_properties.clear(instance)
+    migration = property_schema.plan(instance, before)
+    instance.schema_migration = migration
+    if migration is not None:
+        property_schema.schedule(migration)
+
+
+@receiver(pre_save, sender=IPRecord)
+def assign_ip_record_subnet(sender, instance, raw=False, update_fields=None, **kwargs):
+    """IP 記錄依位址歸屬於包含它的最小網段"""
+    if raw or (update_fields is not None and 'ip_address' not in update_fields):
+        return
+    instance.subnet = hosts.find_subnet(instance.ip_address)
+
+
+@receiver(pre_save, sender=Subnet)
+def capture_subnet_cidr(sender, instance, raw=False, **kwargs):
+    instance._cidr_before = (
+        None if raw or instance.pk is None
+        else Subnet.objects.filter(pk=instance.pk).values_list('cidr', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Subnet)
+def reassign_subnets_on_save(sender, instance, created, raw=False, **kwargs):
+    """新增網段或變更 CIDR 時重新歸屬 IP 記錄"""
+    if not raw and (created or getattr(instance, '_cidr_before', None) != instance.cidr):
+        hosts.assign_subnets()
+
+
+@receiver(post_delete, sender=Subnet)
+def reassign_subnets_on_delete(sender, instance, **kwargs):
+    """刪除網段後，原本屬於它的 IP 記錄改歸屬其他包含它的網段"""
+    hosts.assign_subnets(IPRecord.objects.filter(subnet__isnull=True))
@@ -0,0 +1,127 @@
+"""
+標籤
+
+裝置與標籤以 DeviceTag 關聯，(裝置, 標籤) 唯一索引與 (標籤, 裝置) 索引涵蓋兩個方向的查詢。
+
+依標籤篩選編譯為 EXISTS 子查詢，不 JOIN 關聯表，因此不會讓資料列重複，也不需要 distinct()：
+- ?tags=1,2       有任一標籤（OR）：一個 EXISTS (... tag_id IN (1, 2))
+- ?tags_all=1,2   有全部標籤（AND）：每個標籤一個 EXISTS，各自是一次唯一索引查找
+
+批次標記以集合式 SQL 完成（與 bulk 模組相同）：只處理標籤實際會變更的裝置，
+以一次 INSERT ... SELECT 寫入操作日誌、一次 UPDATE 更新 updated_at，
+交易提交後依負責人分組推送 device.bulk_updated 事件。
+"""
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from . import bulk
+from .models import Device, DeviceTag, Tag
+from .permissions import get_row_policy
+
+ANY_PARAM = 'tags'
+ALL_PARAM = 'tags_all'
+
+BATCH_SIZE = 1000
+
+
+def has_tags(tag_ids, device_ref='pk'):
+    """裝置有 tag_ids 中任一標籤的 EXISTS 條件；device_ref 為外層查詢中裝置 ID 的路徑"""
+    return Exists(DeviceTag.objects.filter(device_id=OuterRef(device_ref), tag_id__in=tag_ids))
+
+
+def filter_by_tags(queryset, any_tags=(), all_tags=(), device_ref='pk'):
+    """依標籤篩選（any_tags 為 OR、all_tags 為 AND），每個條件都是 EXISTS 子查詢"""
+    if any_tags:
+        queryset = queryset.filter(has_tags(list(any_tags), device_ref))
+    for tag_id in sorted(set(all_tags)):
+        queryset = queryset.filter(has_tags([tag_id], device_ref))
+    return queryset
+
+
+def parse_params(params):
+    """解析 ?tags= 與 ?tags_all=（逗號分隔的標籤 ID），回傳 (OR 標籤, AND 標籤, 錯誤)"""
+    values, errors = {}, {}
+    for name in (ANY_PARAM, ALL_PARAM):
+        ids = [value.strip() for value in params.get(name, '').split(',') if value.strip()]
+        if not all(value.isdigit() for value in ids):
+            errors[name] = ['標籤必須是 ID']
+            ids = []
+        values[name] = [int(value) for value in ids]
+    return values[ANY_PARAM], values[ALL_PARAM], errors
+
+
+class TagFilterBackend(filters.BaseFilterBackend):
+    """以 ?tags=（任一）與 ?tags_all=（全部）篩選裝置"""
+
+    def filter_queryset(self, request, queryset, view):
+        any_tags, all_tags, errors = parse_params(request.query_params)
+        if errors:
+            raise ValidationError(errors)
+        return filter_by_tags(queryset, any_tags, all_tags)
+
+
+def host_tags(device_ids):
+    """以一次查詢取得裝置的標籤，回傳 {裝置 ID: [{id, label, color}]}（前端 HostTag 格式）"""
+    tags = {}
+    rows = (
+        DeviceTag.objects.filter(device_id__in=set(device_ids))
+        .order_by('tag__name')
+        .values_list('device_id', 'tag_id', 'tag__name', 'tag__color')
+    )
+    for device_id, tag_id, name, color in rows:
+        tags.setdefault(device_id, []).append({'id': tag_id, 'label': name, 'color': color})
+    return tags
+
+
+def _change(queryset, tag_ids, action, user, request):
+    """
+    鎖定標籤會變更的裝置，寫入日誌、更新 updated_at 並推送事件，回傳鎖定的 (主鍵, 負責人)
+
+    queryset 必須只包含會變更的裝置；呼叫端在同一交易內接著寫入或刪除關聯
+    """
+    policy = get_row_policy(Device)
+    queryset = queryset.select_related(None).order_by()
+    rows = list(queryset.select_for_update(of=('self',)).values_list('pk', policy.lookup))
+    if not rows:
+        return rows
+    names = list(Tag.objects.filter(pk__in=tag_ids).order_by('name').values_list('name', flat=True))
+    bulk.insert_audit_logs(queryset, 'update', user, request, details={'tags': {action: names}})
+    queryset.update(updated_at=timezone.now())
+    bulk.publish_bulk_events(Device, rows, {f'tags_{action}': ', '.join(names)})
+    return rows
+
+
+def add_tags(queryset, tag_ids, user, request=None):
+    """為裝置加上標籤；已有全部標籤的裝置不會變更，回傳變更的裝置數"""
+    tag_ids = sorted(set(tag_ids))
+    if not tag_ids:
+        return 0
+    missing = Q()
+    for tag_id in tag_ids:
+        missing |= ~has_tags([tag_id])
+    with transaction.atomic():
+        rows = _change(queryset.filter(missing), tag_ids, 'added', user, request)
+        DeviceTag.objects.bulk_create(
+            [DeviceTag(device_id=pk, tag_id=tag_id) for pk, _ in rows for tag_id in tag_ids],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+    return len(rows)
+
+
+def remove_tags(queryset, tag_ids, user, request=None):
+    """移除裝置的標籤；沒有這些標籤的裝置不會變更，回傳變更的裝置數"""
+    tag_ids = sorted(set(tag_ids))
+    if not tag_ids:
+        return 0
+    targets = queryset.filter(has_tags(tag_ids))
+    with transaction.atomic():
+        rows = _change(targets, tag_ids, 'removed', user, request)
+        pks = [pk for pk, _ in rows]
+        for start in range(0, len(pks), BATCH_SIZE):
+            DeviceTag.objects.filter(device_id__in=pks[start:start + BATCH_SIZE], tag_id__in=tag_ids).delete()
+    return len(rows)
@@ -2,13 +2,66 @@ from django.test import TestCase
 from django.contrib.auth.models import User
 from datetime import date, timedelta
 from decimal import Decimal
+from unittest import mock
+import asyncio
+import gzip
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import uuid
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
 from .models import (
     DeviceCategory,
     PropertyDefinition,
     Device,
     IPRecord,
-    AuditLog
+    AuditLog,
+    AuditLogArchive,
+    AccessCount,
+    APIToken,
+    Notification,
+    PromotedPropertyValue,
+    PropertyMigration,
+    Subnet,
+    Tag,
+    DeviceTag,
+    Tombstone
 )
+from .pagination import EstimatedCountPaginator
+from .permissions import IsOwnerOrAdmin, get_row_policy
+from .serializers import DeviceListSerializer, RowMapper
+from . import (
+    access_audit, audit_archive, authentication, bulk, events, expiry, hosts, notifications, promoted_properties,
+    property_schema, property_validation, renderers, tags, throttling, valuation
+)
+from .forms import DeviceForm
+from .mixins import ChangeFeedMixin
+
+# 讀取稽核在測試中不啟動背景寫入執行緒（否則會由其他執行緒寫入測試資料庫），由測試自行呼叫 flush()
+NO_ACCESS_AUDIT_FLUSHER = override_settings(ACCESS_AUDIT={**settings.ACCESS_AUDIT, 'FLUSH_INTERVAL': None})
+
+
+def setUpModule():
+    NO_ACCESS_AUDIT_FLUSHER.enable()
+    access_audit.get_recorder.cache_clear()
+
+
+def tearDownModule():
+    access_audit.get_recorder.cache_clear()
+    NO_ACCESS_AUDIT_FLUSHER.disable()
 
 
 class DeviceCategoryTestCase(TestCase):
@@ -182,3 +235,1878 @@ class AuditLogTestCase(TestCase):
         self.assertIn('create', str(self.log))
         self.assertIn('Device', str(self.log))
 
+
+
+class AsyncReadEndpointTestCase(TestCase):
+    """測試非同步唯讀端點與同步端點輸出一致"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', password='adminpass', is_staff=True
+        )
+        self.user = User.objects.create_user(username='owner', password='ownerpass')
+        self.category = DeviceCategory.objects.create(name='電腦')
+        self.device = Device.objects.create(
+            serial_number='PC-001',
+            name='辦公室電腦',
+            category=self.category,
+            responsible_person=self.user,
+            cost=Decimal('30000.00'),
+            depreciation_rate=Decimal('10.00'),
+            purchase_date=date.today() - timedelta(days=100)
+        )
+        Device.objects.create(serial_number='PC-002', name='備用電腦', category=self.category)
+        IPRecord.objects.create(
+            device=self.device,
+            ip_address='10.0.0.5',
+            mac_address='AA:BB:CC:DD:EE:01'
+        )
+    
+    def assertSameResponse(self, sync_url, async_url):
+        sync_response = self.client.get(sync_url)
+        async_response = self.client.get(async_url)
+        self.assertEqual(sync_response.status_code, async_response.status_code)
+        self.assertEqual(sync_response.json(), async_response.json())
+    
+    def test_list_detail_and_search_match_sync(self):
+        """測試列表、詳情與 IP 搜尋的輸出一致"""
+        self.client.force_login(self.admin)
+        self.assertSameResponse('/api/devices/', '/api/async/devices/')
+        self.assertSameResponse('/api/devices/?status=active', '/api/async/devices/?status=active')
+        self.assertSameResponse(
+            f'/api/devices/{self.device.id}/', f'/api/async/devices/{self.device.id}/'
+        )
+        self.assertSameResponse(
+            '/api/devices/search_by_ip/?ip=10.0.0.5',
+            '/api/async/devices/search_by_ip/?ip=10.0.0.5'
+        )
+        self.assertSameResponse(
+            '/api/ip-records/check_ip_available/?ip=10.0.0.5',
+            '/api/async/ip-records/check_ip_available/?ip=10.0.0.5'
+        )
+    
+    def test_owner_filter_applies(self):
+        """測試一般用戶只能看到自己負責的裝置"""
+        self.client.force_login(self.user)
+        response = self.client.get('/api/async/devices/')
+        self.assertEqual(response.json()['count'], 1)
+        other = Device.objects.get(serial_number='PC-002')
+        response = self.client.get(f'/api/async/devices/{other.id}/')
+        self.assertEqual(response.status_code, 404)
+    
+    def test_requires_authentication(self):
+        """測試未認證請求被拒絕"""
+        response = self.client.get('/api/async/devices/')
+        self.assertEqual(response.status_code, 403)
+    
+    def test_dashboard_overview(self):
+        """測試儀表板總覽統計"""
+        self.client.force_login(self.admin)
+        data = self.client.get('/api/async/dashboard/overview/').json()
+        self.assertEqual(data['total_devices'], 2)
+        self.assertEqual(data['active_ip_records'], 1)
+        self.assertEqual(data['devices_by_category'], {'電腦': 2})
+
+
+class RowMapperTestCase(TestCase):
+    """測試列表快速路徑輸出與 DeviceListSerializer 完全相同"""
+    
+    def setUp(self):
+        user = User.objects.create_user(username='owner')
+        category = DeviceCategory.objects.create(name='印表機')
+        Device.objects.create(
+            serial_number='PRN-001', name='印表機 A', category=category,
+            responsible_person=user, department='IT部門'
+        )
+        Device.objects.create(serial_number='PRN-002', name='印表機 B', category=category)
+    
+    def test_fast_path_output_is_identical(self):
+        """測試 JSON 輸出逐位元組相同"""
+        mapper = RowMapper(DeviceListSerializer)
+        queryset = Device.objects.select_related('category', 'responsible_person')
+        expected = JSONRenderer().render(DeviceListSerializer(queryset, many=True).data)
+        actual = JSONRenderer().render(mapper.map_rows(queryset.values_list(*mapper.columns)))
+        self.assertEqual(expected, actual)
+
+
+class FastJSONRendererTestCase(TestCase):
+    """測試 orjson 渲染器與解析器的輸出與 DRF 預設一致"""
+    
+    def setUp(self):
+        now = timezone.now()
+        self.data = {
+            'cost': Decimal('1234.50'),
+            'purchase_date': date(2024, 1, 31),
+            'created_at': now,
+            'local_time': timezone.localtime(now),
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'label': gettext_lazy('裝置'),
+            'notes': '第一行\u2028第二行',
+            'custom_properties': {'RAM': 16, '彩色': True, '型號': None},
+            'history': [{'action': '建立', 'user': 'admin'}],
+        }
+    
+    def test_render_matches_default_renderer(self):
+        """測試渲染結果逐位元組相同"""
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(renderers.FastJSONRenderer().render(self.data), expected)
+    
+    def test_fallback_without_orjson(self):
+        """測試未安裝 orjson 時退回標準函式庫"""
+        with mock.patch.object(renderers, 'orjson', None):
+            rendered = renderers.FastJSONRenderer().render(self.data)
+            parsed = renderers.FastJSONParser().parse(io.BytesIO(b'{"a": [1, 2]}'))
+        self.assertEqual(rendered, JSONRenderer().render(self.data))
+        self.assertEqual(parsed, {'a': [1, 2]})
+    
+    def test_indent_uses_default_renderer(self):
+        """測試要求縮排時輸出與 DRF 相同"""
+        media_type = 'application/json; indent=4'
+        self.assertEqual(
+            renderers.FastJSONRenderer().render(self.data, media_type),
+            JSONRenderer().render(self.data, media_type)
+        )
+    
+    def test_parser(self):
+        """測試解析請求內容與錯誤處理"""
+        parser = renderers.FastJSONParser()
+        body = '{"name": "印表機", "cost": 1.5}'.encode()
+        self.assertEqual(parser.parse(io.BytesIO(body)), {'name': '印表機', 'cost': 1.5})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{invalid'))
+
+
+class SparseFieldsTestCase(TestCase):
+    """測試 ?fields= 與 ?expand= 稀疏欄位集"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', password='adminpass', is_staff=True
+        )
+        category = DeviceCategory.objects.create(name='電腦')
+        self.device = Device.objects.create(
+            serial_number='PC-001', name='辦公室電腦', category=category,
+            cost=Decimal('30000.00'), depreciation_rate=Decimal('10.00'),
+            purchase_date=date.today() - timedelta(days=100)
+        )
+        IPRecord.objects.create(
+            device=self.device, ip_address='10.0.0.5', mac_address='AA:BB:CC:DD:EE:01'
+        )
+        self.client.force_login(self.admin)
+    
+    def test_ip_records_only_when_expanded(self):
+        """測試 IP 記錄只在展開時輸出"""
+        url = f'/api/devices/{self.device.id}/'
+        self.assertNotIn('ip_records', self.client.get(url).json())
+        data = self.client.get(url + '?expand=ip_records').json()
+        self.assertEqual(data['ip_records'][0]['ip_address'], '10.0.0.5')
+        self.assertEqual(data['ip_records'][0]['device_name'], '辦公室電腦')
+    
+    def test_fields_selects_columns(self):
+        """測試只輸出指定欄位"""
+        data = self.client.get(
+            f'/api/devices/{self.device.id}/?fields=name,category_name,current_value'
+        ).json()
+        self.assertEqual(set(data), {'id', 'name', 'category_name', 'current_value'})
+        self.assertEqual(data['category_name'], '電腦')
+        self.assertIsNotNone(data['current_value'])
+        
+        results = self.client.get('/api/devices/?fields=serial_number').json()['results']
+        self.assertEqual(results, [{'id': self.device.id, 'serial_number': 'PC-001'}])
+    
+    def test_unknown_fields_rejected(self):
+        """測試未知欄位回傳 400"""
+        response = self.client.get(f'/api/devices/{self.device.id}/?fields=secret')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/devices/?expand=category')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_async_detail_matches_sync(self):
+        """測試非同步詳情支援相同參數"""
+        for query in ('', '?expand=ip_records', '?fields=name,ip_records'):
+            sync_data = self.client.get(f'/api/devices/{self.device.id}/{query}').json()
+            async_data = self.client.get(f'/api/async/devices/{self.device.id}/{query}').json()
+            self.assertEqual(sync_data, async_data)
+
+
+class ConditionalRequestTestCase(TestCase):
+    """測試 ETag / Last-Modified 條件式請求"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', password='adminpass', is_staff=True
+        )
+        self.category = DeviceCategory.objects.create(name='電腦')
+        self.device = Device.objects.create(
+            serial_number='PC-001', name='辦公室電腦', category=self.category
+        )
+        self.client.force_login(self.admin)
+    
+    def test_list_not_modified(self):
+        """測試列表未變更時回應 304，變更後回應 200"""
+        response = self.client.get('/api/devices/')
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        
+        response = self.client.get('/api/devices/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        
+        # 不同的篩選條件使用不同的 ETag
+        response = self.client.get('/api/devices/?status=active', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        
+        Device.objects.create(serial_number='PC-002', name='備用電腦', category=self.category)
+        response = self.client.get('/api/devices/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+    
+    def test_detail_not_modified(self):
+        """測試詳情未變更時回應 304，類別改名後回應 200"""
+        url = f'/api/devices/{self.device.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        
+        self.category.name = '桌上型電腦'
+        self.category.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['category_name'], '桌上型電腦')
+    
+    def test_detail_changes_with_valuation_date(self):
+        """測試未指定 as_of 時，隔天即使裝置未變更也回應 200 與新的估值"""
+        Device.objects.filter(pk=self.device.pk).update(
+            cost=Decimal('1000'), purchase_date=date(2024, 1, 1),
+            depreciation_method='straight_line', depreciation_rate=Decimal('20')
+        )
+        url = f'/api/devices/{self.device.id}/'
+        today = date(2025, 1, 1)
+        with mock.patch('django.utils.timezone.localdate', return_value=today):
+            response = self.client.get(url)
+            self.assertNotIn('Last-Modified', response)
+            etag, value = response['ETag'], response.json()['current_value']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with mock.patch('django.utils.timezone.localdate', return_value=today + timedelta(days=180)):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()['current_value'], value)
+        
+        # 指定 as_of 時內容固定，仍可使用 Last-Modified
+        self.assertIn('Last-Modified', self.client.get(url + '?as_of=2025-01-01'))
+    
+    def test_if_match_on_update(self):
+        """測試 If-Match 樂觀鎖定"""
+        url = f'/api/devices/{self.device.id}/'
+        etag = self.client.get(url)['ETag']
+        
+        response = self.client.patch(
+            url, {'name': '新名稱'}, content_type='application/json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        
+        # 使用過期的 ETag 更新會被拒絕
+        response = self.client.patch(
+            url, {'name': '另一個名稱'}, content_type='application/json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 412)
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.name, '新名稱')
+    
+    def test_category_invalidated_by_property_change(self):
+        """測試屬性定義變更使類別的 ETag 失效"""
+        url = f'/api/categories/{self.category.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        
+        PropertyDefinition.objects.create(category=self.category, name='RAM', field_type='number')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ChangeFeedTestCase(TestCase):
+    """測試增量同步端點"""
+    
+    def setUp(self):
+        # 剛建立的資料都在延遲區間內，分頁與游標的測試不保留延遲區間
+        lag = mock.patch.object(ChangeFeedMixin, 'change_feed_lag', timedelta(0))
+        lag.start()
+        self.addCleanup(lag.stop)
+        self.admin = User.objects.create_user(
+            username='admin', password='adminpass', is_staff=True
+        )
+        self.category = DeviceCategory.objects.create(name='電腦')
+        self.devices = [
+            Device.objects.create(
+                serial_number=f'PC-{i:03d}', name=f'電腦 {i}', category=self.category
+            )
+            for i in range(5)
+        ]
+        self.client.force_login(self.admin)
+    
+    def test_resumable_sync(self):
+        """測試分頁同步後只取得之後的變更與刪除"""
+        data = self.client.get('/api/devices/changes/?limit=3').json()
+        self.assertEqual(len(data['changed']), 3)
+        self.assertTrue(data['has_more'])
+        
+        data = self.client.get(f'/api/devices/changes/?limit=3&since={data["cursor"]}').json()
+        self.assertEqual(len(data['changed']), 2)
+        self.assertFalse(data['has_more'])
+        cursor = data['cursor']
+        
+        # 沒有變更時回傳空結果且游標不變
+        data = self.client.get(f'/api/devices/changes/?since={cursor}').json()
+        self.assertEqual((data['changed'], data['deleted'], data['cursor']), ([], [], cursor))
+        
+        self.devices[0].name = '已更新'
+        self.devices[0].save()
+        deleted_id = self.devices[1].id
+        self.devices[1].delete()
+        
+        data = self.client.get(f'/api/devices/changes/?since={cursor}').json()
+        self.assertEqual([d['name'] for d in data['changed']], ['已更新'])
+        self.assertEqual(data['deleted'], [deleted_id])
+    
+    def test_cascaded_ip_record_tombstones(self):
+        """測試隨裝置刪除的 IP 記錄也會產生刪除記錄"""
+        record = IPRecord.objects.create(
+            device=self.devices[0], ip_address='10.0.0.1', mac_address='AA:BB:CC:DD:EE:01'
+        )
+        cursor = self.client.get('/api/ip-records/changes/').json()['cursor']
+        self.devices[0].delete()
+        data = self.client.get(f'/api/ip-records/changes/?since={cursor}').json()
+        self.assertEqual(data['deleted'], [record.id])
+    
+    def test_cursor_stays_behind_lag(self):
+        """測試游標不超過延遲區間：較晚提交、updated_at 較早的資料仍會在下次同步取得"""
+        data = self.client.get('/api/devices/changes/?limit=2').json()
+        cursor = data['cursor']
+        
+        with mock.patch.object(ChangeFeedMixin, 'change_feed_lag', timedelta(minutes=5)):
+            data = self.client.get(f'/api/devices/changes/?limit=2&since={cursor}').json()
+            # 延遲區間內的資料會回傳，但游標不前進，也不要求立即再次請求
+            self.assertEqual(len(data['changed']), 2)
+            self.assertFalse(data['has_more'])
+            self.assertEqual(data['cursor'], cursor)
+            
+            # 模擬較晚提交的交易：updated_at 早於已回傳的資料
+            Device.objects.filter(pk=self.devices[4].pk).update(
+                updated_at=Device.objects.get(pk=self.devices[2].pk).updated_at - timedelta(microseconds=1)
+            )
+            data = self.client.get(f'/api/devices/changes/?since={cursor}').json()
+            self.assertIn(self.devices[4].id, [device['id'] for device in data['changed']])
+    
+    def test_invalid_cursor(self):
+        """測試無效游標回傳 400"""
+        response = self.client.get('/api/devices/changes/?since=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(DEVICE_EVENTS={
+    'BACKEND': 'device_management.events.InMemoryBackend',
+    'HEARTBEAT_INTERVAL': 15,
+})
+class EventStreamTestCase(TestCase):
+    """測試即時事件推送"""
+    
+    def setUp(self):
+        events.get_backend.cache_clear()
+        self.addCleanup(events.get_backend.cache_clear)
+        self.owner = User.objects.create_user(username='owner', password='ownerpass')
+        self.other = User.objects.create_user(username='other', password='otherpass')
+        self.category = DeviceCategory.objects.create(name='伺服器')
+        self.device = Device.objects.create(
+            serial_number='SRV-001', name='伺服器 1',
+            category=self.category, responsible_person=self.owner
+        )
+    
+    def _collect_events(self, change):
+        """訂閱後在交易中執行 change，回傳提交後收到的事件"""
+        async def scenario():
+            subscription = events.get_backend().subscribe()
+            try:
+                await sync_to_async(change)()
+                received = []
+                while True:
+                    try:
+                        received.append(await asyncio.wait_for(subscription.get(), 0.05))
+                    except asyncio.TimeoutError:
+                        return received
+            finally:
+                subscription.close()
+        return async_to_sync(scenario)()
+    
+    def test_published_on_commit(self):
+        """測試變更在提交後推送，且只推送給有權限的使用者"""
+        def change():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.device.status = 'maintenance'
+                self.device.save()
+        
+        received = self._collect_events(change)
+        self.assertEqual([e['type'] for e in received], ['device.updated'])
+        self.assertEqual(received[0]['data']['status'], 'maintenance')
+        self.assertTrue(events.is_visible(received[0], self.owner))
+        self.assertFalse(events.is_visible(received[0], self.other))
+    
+    def test_not_published_on_rollback(self):
+        """測試交易回滾時不推送"""
+        def change():
+            with self.captureOnCommitCallbacks(execute=False):
+                self.device.save()
+        
+        self.assertEqual(self._collect_events(change), [])
+    
+    def test_ip_conflict(self):
+        """測試啟用中的 IP 重複時推送衝突事件"""
+        other_device = Device.objects.create(
+            serial_number='SRV-002', name='伺服器 2',
+            category=self.category, responsible_person=self.other
+        )
+        IPRecord.objects.create(
+            device=other_device, ip_address='10.0.0.9', mac_address='AA:BB:CC:DD:EE:09'
+        )
+        
+        def change():
+            with self.captureOnCommitCallbacks(execute=True):
+                IPRecord.objects.create(
+                    device=self.device, ip_address='10.0.0.9', mac_address='AA:BB:CC:DD:EE:10'
+                )
+        
+        received = self._collect_events(change)
+        self.assertEqual([e['type'] for e in received], ['ip_record.created', 'ip_conflict'])
+        conflict = received[1]
+        self.assertEqual(conflict['data']['device_ids'], sorted([self.device.id, other_device.id]))
+        self.assertTrue(events.is_visible(conflict, self.owner))
+        self.assertTrue(events.is_visible(conflict, self.other))
+    
+    def test_stream_endpoint(self):
+        """測試 SSE 端點需要登入，並只輸出使用者可見的事件"""
+        self.assertEqual(self.client.get('/api/events/stream/').status_code, 403)
+        
+        self.client.force_login(self.owner)
+        response = self.client.get('/api/events/stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        
+        async def read():
+            stream = response.streaming_content
+            chunks = [await anext(stream)]
+            events.publish('device.updated', [self.other.id], id=0)
+            events.publish('device.updated', [self.owner.id], id=self.device.id)
+            chunks.append(await asyncio.wait_for(anext(stream), 1))
+            await stream.aclose()
+            return chunks
+        
+        retry, message = (chunk.decode() for chunk in async_to_sync(read)())
+        self.assertEqual(retry, 'retry: 5000\n\n')
+        self.assertIn('event: device.updated', message)
+        self.assertIn(f'"id":{self.device.id}', message)
+        self.assertEqual(events.get_backend().subscriber_count, 0)
+
+
+class AuditLogRetentionTestCase(TestCase):
+    """測試操作日誌的時間範圍查詢與保存期限"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', password='adminpass', is_staff=True
+        )
+        now = timezone.now()
+        self.logs = {}
+        for label, days in (('recent', 1), ('warm', 150), ('expired', 500)):
+            log = AuditLog.objects.create(
+                user=self.admin, action='update', model_name='Device',
+                object_id='1', object_repr=label
+            )
+            # timestamp 為 auto_now_add，以 update 設定過去的時間
+            AuditLog.objects.filter(pk=log.pk).update(timestamp=now - timedelta(days=days))
+            self.logs[label] = log.pk
+        self.client.force_login(self.admin)
+    
+    def test_default_window(self):
+        """測試列表預設只查詢最近的日誌，可用 since 擴大範圍"""
+        data = self.client.get('/api/audit-logs/').json()
+        self.assertEqual([log['object_repr'] for log in data['results']], ['recent'])
+        
+        since = (timezone.now() - timedelta(days=200)).date().isoformat()
+        data = self.client.get(f'/api/audit-logs/?since={since}').json()
+        self.assertEqual([log['object_repr'] for log in data['results']], ['recent', 'warm'])
+        
+        response = self.client.get('/api/audit-logs/?since=not-a-date')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_prune_to_archive_and_export(self):
+        """測試舊日誌移入封存表，過期的月份匯出為 JSONL 後刪除"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            call_command(
+                'prune_audit_logs', '--hot-months=3', '--retention-months=12',
+                '--format=jsonl', f'--output-dir={output_dir}', stdout=io.StringIO()
+            )
+            self.assertEqual(list(AuditLog.objects.values_list('pk', flat=True)), [self.logs['recent']])
+            self.assertEqual(
+                list(AuditLogArchive.objects.values_list('pk', flat=True)), [self.logs['warm']]
+            )
+            
+            files = os.listdir(output_dir)
+            self.assertEqual(len(files), 1)
+            with gzip.open(os.path.join(output_dir, files[0]), 'rt', encoding='utf-8') as archive:
+                rows = [json.loads(line) for line in archive]
+            self.assertEqual([row['id'] for row in rows], [self.logs['expired']])
+            self.assertEqual(rows[0]['user_id'], self.admin.pk)
+
+
+class AuditArchiveTestCase(TestCase):
+    """測試欄式封存的寫入與查詢"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', password='adminpass', is_staff=True
+        )
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        base = timezone.now() - timedelta(days=400)
+        rows = [
+            {
+                'id': i + 1, 'user_id': self.admin.pk if i % 2 else None,
+                'action': 'update', 'model_name': 'Device', 'object_id': str(i // 10),
+                'object_repr': f'裝置 {i // 10}', 'changes': {'seq': i},
+                'ip_address': None, 'user_agent': None,
+                'timestamp': base + timedelta(minutes=i),
+            }
+            for i in range(1000)
+        ]
+        rows.sort(key=lambda row: (row['model_name'], row['object_id'], row['timestamp']))
+        self.base = base
+        self.path = os.path.join(self.output_dir, 'auditlog-test' + audit_archive.DATA_SUFFIX)
+        audit_archive.write_archive(rows, self.path, chunk_rows=100)
+    
+    def test_search_reads_only_matching_chunks(self):
+        """測試以索引排除不相關的區塊"""
+        query = audit_archive.ArchiveQuery(model_name='Device', object_id='42')
+        rows, stats = audit_archive.search_archives(self.output_dir, query)
+        self.assertEqual(sorted(row['changes']['seq'] for row in rows), list(range(420, 430)))
+        self.assertEqual((stats['chunks'], stats['chunks_read']), (10, 1))
+        self.assertEqual(rows[0]['timestamp'], self.base + timedelta(minutes=429))
+        
+        query = audit_archive.ArchiveQuery(until=self.base - timedelta(days=1))
+        self.assertEqual(audit_archive.search_archives(self.output_dir, query)[1]['files_read'], 0)
+    
+    def test_search_limit_keeps_newest(self):
+        """測試有 limit 時只保留最新的資料列"""
+        rows, _ = audit_archive.search_archives(self.output_dir, audit_archive.ArchiveQuery(), limit=5)
+        self.assertEqual([row['changes']['seq'] for row in rows], [999, 998, 997, 996, 995])
+        rows, _ = audit_archive.search_archives(
+            self.output_dir, audit_archive.ArchiveQuery(model_name='Device', object_id='3'), limit=20
+        )
+        self.assertEqual([row['changes']['seq'] for row in rows], list(range(39, 29, -1)))
+    
+    def test_prune_and_search(self):
+        """測試保存期限指令寫出的封存可由 API 查詢"""
+        log = AuditLog.objects.create(
+            user=self.admin, action='delete', model_name='Device', object_id='500', object_repr='舊裝置'
+        )
+        AuditLog.objects.filter(pk=log.pk).update(timestamp=timezone.now() - timedelta(days=500))
+        call_command('prune_audit_logs', f'--output-dir={self.output_dir}', stdout=io.StringIO())
+        self.assertFalse(AuditLog.objects.filter(pk=log.pk).exists())
+        
+        self.client.force_login(self.admin)
+        with override_settings(AUDIT_LOG={'ARCHIVE_DIR': self.output_dir}):
+            data = self.client.get(
+                '/api/audit-logs/archive/?model_name=Device&object_id=500&user=%d' % self.admin.pk
+            ).json()
+        self.assertEqual(
+            [(r['id'], r['user_name'], r['action']) for r in data['results']],
+            [(log.pk, 'admin', 'delete')]
+        )
+
+
+class ObjectHistoryTestCase(TestCase):
+    """測試依物件主鍵查詢操作歷史"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', password='adminpass', is_staff=True
+        )
+        self.category = DeviceCategory.objects.create(name='電腦')
+        self.device = Device.objects.create(
+            serial_number='PC-001', name='電腦 1', category=self.category
+        )
+        now = timezone.now()
+        for i in range(5):
+            log = AuditLog.objects.create(
+                user=self.admin, action='update', model_name='Device',
+                object_id=str(self.device.id), object_repr=f'v{i}'
+            )
+            AuditLog.objects.filter(pk=log.pk).update(timestamp=now - timedelta(days=i * 10))
+        # 其他物件與其他模型的同 ID 日誌不應出現
+        AuditLog.objects.create(action='update', model_name='Device', object_id='99999')
+        AuditLog.objects.create(
+            action='update', model_name='DeviceCategory', object_id=str(self.device.id)
+        )
+        self.client.force_login(self.admin)
+    
+    def test_object_pk_populated(self):
+        """測試儲存時自動填入整數主鍵"""
+        self.assertEqual(AuditLog.objects.filter(object_pk=self.device.id).count(), 6)
+        log = AuditLog.objects.create(action='view', model_name='Report', object_id='summary')
+        self.assertIsNone(log.object_pk)
+    
+    def test_paginated_history(self):
+        """測試以游標分頁逐頁取得歷史"""
+        url = f'/api/devices/{self.device.id}/history/?page_size=2'
+        seen = []
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(log['object_repr'] for log in data['results'])
+            url = data['next']
+        self.assertEqual(seen, ['v0', 'v1', 'v2', 'v3', 'v4'])
+    
+    def test_windowed_history(self):
+        """測試以 since / until 限定時間範圍"""
+        since = (timezone.now() - timedelta(days=25)).isoformat()
+        until = (timezone.now() - timedelta(days=5)).isoformat()
+        response = self.client.get(
+            f'/api/devices/{self.device.id}/history/', {'since': since, 'until': until}
+        )
+        self.assertEqual([log['object_repr'] for log in response.json()['results']], ['v1', 'v2'])
+    
+    def test_category_history(self):
+        """測試其他模型共用相同的歷史端點"""
+        data = self.client.get(f'/api/categories/{self.category.id}/history/').json()
+        self.assertEqual(len(data['results']), 1)
+        self.assertEqual(data['results'][0]['model_name'], 'DeviceCategory')
+    
+    def test_history_hides_other_users_logs(self):
+        """測試一般用戶的歷史只包含自己的操作日誌"""
+        user = User.objects.create_user(username='viewer', password='viewerpass')
+        AuditLog.objects.create(
+            user=user, action='update', model_name='DeviceCategory', object_id=str(self.category.id),
+            object_repr='mine'
+        )
+        AuditLog.objects.create(
+            user=self.admin, action='update', model_name='DeviceCategory', object_id=str(self.category.id),
+            object_repr='admin', ip_address='10.0.0.1', user_agent='admin-browser'
+        )
+        self.client.force_login(user)
+        data = self.client.get(f'/api/categories/{self.category.id}/history/').json()
+        self.assertEqual([log['object_repr'] for log in data['results']], ['mine'])
+
+
+@override_settings(ACCESS_AUDIT={**settings.ACCESS_AUDIT, 'FLUSH_INTERVAL': None})
+class AccessAuditTestCase(TestCase):
+    """測試讀取稽核"""
+    
+    def setUp(self):
+        access_audit.get_recorder.cache_clear()
+        self.addCleanup(access_audit.get_recorder.cache_clear)
+        self.user = User.objects.create_user(username='reader', password='readerpass')
+        self.category = DeviceCategory.objects.create(name='電腦')
+        self.devices = [
+            Device.objects.create(
+                serial_number=f'PC-{i:03d}', name=f'電腦 {i}',
+                category=self.category, responsible_person=self.user
+            )
+            for i in range(3)
+        ]
+        self.client.force_login(self.user)
+    
+    def test_reads_aggregated_and_flushed(self):
+        """測試讀取只累積在記憶體，flush 時以 upsert 累加"""
+        recorder = access_audit.get_recorder()
+        self.client.get('/api/devices/')
+        self.client.get(f'/api/devices/{self.devices[0].id}/')
+        self.client.get(f'/api/async/devices/{self.devices[0].id}/')
+        self.assertFalse(AccessCount.objects.exists())
+        self.assertEqual(recorder.pending_count, 3)
+        
+        self.assertEqual(recorder.flush(), 3)
+        self.client.get(f'/api/devices/{self.devices[0].id}/')
+        recorder.flush()
+        
+        counts = dict(AccessCount.objects.filter(user=self.user).values_list('object_pk', 'count'))
+        self.assertEqual(counts, {self.devices[0].id: 4, self.devices[1].id: 1, self.devices[2].id: 1})
+    
+    def test_disabled_viewset(self):
+        """測試未啟用讀取稽核的 ViewSet 不會記錄"""
+        self.client.get('/api/categories/')
+        self.client.get('/api/ip-records/')
+        self.assertEqual(access_audit.get_recorder().pending_count, 0)
+    
+    def test_sampling_weight(self):
+        """測試取樣時以權重估算次數"""
+        recorder = access_audit.AccessRecorder(sample_rate=0.25, flush_interval=None)
+        with mock.patch('random.random', return_value=0.1):
+            recorder.record(self.user.id, 'Device', [self.devices[0].id])
+        with mock.patch('random.random', return_value=0.9):
+            recorder.record(self.user.id, 'Device', [self.devices[0].id])
+        recorder.flush()
+        self.assertEqual(AccessCount.objects.get().count, 4)
+
+
+class RowPermissionTestCase(TestCase):
+    """測試列級權限規則"""
+    
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pw')
+        self.other = User.objects.create_user(username='other', password='pw')
+        self.category = DeviceCategory.objects.create(name='電腦')
+        self.device = Device.objects.create(
+            serial_number='PC-001', name='電腦', category=self.category,
+            responsible_person=self.owner
+        )
+        self.other_device = Device.objects.create(
+            serial_number='PC-002', name='電腦 2', category=self.category,
+            responsible_person=self.other
+        )
+        self.ip_record = IPRecord.objects.create(
+            device=self.device, ip_address='10.0.0.1', mac_address='AA:BB:CC:DD:EE:01'
+        )
+    
+    def test_filter_compiles_to_foreign_key_id(self):
+        """測試規則編譯為外鍵 ID 條件，不連接用戶資料表"""
+        queryset = get_row_policy(IPRecord).filter_queryset(IPRecord.objects.all(), self.owner)
+        sql = str(queryset.query)
+        self.assertIn('responsible_person_id', sql)
+        self.assertNotIn('auth_user', sql)
+        self.assertEqual(list(queryset), [self.ip_record])
+    
+    def test_object_permission_without_user_fetch(self):
+        """測試物件權限只比對外鍵 ID，不載入用戶物件"""
+        request = mock.Mock(method='PATCH', user=self.owner)
+        device = Device.objects.get(pk=self.device.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(IsOwnerOrAdmin().has_object_permission(request, None, device))
+        
+        # 中間關聯未載入時只查詢裝置的外鍵 ID
+        ip_record = IPRecord.objects.get(pk=self.ip_record.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(IsOwnerOrAdmin().has_object_permission(request, None, ip_record))
+        request.user = self.other
+        ip_record = IPRecord.objects.select_related('device').get(pk=self.ip_record.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(IsOwnerOrAdmin().has_object_permission(request, None, ip_record))
+    
+    def test_permitted_pks(self):
+        """測試批次操作只保留可存取的主鍵"""
+        policy = get_row_policy(Device)
+        pks = [self.device.pk, self.other_device.pk]
+        self.assertEqual(policy.permitted_pks(Device.objects.all(), self.owner, pks), {self.device.pk})
+        self.other.is_staff = True
+        self.assertEqual(policy.permitted_pks(Device.objects.all(), self.other, pks), set(pks))
+    
+    def test_api_detail_and_write_paths(self):
+        """測試詳情、更新與關聯欄位皆套用相同規則"""
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(f'/api/devices/{self.other_device.id}/').status_code, 404)
+        response = self.client.patch(
+            f'/api/devices/{self.other_device.id}/', {'name': '改名'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 404)
+        
+        # IP 記錄不能綁定到他人負責的裝置
+        response = self.client.post('/api/ip-records/', {
+            'device': self.other_device.id, 'ip_address': '10.0.0.2', 'mac_address': 'AA:BB:CC:DD:EE:02'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('device', response.json())
+        response = self.client.post('/api/ip-records/', {
+            'device': self.device.id, 'ip_address': '10.0.0.2', 'mac_address': 'AA:BB:CC:DD:EE:02'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+
+@override_settings(API_THROTTLE={
+    'ENABLED': True,
+    'CACHE': 'default',
+    'RATES': {'read': '5/min', 'write': '5/min', 'statistics': '2/min', 'ping': '2/min'},
+    'ADMIN_RATES': {'statistics': '3/min'},
+})
+class ThrottleTestCase(TestCase):
+    """測試流量限制"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='pw')
+        self.admin = User.objects.create_user(username='admin', password='pw', is_staff=True)
+    
+    def test_expensive_action_has_separate_budget(self):
+        """測試統計使用獨立額度，超過時回應 Retry-After"""
+        self.client.force_login(self.user)
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/devices/statistics/').status_code, 200)
+        response = self.client.get('/api/devices/statistics/')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(self.client.get('/api/devices/').status_code, 200)
+    
+    def test_admin_override(self):
+        """測試管理員不受一般讀取額度限制，昂貴動作使用管理員額度"""
+        self.client.force_login(self.admin)
+        for _ in range(10):
+            self.assertEqual(self.client.get('/api/categories/').status_code, 200)
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/devices/statistics/').status_code, 200)
+        self.assertEqual(self.client.get('/api/devices/statistics/').status_code, 429)
+    
+    def test_throttled_request_skips_database(self):
+        """測試超過額度的請求不查詢資料庫"""
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from .views import DeviceViewSet
+        view = DeviceViewSet.as_view({'get': 'statistics'})
+        factory = APIRequestFactory()
+        
+        def send():
+            request = factory.get('/api/devices/statistics/')
+            force_authenticate(request, user=self.user)
+            return view(request)
+        
+        send()
+        send()
+        with self.assertNumQueries(0):
+            response = send()
+        self.assertEqual(response.status_code, 429)
+    
+    def test_async_endpoint(self):
+        """測試非同步端點同樣套用額度"""
+        self.client.force_login(self.user)
+        for _ in range(2):
+            response = self.client.get('/api/async/ip-records/check_ip_available/', {'ip': '10.0.0.1'})
+            self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/async/ip-records/check_ip_available/', {'ip': '10.0.0.1'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+    
+    def test_sliding_window_weight(self):
+        """測試前一個視窗的次數依剩餘比例計入"""
+        from django.core.cache import cache
+        counter = throttling.SlidingWindowCounter(cache, 10, 60)
+        for _ in range(10):
+            self.assertIsNone(counter.hit('test', now=6000))
+        self.assertEqual(counter.hit('test', now=6030), 30)
+        # 下一個視窗過了一半時，前一個視窗的 10 次只計入 5 次
+        self.assertIsNone(counter.hit('test', now=6090))
+        self.assertEqual(throttling.parse_rate('10/5m'), (10, 300))
+        self.assertEqual(throttling.parse_rate('30/min'), (30, 60))
+
+
+class TokenAuthenticationTestCase(TestCase):
+    """測試 API 權杖認證"""
+    
+    def setUp(self):
+        from django.core.cache import caches
+        caches['shared'].clear()
+        authentication.get_local_cache().clear()
+        self.user = User.objects.create_user(username='script', password='pw')
+        self.token, self.raw = authentication.create_token(self.user, '整合腳本')
+    
+    def _authenticate(self, raw):
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        request = Request(APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {raw}'))
+        return authentication.TokenAuthentication().authenticate(request)
+    
+    def test_principal_cached(self):
+        """測試第一次查詢資料庫，之後由快取取得主體"""
+        with self.assertNumQueries(2):
+            user, principal = self._authenticate(self.raw)
+        self.assertEqual(user.pk, self.user.pk)
+        with self.assertNumQueries(0):
+            user, _ = self._authenticate(self.raw)
+        self.assertEqual(user.username, 'script')
+        self.assertIsNotNone(APIToken.objects.get().last_used_at)
+        
+        response = self.client.get('/api/devices/', HTTP_AUTHORIZATION=f'Bearer {self.raw}')
+        self.assertEqual(response.status_code, 200)
+    
+    def test_revocation(self):
+        """測試撤銷後立即失效"""
+        self._authenticate(self.raw)
+        call_command('api_token', 'revoke', self.token.prefix, stdout=io.StringIO())
+        response = self.client.get('/api/devices/', HTTP_AUTHORIZATION=f'Bearer {self.raw}')
+        self.assertEqual(response.status_code, 403)
+        self.assertIsNotNone(APIToken.objects.get().revoked_at)
+    
+    def test_user_deactivation_and_expiry(self):
+        """測試停用用戶與過期的權杖皆無法認證"""
+        self._authenticate(self.raw)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(authentication.resolve_principal(self.raw))
+        
+        self.user.is_active = True
+        self.user.save()
+        APIToken.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(authentication.resolve_principal(self.raw))
+    
+    def test_create_command(self):
+        """測試以指令建立權杖"""
+        output = io.StringIO()
+        call_command('api_token', 'create', 'script', '--name', 'CI', '--expires-days', '30', stdout=output)
+        raw = output.getvalue().strip().splitlines()[-1]
+        self.assertTrue(raw.startswith(authentication.TOKEN_PREFIX))
+        self.assertEqual(self._authenticate(raw)[0].pk, self.user.pk)
+        self.assertNotIn(raw, APIToken.objects.values_list('key_hash', flat=True))
+
+
+class ValuationTestCase(TestCase):
+    """測試資產估值"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='finance', password='pw', is_staff=True)
+        self.category = DeviceCategory.objects.create(name='伺服器')
+        self.as_of = date(2024, 1, 1)
+        self.device = Device.objects.create(
+            serial_number='SRV-001', name='伺服器', category=self.category,
+            cost=Decimal('10000.00'), depreciation_rate=Decimal('20.00'),
+            purchase_date=self.as_of - timedelta(days=730)
+        )
+    
+    def test_methods(self):
+        """測試直線法、定率遞減法與折舊表"""
+        self.assertEqual(self.device.get_current_depreciation(self.as_of), Decimal('6002.74'))
+        
+        self.device.depreciation_method = valuation.DECLINING_BALANCE
+        # 10000 * 0.8 ** (730 / 365.25)
+        self.assertEqual(self.device.get_current_depreciation(self.as_of), Decimal('6401.96'))
+        
+        self.device.depreciation_method = valuation.SCHEDULE
+        self.device.depreciation_schedule = [40, 30, 20, 10]
+        self.device.salvage_value = Decimal('3500.00')
+        # 兩年累計折舊約 69.97%，低於殘值時以殘值計
+        self.assertEqual(self.device.get_current_depreciation(self.as_of), Decimal('3500.00'))
+        self.assertEqual(self.device.get_current_depreciation(self.device.purchase_date), Decimal('10000.00'))
+        
+        self.device.depreciation_schedule = None
+        self.assertIsNone(self.device.get_current_depreciation(self.as_of))
+    
+    @unittest.skipIf(valuation.numpy is None, '未安裝 NumPy')
+    def test_vectorized_matches_decimal(self):
+        """測試向量化結果與逐筆 Decimal 計算完全相同"""
+        rng = random.Random(7)
+        methods = [valuation.STRAIGHT_LINE, valuation.DECLINING_BALANCE, valuation.SCHEDULE, None]
+        rows = [
+            (
+                Decimal(rng.randint(0, 10_000_000)) / 100 if rng.random() > 0.05 else None,
+                Decimal(rng.randint(0, 10000)) / 100 if rng.random() > 0.05 else None,
+                self.as_of - timedelta(days=rng.randint(-30, 4000)) if rng.random() > 0.05 else None,
+                rng.choice(methods),
+                Decimal(rng.randint(0, 1000)) if rng.random() < 0.3 else None,
+                rng.choice([[50, 50], [40, 30, 20, 10], []]),
+            )
+            for _ in range(3000)
+        ]
+        # 剛好落在半分的資料列
+        rows.append((Decimal('0.05'), Decimal('50.00'), self.as_of - timedelta(days=1461), None, None, None))
+        self.assertEqual(
+            valuation._compute_numpy(rows, self.as_of),
+            valuation._compute_python(rows, self.as_of)
+        )
+    
+    def test_report_endpoint(self):
+        """測試估值報表的分組與日期"""
+        other = DeviceCategory.objects.create(name='筆電')
+        Device.objects.create(
+            serial_number='NB-001', name='筆電', category=other, cost=Decimal('3000.00'),
+            depreciation_rate=Decimal('50.00'), purchase_date=self.as_of - timedelta(days=730)
+        )
+        Device.objects.create(serial_number='NB-002', name='未估值', category=other)
+        self.client.force_login(self.user)
+        
+        response = self.client.get('/api/devices/valuation_report/', {
+            'as_of': '2024-01-01', 'group_by': 'category'
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['as_of'], '2024-01-01')
+        self.assertEqual(data['device_count'], 3)
+        self.assertEqual(data['valued_count'], 2)
+        self.assertEqual(data['total_cost'], '13000.00')
+        self.assertEqual(data['total_value'], '6004.79')
+        groups = {group['key']: group for group in data['groups']}
+        self.assertEqual(groups['筆電']['total_depreciation'], '2997.95')
+        
+        self.assertEqual(
+            self.client.get('/api/devices/valuation_report/', {'group_by': 'serial'}).status_code, 400
+        )
+        self.assertEqual(self.client.get('/api/devices/valuation_report/', {'as_of': 'x'}).status_code, 400)
+        
+        response = self.client.get(f'/api/devices/{self.device.id}/', {'as_of': '2024-01-01'})
+        self.assertEqual(response.json()['current_value'], 6002.74)
+    
+    def test_lists_batch_current_value(self):
+        """測試 IP 搜尋與 Admin 列表以一次查詢計算整頁的價值，不逐筆計算"""
+        IPRecord.objects.create(device=self.device, ip_address='10.0.0.9', mac_address='AA:BB:CC:DD:EE:09')
+        self.client.force_login(User.objects.create_superuser(username='root', password='pw'))
+        
+        with mock.patch('device_management.valuation.value_as_of') as value_as_of:
+            response = self.client.get('/api/devices/search_by_ip/', {'ip': '10.0.0.9', 'as_of': '2024-01-01'})
+            self.assertEqual(response.json()[0]['current_value'], 6002.74)
+            response = self.client.get('/api/async/devices/search_by_ip/', {'ip': '10.0.0.9', 'as_of': '2024-01-01'})
+            self.assertEqual(response.json()[0]['current_value'], 6002.74)
+            response = self.client.get('/admin/device_management/device/')
+            self.assertContains(response, 'color: blue')
+        value_as_of.assert_not_called()
+    
+    def test_schedule_validation(self):
+        """測試折舊表的驗證"""
+        self.client.force_login(self.user)
+        response = self.client.patch(
+            f'/api/devices/{self.device.id}/',
+            {'depreciation_method': 'schedule', 'depreciation_schedule': [60, 50]},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('depreciation_schedule', response.json())
+
+
+class ExpiryTestCase(TestCase):
+    """測試到期查詢與到期摘要"""
+    
+    def setUp(self):
+        self.today = date(2024, 6, 1)
+        self.owner = User.objects.create_user(username='owner', password='pw', email='owner@example.com')
+        self.other = User.objects.create_user(username='other', password='pw')
+        category = DeviceCategory.objects.create(name='電腦')
+        
+        def create(serial, owner, **dates):
+            return Device.objects.create(
+                serial_number=serial, name=serial, category=category, responsible_person=owner, **dates
+            )
+        
+        self.soon = create('PC-1', self.owner, warranty_end_date=self.today + timedelta(days=5))
+        self.both = create(
+            'PC-2', self.owner,
+            warranty_end_date=self.today + timedelta(days=20),
+            retirement_date=self.today + timedelta(days=10)
+        )
+        create('PC-3', self.owner, warranty_end_date=self.today + timedelta(days=90))
+        create('PC-4', self.owner, warranty_end_date=self.today - timedelta(days=1))
+        create('PC-5', self.owner, warranty_end_date=self.today, status='retired')
+        self.others = create('PC-6', self.other, retirement_date=self.today + timedelta(days=30))
+        create('PC-7', None, warranty_end_date=self.today + timedelta(days=1))
+        
+        notifications.outbox.clear()
+        notifications.get_backend.cache_clear()
+        self.addCleanup(notifications.get_backend.cache_clear)
+    
+    def test_upcoming_by_owner(self):
+        """測試以一次查詢依責任人分組"""
+        with self.assertNumQueries(1):
+            groups = expiry.upcoming_by_owner(Device.objects.all(), 30, self.today)
+        self.assertEqual(set(groups), {self.owner.pk, self.other.pk})
+        self.assertEqual(
+            [(item['device_id'], item['kind']) for item in groups[self.owner.pk]],
+            [(self.soon.pk, 'warranty'), (self.both.pk, 'retirement'), (self.both.pk, 'warranty')]
+        )
+    
+    def test_expiring_action(self):
+        """測試 expiring 動作依權限、類型與天數篩選"""
+        self.client.force_login(self.owner)
+        with mock.patch('django.utils.timezone.localdate', return_value=self.today):
+            response = self.client.get('/api/devices/expiring/', {'days': 30})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([row['serial_number'] for row in response.json()['results']], ['PC-1', 'PC-2'])
+            self.assertEqual(response.json()['results'][0]['warranty_end_date'], '2024-06-06')
+            
+            response = self.client.get('/api/devices/expiring/', {'kind': 'retirement'})
+            self.assertEqual([row['serial_number'] for row in response.json()['results']], ['PC-2'])
+        
+        self.assertEqual(self.client.get('/api/devices/expiring/', {'kind': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/devices/expiring/', {'days': 'x'}).status_code, 400)
+    
+    @override_settings(NOTIFICATIONS={'BACKEND': 'device_management.notifications.LocMemBackend'})
+    def test_digest_command(self):
+        """測試到期摘要批次建立通知，重新執行不會重複送出"""
+        out = io.StringIO()
+        call_command('expiry_digest', date='2024-06-01', batch_size=1, stdout=out)
+        self.assertEqual(len(notifications.outbox), 2)
+        self.assertIn('本次送出 2 則通知', out.getvalue())
+        message = next(item for item in notifications.outbox if item['user_id'] == self.owner.pk)
+        self.assertEqual(message['email'], 'owner@example.com')
+        self.assertEqual(len(message['payload']['items']), 3)
+        self.assertIn('預計報廢：PC-2', message['body'])
+        
+        call_command('expiry_digest', date='2024-06-01', stdout=io.StringIO())
+        self.assertEqual(len(notifications.outbox), 2)
+        self.assertFalse(Notification.objects.filter(delivered_at__isnull=True).exists())
+    
+    def test_file_backend(self):
+        """測試檔案後端以 JSONL 寫入"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'notifications.jsonl')
+        with override_settings(NOTIFICATIONS={
+            'BACKEND': 'device_management.notifications.FileBackend', 'OPTIONS': {'path': path}
+        }):
+            call_command('expiry_digest', date='2024-06-01', days=30, stdout=io.StringIO())
+        with open(path, encoding='utf-8') as source:
+            lines = [json.loads(line) for line in source]
+        self.assertEqual(sorted(line['username'] for line in lines), ['other', 'owner'])
+
+
+class AdminChangelistTestCase(TestCase):
+    """測試 Admin 列表的查詢數量不隨資料列數增加"""
+    
+    def setUp(self):
+        self.superuser = User.objects.create_superuser(username='root', password='pw')
+        self.client.force_login(self.superuser)
+        self.category = DeviceCategory.objects.create(name='伺服器')
+        PropertyDefinition.objects.create(category=self.category, name='CPU', field_type='text')
+    
+    def _add_rows(self, count):
+        for _ in range(count):
+            owner = User.objects.create_user(username=f'user-{uuid.uuid4().hex[:8]}')
+            device = Device.objects.create(
+                serial_number=uuid.uuid4().hex[:12], name='裝置', category=self.category,
+                responsible_person=owner, cost=Decimal('100.00'), depreciation_rate=Decimal('10.00'),
+                purchase_date=date(2023, 1, 1)
+            )
+            IPRecord.objects.create(
+                device=device, ip_address=f'10.0.{random.randint(0, 255)}.{random.randint(1, 254)}',
+                mac_address='AA:BB:CC:DD:EE:FF'
+            )
+            AuditLog.objects.create(user=owner, action='update', model_name='Device', object_id=str(device.pk))
+    
+    def _query_counts(self):
+        counts = {}
+        for url in (
+            '/admin/device_management/device/',
+            '/admin/device_management/iprecord/',
+            '/admin/device_management/auditlog/',
+            '/admin/device_management/devicecategory/',
+            '/admin/device_management/propertydefinition/',
+        ):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            counts[url] = len(queries)
+        return counts
+    
+    def test_query_count_independent_of_rows(self):
+        """測試列表以 JOIN 載入關聯，不逐列查詢"""
+        self._add_rows(2)
+        before = self._query_counts()
+        self._add_rows(5)
+        self.assertEqual(self._query_counts(), before)
+    
+    def test_audit_log_filters(self):
+        """測試日誌的模型篩選與日期階層"""
+        self._add_rows(1)
+        response = self.client.get('/admin/device_management/auditlog/', {
+            'model_name': 'Device', 'timestamp__year': timezone.now().year
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 1)
+    
+    def test_estimated_count_paginator(self):
+        """測試未篩選時使用估算值，篩選後精確計數"""
+        self._add_rows(3)
+        with mock.patch('device_management.pagination.estimate_row_count', return_value=50000):
+            self.assertEqual(EstimatedCountPaginator(AuditLog.objects.all(), 10).count, 50000)
+            self.assertEqual(
+                EstimatedCountPaginator(AuditLog.objects.filter(model_name='Device'), 10).count, 3
+            )
+        with mock.patch('device_management.pagination.estimate_row_count', return_value=None):
+            self.assertEqual(EstimatedCountPaginator(AuditLog.objects.all(), 10).count, 3)
+
+
+class AdminBulkActionTestCase(TestCase):
+    """測試 Admin 批次動作以集合式 UPDATE 執行"""
+    
+    url = '/admin/device_management/device/'
+    
+    def setUp(self):
+        self.superuser = User.objects.create_superuser(username='root', password='pw')
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        self.client.force_login(self.superuser)
+        self.category = DeviceCategory.objects.create(name='印表機')
+        self.devices = [
+            Device.objects.create(
+                serial_number=f'PR-{index}', name=f'印表機 {index}', category=self.category,
+                responsible_person=self.alice if index % 2 else self.bob
+            )
+            for index in range(4)
+        ]
+        self.ip = IPRecord.objects.create(
+            device=self.devices[0], ip_address='10.1.0.1', mac_address='AA:BB:CC:DD:EE:01'
+        )
+    
+    def _post(self, action, url=None, **data):
+        # 「選取全部」時頁面仍會送出目前頁面勾選的項目
+        return self.client.post(url or self.url, {
+            'action': action, 'select_across': '1', 'index': '0', '_selected_action': [1], **data
+        })
+    
+    def test_change_status(self):
+        """測試狀態變更：單一 UPDATE、批次日誌與依負責人分組的事件"""
+        Device.objects.filter(pk=self.devices[3].pk).update(status='maintenance')
+        before = Device.objects.order_by('pk').values_list('updated_at', flat=True)[0]
+        with mock.patch.object(bulk.events, 'publish_on_commit') as publish:
+            response = self._post('change_status', status='maintenance')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Device.objects.filter(status='maintenance').count(), 4)
+        self.assertGreater(Device.objects.order_by('pk').values_list('updated_at', flat=True)[0], before)
+        
+        logs = AuditLog.objects.filter(model_name='Device', action='update')
+        self.assertEqual(logs.count(), 3)
+        self.assertEqual(logs.first().changes, {'status': {'old': 'active', 'new': 'maintenance'}})
+        log = logs.get(object_pk=self.devices[0].pk)
+        self.assertEqual(log.user, self.superuser)
+        self.assertEqual(log.object_id, str(self.devices[0].pk))
+        self.assertEqual(log.object_repr, '印表機 0 (PR-0)')
+        self.assertEqual(log.ip_address, '127.0.0.1')
+        self.assertLess(abs(log.timestamp - timezone.now()), timedelta(minutes=1))
+        
+        owners = sorted(call.args[1][0] for call in publish.call_args_list)
+        self.assertEqual(owners, [self.alice.pk, self.bob.pk])
+        self.assertEqual(publish.call_args_list[0].args[0], 'device.bulk_updated')
+    
+    def test_query_count_independent_of_rows(self):
+        """測試查詢數不隨資料列數增加"""
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                bulk.bulk_update(Device.objects.all(), {'department': uuid.uuid4().hex}, self.superuser)
+            return len(queries)
+        
+        before = count_queries()
+        for index in range(10):
+            Device.objects.create(serial_number=f'EXTRA-{index}', name='新增', category=self.category)
+        self.assertEqual(count_queries(), before)
+    
+    def test_reassign(self):
+        """測試重新指派時原負責人與新負責人都收到事件"""
+        with mock.patch.object(bulk.events, 'publish_on_commit') as publish:
+            self._post('reassign', username='alice')
+        self.assertEqual(Device.objects.filter(responsible_person=self.alice).count(), 4)
+        log = AuditLog.objects.get(model_name='Device', object_pk=self.devices[0].pk)
+        self.assertEqual(log.changes, {'responsible_person': {'old': 'bob', 'new': 'alice'}})
+        self.assertEqual(publish.call_args.args[1], [self.bob.pk, self.alice.pk])
+        
+        self._post('reassign', username='nobody')
+        self.assertEqual(AuditLog.objects.count(), 2)
+    
+    def test_retire_and_deactivate(self):
+        """測試報廢裝置會一併停用 IP，並可單獨停用 IP 記錄"""
+        self.client.post(self.url, {
+            'action': 'retire', 'index': '0', '_selected_action': [self.devices[0].pk]
+        })
+        device = Device.objects.get(pk=self.devices[0].pk)
+        self.assertEqual(device.status, 'retired')
+        self.assertEqual(device.retirement_date, timezone.localdate())
+        self.assertFalse(IPRecord.objects.get(pk=self.ip.pk).is_active)
+        self.assertTrue(AuditLog.objects.filter(model_name='IPRecord', object_pk=self.ip.pk).exists())
+        self.assertEqual(Device.objects.filter(status='retired').count(), 1)
+        
+        IPRecord.objects.filter(pk=self.ip.pk).update(is_active=True)
+        self._post('deactivate', url='/admin/device_management/iprecord/')
+        self.assertFalse(IPRecord.objects.get(pk=self.ip.pk).is_active)
+    
+    def test_delete_writes_audit_logs(self):
+        """測試 Admin 批次刪除會寫入操作日誌"""
+        self.client.post(self.url, {
+            'action': 'delete_selected', 'post': 'yes', 'index': '0',
+            '_selected_action': [device.pk for device in self.devices[:2]]
+        })
+        self.assertEqual(Device.objects.count(), 2)
+        self.assertEqual(AuditLog.objects.filter(model_name='Device', action='delete').count(), 2)
+    
+    def test_delete_cascades_ip_records_in_bulk(self):
+        """測試刪除裝置時 IP 記錄以集合式 SQL 刪除：查詢數不隨 IP 數增加，並寫入日誌與刪除記錄"""
+        def count_queries(ip_count):
+            device = Device.objects.create(
+                serial_number=uuid.uuid4().hex[:12], name='主機', category=self.category,
+                responsible_person=self.alice
+            )
+            for index in range(ip_count):
+                IPRecord.objects.create(
+                    device=device, ip_address=f'10.2.{ip_count}.{index + 1}', mac_address='AA:BB:CC:DD:EE:02'
+                )
+            with CaptureQueriesContext(connection) as queries:
+                bulk.delete(Device.objects.filter(pk=device.pk), self.superuser)
+            return len(queries)
+        
+        self.assertEqual(count_queries(1), count_queries(10))
+        
+        with mock.patch.object(bulk.events, 'publish_on_commit') as publish:
+            self.client.post(self.url, {
+                'action': 'delete_selected', 'post': 'yes', 'index': '0',
+                '_selected_action': [self.devices[0].pk]
+            })
+        self.assertFalse(IPRecord.objects.filter(pk=self.ip.pk).exists())
+        self.assertTrue(
+            AuditLog.objects.filter(model_name='IPRecord', object_pk=self.ip.pk, action='delete').exists()
+        )
+        self.assertTrue(Tombstone.objects.filter(model_name='IPRecord', object_id=self.ip.pk).exists())
+        publish.assert_any_call('ip_record.bulk_deleted', [self.bob.pk], ids=[self.ip.pk])
+        self.assertNotIn('ip_record.deleted', [call.args[0] for call in publish.call_args_list])
+
+
+@override_settings(PROPERTY_MIGRATIONS={**settings.PROPERTY_MIGRATIONS, 'BACKGROUND': False})
+class SchemaMigrationTestCase(TestCase):
+    """測試屬性定義變更後分批改寫裝置的動態屬性"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='root', password='pw')
+        self.client.force_login(self.admin)
+        self.category = DeviceCategory.objects.create(name='伺服器')
+        self.definition = PropertyDefinition.objects.create(category=self.category, name='cpu', field_type='text')
+        values = ['8', '16', 'many', None]
+        for index, value in enumerate(values):
+            Device.objects.create(
+                serial_number=f'SV-{index}', name=f'伺服器 {index}', category=self.category,
+                custom_properties={} if value is None else {'cpu': value}
+            )
+    
+    def _properties(self):
+        return list(Device.objects.order_by('pk').values_list('custom_properties', flat=True))
+    
+    def _patch(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(
+                f'/api/properties/{self.definition.pk}/', data, content_type='application/json'
+            )
+    
+    def test_diff(self):
+        """測試比較定義產生的操作"""
+        old = property_schema.snapshot(self.definition)
+        new = {**old, 'name': 'cores', 'field_type': 'number', 'is_required': True}
+        self.assertEqual([operation['op'] for operation in property_schema.diff(old, new)], ['rename', 'convert', 'require'])
+        self.assertEqual(property_schema.diff(old, dict(old)), [])
+        self.assertEqual(property_schema.coerce('boolean', '是'), True)
+        with self.assertRaises(ValueError):
+            property_schema.coerce('number', 'many')
+    
+    def test_rename(self):
+        """測試更名時改寫鍵名，回應附上工作進度"""
+        response = self._patch(name='cores')
+        self.assertEqual(response.status_code, 200)
+        job = response.json()['schema_migration']
+        self.assertEqual((job['status'], job['total']), ('pending', 4))
+        
+        # 交易提交後執行，可由 API 查詢進度
+        job = self.client.get(f"/api/property-migrations/{job['id']}/").json()
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual((job['processed'], job['updated']), (4, 3))
+        self.assertEqual(self._properties(), [{'cores': '8'}, {'cores': '16'}, {'cores': 'many'}, {}])
+        self.assertEqual(PropertyMigration.objects.get().created_by, self.admin)
+    
+    def test_convert_type(self):
+        """測試變更型態時轉換既有值並統計無法轉換的裝置"""
+        self._patch(field_type='number')
+        job = self.client.get('/api/property-migrations/').json()['results'][0]
+        self.assertEqual((job['updated'], job['invalid']), (2, 1))
+        self.assertEqual(self._properties()[:3], [{'cpu': 8}, {'cpu': 16}, {'cpu': 'many'}])
+        self.assertEqual(job['samples'], [Device.objects.get(serial_number='SV-2').pk])
+    
+    def test_required_default_backfill(self):
+        """測試設為必填並設定預設值時補上缺少的屬性"""
+        self._patch(is_required=True, default_value='4')
+        self.assertEqual(self._properties()[3], {'cpu': '4'})
+        self.assertEqual(self._properties()[0], {'cpu': '8'})
+        
+        # 沒有預設值時只統計缺少的裝置
+        other = PropertyDefinition.objects.create(category=self.category, name='rack', field_type='text')
+        with self.captureOnCommitCallbacks(execute=True):
+            other.is_required = True
+            other.save()
+        self.assertEqual(PropertyMigration.objects.latest('id').missing, 4)
+    
+    def test_resume_failed(self):
+        """測試批次失敗後保留游標，可由指令或 API 繼續"""
+        original = property_schema._run_batch
+        calls = []
+        
+        def flaky(migration, batch_size):
+            calls.append(migration.last_pk)
+            if len(calls) == 2:
+                raise RuntimeError('connection lost')
+            return original(migration, batch_size)
+        
+        with override_settings(PROPERTY_MIGRATIONS={'BATCH_SIZE': 1, 'BACKGROUND': False}), \
+                mock.patch.object(property_schema, '_run_batch', flaky), \
+                self.assertLogs('device_management.property_schema', 'ERROR'):
+            self._patch(name='cores')
+        job = PropertyMigration.objects.get()
+        self.assertEqual((job.status, job.processed), ('failed', 1))
+        self.assertIn('connection lost', job.error)
+        self.assertEqual(self._properties()[:2], [{'cores': '8'}, {'cpu': '16'}])
+        
+        # 失敗的工作之後建立的工作需等待
+        with self.captureOnCommitCallbacks(execute=True):
+            PropertyDefinition.objects.filter(pk=self.definition.pk).get().save()
+            self.definition.refresh_from_db()
+            self.definition.default_value = 'n/a'
+            self.definition.save()
+        self.assertEqual(PropertyMigration.objects.latest('id').status, 'pending')
+        
+        response = self.client.post(f'/api/property-migrations/{job.pk}/resume/')
+        self.assertEqual(response.json()['status'], 'completed')
+        self.assertEqual(response.json()['processed'], 4)
+        self.assertEqual(self._properties(), [{'cores': '8'}, {'cores': '16'}, {'cores': 'many'}, {'cores': 'n/a'}])
+        self.assertFalse(PropertyMigration.objects.exclude(status='completed').exists())
+        self.assertEqual(self.client.post(f'/api/property-migrations/{job.pk}/resume/').status_code, 400)
+    
+    def test_command_resumes(self):
+        """測試 property_migrations 指令繼續失敗的工作"""
+        with mock.patch.object(property_schema, '_run_batch', side_effect=RuntimeError('boom')), \
+                self.assertLogs('device_management.property_schema', 'ERROR'):
+            self._patch(name='cores')
+        self.assertEqual(PropertyMigration.objects.get().status, 'failed')
+        output = io.StringIO()
+        call_command('property_migrations', 'list', stdout=output)
+        self.assertIn('失敗', output.getvalue())
+        call_command('property_migrations', 'run', '--batch-size', '2', stdout=output)
+        self.assertEqual(PropertyMigration.objects.get().status, 'completed')
+        self.assertEqual(self._properties()[0], {'cores': '8'})
+
+
+@override_settings(PROPERTY_MIGRATIONS={**settings.PROPERTY_MIGRATIONS, 'BACKGROUND': False})
+class PromotedPropertyTestCase(TestCase):
+    """測試提升屬性的型態化欄位同步與列表篩選、排序"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='root', password='pw')
+        self.client.force_login(self.admin)
+        self.category = DeviceCategory.objects.create(name='筆電')
+        self.ram = PropertyDefinition.objects.create(category=self.category, name='ram', field_type='number')
+        for index, ram in enumerate([8, 16, '32', 'unknown', None]):
+            Device.objects.create(
+                serial_number=f'NB-{index}', name=f'筆電 {index}', category=self.category,
+                custom_properties={} if ram is None else {'ram': ram}
+            )
+    
+    def _promote(self, definition, promoted=True):
+        definition.is_promoted = promoted
+        with self.captureOnCommitCallbacks(execute=True):
+            definition.save()
+    
+    def _serials(self, query):
+        response = self.client.get(f'/api/devices/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['serial_number'] for row in response.json()['results']]
+    
+    def test_promote_backfills_and_syncs(self):
+        """測試設為提升時回填既有裝置，裝置儲存時同步"""
+        self._promote(self.ram)
+        values = dict(PromotedPropertyValue.objects.values_list('device__serial_number', 'number_value'))
+        self.assertEqual(values, {'NB-0': 8.0, 'NB-1': 16.0, 'NB-2': 32.0})
+        
+        device = Device.objects.get(serial_number='NB-3')
+        device.custom_properties = {'ram': 64}
+        device.save()
+        self.assertEqual(PromotedPropertyValue.objects.get(device=device).number_value, 64.0)
+        
+        # 移到其他類別時清除原類別的值
+        device.category = DeviceCategory.objects.create(name='桌機')
+        device.save()
+        self.assertFalse(PromotedPropertyValue.objects.filter(device=device).exists())
+        
+        self._promote(self.ram, promoted=False)
+        self.assertFalse(PromotedPropertyValue.objects.exists())
+    
+    def test_filter_and_ordering(self):
+        """測試提升前後的篩選與排序結果相同，提升後以型態化欄位查詢"""
+        # JSON 查詢不會轉換型態，比較時使用符合型態的值
+        Device.objects.filter(serial_number='NB-2').update(custom_properties={'ram': 32})
+        Device.objects.filter(serial_number='NB-3').update(custom_properties={})
+        queries = ['prop.ram__gte=16', 'prop.ram=8', 'prop.ram__in=8,32', 'ordering=-prop.ram']
+        before = [self._serials(query) for query in queries]
+        self.assertEqual(sorted(before[0]), ['NB-1', 'NB-2'])
+        self.assertEqual(before[1], ['NB-0'])
+        self.assertEqual(sorted(before[2]), ['NB-0', 'NB-2'])
+        
+        self._promote(self.ram)
+        with CaptureQueriesContext(connection) as captured:
+            after = [self._serials(query) for query in queries]
+        self.assertEqual([sorted(serials) for serials in after[:3]], [sorted(serials) for serials in before[:3]])
+        self.assertEqual(after[3][:3], ['NB-2', 'NB-1', 'NB-0'])
+        listing = [query['sql'] for query in captured.captured_queries if 'serial_number' in query['sql']]
+        self.assertTrue(listing)
+        self.assertTrue(all(PromotedPropertyValue._meta.db_table in sql for sql in listing))
+        
+        response = self.client.get('/api/devices/?prop.ram__gte=many')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('prop.ram__gte', response.json())
+
+
+class PropertyValidationTestCase(TestCase):
+    """測試動態屬性驗證一次回報所有錯誤，並支援批次驗證"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='root', password='pw')
+        self.client.force_login(self.admin)
+        self.printer = DeviceCategory.objects.create(name='印表機')
+        self.laptop = DeviceCategory.objects.create(name='筆電')
+        PropertyDefinition.objects.create(category=self.printer, name='彩色', field_type='boolean', is_required=True)
+        PropertyDefinition.objects.create(
+            category=self.printer, name='墨水', field_type='choice', choices=['黑色', '彩色']
+        )
+        PropertyDefinition.objects.create(category=self.laptop, name='ram', field_type='number', is_required=True)
+        PropertyDefinition.objects.create(category=self.laptop, name='保固', field_type='date')
+    
+    def test_collects_all_errors(self):
+        """測試同一台裝置的所有錯誤一次回報"""
+        validator = property_validation.PropertyValidator()
+        errors = validator.validate(self.laptop.pk, {'保固': 'soon', 'extra': 1})
+        self.assertEqual(set(errors), {'ram', '保固'})
+        self.assertEqual(validator.validate(self.laptop.pk, {'ram': '16', '保固': '2030-01-01'}), {})
+        self.assertIn(property_validation.NON_PROPERTY_KEY, validator.validate(self.laptop.pk, ['ram']))
+    
+    def test_validate_many_shares_lookups(self):
+        """測試批次驗證以一次查詢載入所有類別的定義"""
+        items = [
+            (self.printer.pk, {'彩色': True, '墨水': '黑色'}),
+            (self.printer.pk, {'墨水': '紅色'}),
+            (self.laptop.pk, {'ram': 'lots'}),
+        ] * 50
+        validator = property_validation.PropertyValidator()
+        with self.assertNumQueries(1):
+            results = validator.validate_many(items)
+        self.assertEqual(results[0], {})
+        self.assertEqual(set(results[1]), {'彩色', '墨水'})
+        self.assertEqual(set(results[2]), {'ram'})
+    
+    def test_serializer_and_form_report_all_errors(self):
+        """測試 API 與表單列出所有錯誤"""
+        response = self.client.post('/api/devices/', {
+            'serial_number': 'NB-1', 'name': '筆電', 'category': self.laptop.pk,
+            'custom_properties': {'保固': 'soon'},
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['custom_properties']), {'ram', '保固'})
+        
+        form = DeviceForm(data={
+            'serial_number': 'PR-1', 'name': '印表機', 'category': self.printer.pk, 'status': 'active',
+            'custom_properties': json.dumps({'墨水': '紅色'}), 'depreciation_method': 'straight_line',
+        })
+        self.assertFalse(form.is_valid())
+        self.assertEqual(len(form.errors['custom_properties']), 2)
+    
+    def test_import_devices(self):
+        """測試匯入先驗證全部資料列，有錯誤時不寫入任何裝置"""
+        rows = [
+            {'serial_number': 'NB-1', 'name': '筆電 1', 'category': '筆電', 'custom_properties': {'ram': 16}},
+            {'serial_number': 'NB-1', 'name': '筆電 2', 'category': self.laptop.pk, 'custom_properties': {}},
+            {'serial_number': 'PR-1', 'name': '印表機', 'category': '掃描器', 'cost': 'free'},
+        ]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'devices.jsonl')
+        with open(path, 'w', encoding='utf-8') as output:
+            output.writelines(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+        
+        errors = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command('import_devices', path, stderr=errors)
+        self.assertFalse(Device.objects.exists())
+        for message in ['序號已存在', '必填屬性 "ram" 未提供', '指定的裝置類別不存在', 'cost']:
+            self.assertIn(message, errors.getvalue())
+        
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(rows[:1] + [{**rows[1], 'serial_number': 'NB-2', 'custom_properties': {'ram': 8}}], output)
+        call_command('import_devices', path, stdout=io.StringIO())
+        self.assertEqual(Device.objects.filter(category=self.laptop).count(), 2)
+        self.assertEqual(AuditLog.objects.filter(model_name='Device', action='create').count(), 2)
+
+
+class HostsTestCase(TestCase):
+    """測試主機列表的網段歸屬、篩選、排序與複合鍵游標分頁"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='root', password='pw')
+        self.user = User.objects.create_user(username='staff', password='pw')
+        self.client.force_login(self.admin)
+        self.category = DeviceCategory.objects.create(name='伺服器')
+        self.office = Subnet.objects.create(name='辦公室', cidr='10.0.0.0/16')
+        self.servers = Subnet.objects.create(name='機房', cidr='10.0.1.0/24')
+    
+    def create_host(self, index, ip_address, status='active', service_type='Web', **kwargs):
+        device = Device.objects.create(
+            serial_number=f'SRV-{index}', name=f'srv-{index:03d}', category=self.category,
+            status=status, service_type=service_type, custom_properties={'os': 'Ubuntu 22.04'}, **kwargs
+        )
+        return IPRecord.objects.create(device=device, ip_address=ip_address, mac_address=f'AA:BB:CC:DD:EE:{index:02X}')
+    
+    def test_subnet_assignment(self):
+        """測試 IP 記錄歸屬於最小網段，網段新增與刪除時重新歸屬"""
+        record = self.create_host(1, '10.0.1.5')
+        other = self.create_host(2, '10.0.2.5')
+        outside = self.create_host(3, '192.168.0.5')
+        self.assertEqual(record.subnet, self.servers)
+        self.assertEqual(other.subnet, self.office)
+        self.assertIsNone(outside.subnet)
+        
+        self.servers.delete()
+        record.refresh_from_db()
+        self.assertEqual(record.subnet, self.office)
+        lab = Subnet.objects.create(name='實驗室', cidr='192.168.0.0/24')
+        outside.refresh_from_db()
+        self.assertEqual(outside.subnet, lab)
+        self.assertEqual(hosts.assign_subnets(), 0)
+    
+    def test_host_shape_and_filters(self):
+        """測試主機欄位與篩選條件"""
+        self.create_host(1, '10.0.1.5', responsible_person=self.user)
+        self.create_host(2, '10.0.2.5', status='maintenance', service_type='Database')
+        inactive = self.create_host(3, '10.0.1.6')
+        inactive.is_active = False
+        inactive.save()
+        
+        response = self.client.get('/api/hosts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'next', 'results'})
+        first = response.json()['results'][0]
+        self.assertEqual(first['hostname'], 'srv-001')
+        self.assertEqual(first['ipAddress'], '10.0.1.5')
+        self.assertEqual(first['subnetId'], self.servers.pk)
+        self.assertEqual(first['subnetName'], '機房')
+        self.assertEqual(first['status'], 'online')
+        self.assertEqual(first['serviceType'], 'Web')
+        self.assertEqual(first['os'], 'Ubuntu 22.04')
+        self.assertIsNotNone(first['lastSeenAt'])
+        self.assertEqual(len(response.json()['results']), 2)
+        
+        def hostnames(query):
+            return [host['hostname'] for host in self.client.get(f'/api/hosts/?{query}').json()['results']]
+        
+        self.assertEqual(hostnames(f'subnet={self.office.pk}'), ['srv-002'])
+        self.assertEqual(hostnames('status=offline'), ['srv-002'])
+        self.assertEqual(hostnames('status=online,offline&service_type=Web'), ['srv-001'])
+        self.assertEqual(hostnames('search=10.0.2'), ['srv-002'])
+        self.assertEqual(hostnames('ordering=-hostname'), ['srv-002', 'srv-001'])
+        self.assertEqual(self.client.get('/api/hosts/?status=broken').status_code, 400)
+        self.assertEqual(self.client.get('/api/hosts/?ordering=owner').status_code, 400)
+        
+        self.client.force_login(self.user)
+        self.assertEqual(hostnames(''), ['srv-001'])
+    
+    def test_os_is_string_or_null(self):
+        """測試動態屬性中非字串的作業系統值轉為字串或 null"""
+        for index, value in enumerate([22.04, True, {'name': 'Ubuntu'}], start=1):
+            record = self.create_host(index, f'10.0.1.{index}')
+            Device.objects.filter(pk=record.device_id).update(custom_properties={'os': value})
+        
+        results = self.client.get('/api/hosts/?ordering=hostname').json()['results']
+        self.assertEqual([host['os'] for host in results], ['22.04', None, None])
+    
+    def test_keyset_pagination(self):
+        """測試依重複值多的欄位排序時，游標分頁不重複也不遺漏"""
+        for index in range(25):
+            self.create_host(index, f'10.0.1.{index + 10}', status=random.choice(['active', 'inactive']))
+        seen = []
+        url = '/api/hosts/?ordering=-status&page_size=7'
+        while url:
+            data = self.client.get(url).json()
+            seen.extend((host['status'], host['id']) for host in data['results'])
+            url = data['next']
+        expected = list(
+            hosts.host_queryset().order_by('-device__status', '-id').values_list('device__status', 'id')
+        )
+        self.assertEqual(seen, [(hosts.DEVICE_HOST_STATUS[status], pk) for status, pk in expected])
+        self.assertEqual(self.client.get('/api/hosts/?cursor=invalid').status_code, 404)
+    
+    def test_keyset_pagination_keeps_timestamp_precision(self):
+        """測試依最後回應時間排序時，游標保留微秒精度，雙向都能完整走訪所有頁"""
+        base = timezone.now().replace(microsecond=0)
+        for index in range(10):
+            record = self.create_host(index, f'10.0.1.{index + 10}')
+            # 同一毫秒內的不同時間
+            IPRecord.objects.filter(pk=record.pk).update(last_seen_at=base + timedelta(microseconds=index * 50))
+        for ordering in ('lastSeenAt', '-lastSeenAt'):
+            seen = []
+            url = f'/api/hosts/?ordering={ordering}&page_size=3'
+            while url:
+                data = self.client.get(url).json()
+                seen.extend(host['id'] for host in data['results'])
+                url = data['next']
+                self.assertLessEqual(len(seen), 10)
+            expected = list(
+                hosts.order_hosts(hosts.host_queryset(), ordering).values_list('id', flat=True)
+            )
+            self.assertEqual(seen, expected)
+    
+    def test_subnet_usage(self):
+        """測試網段列出使用中的主機數與可用位址數"""
+        self.create_host(1, '10.0.1.5')
+        self.create_host(2, '10.0.1.6')
+        response = self.client.get('/api/subnets/')
+        servers = next(subnet for subnet in response.json() if subnet['id'] == self.servers.pk)
+        self.assertEqual(servers['usedHosts'], 2)
+        self.assertEqual(servers['totalHosts'], 254)
+        response = self.client.post('/api/subnets/', {'name': '錯誤', 'cidr': '10.0.0/33'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TagsTestCase(TestCase):
+    """測試標籤的 EXISTS 篩選與批次標記"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='root', password='pw')
+        self.user = User.objects.create_user(username='staff', password='pw')
+        self.client.force_login(self.admin)
+        category = DeviceCategory.objects.create(name='伺服器')
+        self.devices = [
+            Device.objects.create(serial_number=f'SRV-{index}', name=f'srv-{index}', category=category)
+            for index in range(4)
+        ]
+        self.prod, self.web, self.db = [Tag.objects.create(name=name) for name in ('prod', 'web', 'db')]
+        DeviceTag.objects.bulk_create([
+            DeviceTag(device=self.devices[0], tag=self.prod),
+            DeviceTag(device=self.devices[0], tag=self.web),
+            DeviceTag(device=self.devices[1], tag=self.prod),
+            DeviceTag(device=self.devices[1], tag=self.db),
+            DeviceTag(device=self.devices[2], tag=self.web),
+        ])
+    
+    def names(self, query):
+        response = self.client.get(f'/api/devices/?{query}&ordering=name')
+        self.assertEqual(response.status_code, 200)
+        return [device['name'] for device in response.json()['results']]
+    
+    def test_any_and_all_filters(self):
+        """測試任一標籤（OR）與全部標籤（AND）篩選，且不會產生重複資料列"""
+        self.assertEqual(self.names(f'tags={self.prod.pk},{self.web.pk}'), ['srv-0', 'srv-1', 'srv-2'])
+        self.assertEqual(self.names(f'tags_all={self.prod.pk},{self.web.pk}'), ['srv-0'])
+        self.assertEqual(self.names(f'tags={self.web.pk},{self.db.pk}&tags_all={self.prod.pk}'), ['srv-0', 'srv-1'])
+        self.assertEqual(self.client.get('/api/devices/?tags=prod').status_code, 400)
+        
+        queryset = tags.filter_by_tags(Device.objects.all(), [self.prod.pk, self.web.pk], [self.prod.pk])
+        sql = str(queryset.query).upper()
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('JOIN', sql)
+    
+    def test_bulk_tags(self):
+        """測試批次標記只變更需要變更的裝置，並寫入操作日誌"""
+        devices = [device.pk for device in self.devices]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/devices/bulk_tags/', {
+                'devices': devices, 'add': [self.prod.pk], 'remove': [self.web.pk],
+            }, content_type='application/json')
+        self.assertEqual(response.json(), {'added': 2, 'removed': 2})
+        self.assertEqual(
+            set(DeviceTag.objects.filter(tag=self.prod).values_list('device_id', flat=True)), set(devices)
+        )
+        self.assertFalse(DeviceTag.objects.filter(tag=self.web).exists())
+        logs = AuditLog.objects.filter(model_name='Device', action='update')
+        self.assertEqual(logs.count(), 4)
+        self.assertIn({'tags': {'added': ['prod']}}, [log.changes for log in logs])
+        
+        response = self.client.post('/api/devices/bulk_tags/', {
+            'devices': devices, 'add': [self.prod.pk],
+        }, content_type='application/json')
+        self.assertEqual(response.json(), {'added': 0, 'removed': 0})
+        
+        detail = self.client.get(f'/api/devices/{self.devices[1].pk}/?expand=tags').json()
+        self.assertEqual([tag['name'] for tag in detail['tags']], ['db', 'prod'])
+    
+    def test_bulk_tags_requires_access(self):
+        """測試一般用戶只能標記自己負責的裝置"""
+        Device.objects.filter(pk=self.devices[3].pk).update(responsible_person=self.user)
+        self.client.force_login(self.user)
+        response = self.client.post('/api/devices/bulk_tags/', {
+            'devices': [self.devices[0].pk, self.devices[3].pk], 'add': [self.db.pk],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DeviceTag.objects.filter(device=self.devices[3]).exists())
+        response = self.client.post('/api/devices/bulk_tags/', {
+            'devices': [self.devices[3].pk], 'add': [self.db.pk],
+        }, content_type='application/json')
+        self.assertEqual(response.json(), {'added': 1, 'removed': 0})
+    
+    def test_host_tags(self):
+        """測試主機輸出裝置的標籤並可依標籤篩選"""
+        for index, device in enumerate(self.devices):
+            IPRecord.objects.create(device=device, ip_address=f'10.0.0.{index + 1}', mac_address='AA:BB:CC:DD:EE:FF')
+        response = self.client.get(f'/api/hosts/?tags_all={self.prod.pk},{self.web.pk}')
+        results = response.json()['results']
+        self.assertEqual([host['hostname'] for host in results], ['srv-0'])
+        self.assertEqual(
+            results[0]['tags'],
+            [{'id': self.prod.pk, 'label': 'prod', 'color': self.prod.color},
+             {'id': self.web.pk, 'label': 'web', 'color': self.web.color}]
+        )
+        with self.assertNumQueries(4):
+            # 工作階段、用戶、主機、標籤
+            hosts_data = self.client.get('/api/hosts/').json()['results']
+        self.assertEqual(len(hosts_data), 4)
+        self.assertEqual(hosts_data[3]['tags'], [])
+
+
+class HostMoveTestCase(TestCase):
+    """測試主機搬移的位址配置、停用與批次日誌"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='root', password='pw')
+        self.user = User.objects.create_user(username='staff', password='pw')
+        self.client.force_login(self.admin)
+        category = DeviceCategory.objects.create(name='伺服器')
+        self.source = Subnet.objects.create(name='辦公室', cidr='10.0.0.0/24')
+        self.target = Subnet.objects.create(name='機房', cidr='10.1.0.0/29')
+        # 目標網段中的較小網段，其位址不會配置給搬移的主機
+        Subnet.objects.create(name='管理', cidr='10.1.0.4/30')
+        IPRecord.objects.create(
+            device=Device.objects.create(serial_number='USED', name='used', category=category),
+            ip_address='10.1.0.1', mac_address='AA:BB:CC:DD:EE:00'
+        )
+        self.records = [
+            IPRecord.objects.create(
+                device=Device.objects.create(
+                    serial_number=f'SRV-{index}', name=f'srv-{index}', category=category,
+                    responsible_person=self.user if index == 0 else None
+                ),
+                ip_address=f'10.0.0.{index + 10}', mac_address=f'AA:BB:CC:DD:EE:{index + 1:02X}'
+            )
+            for index in range(3)
+        ]
+        for record in self.records:
+            record.add_to_history('IP 記錄建立', self.admin)
+    
+    def move(self, ids, subnet):
+        return self.client.post(
+            '/api/hosts/move/', {'hosts': ids, 'subnet': subnet.pk}, content_type='application/json'
+        )
+    
+    def test_move_allocates_free_addresses(self):
+        """測試搬移配置可用位址、停用原 IP 並附加歷史"""
+        ids = [record.pk for record in self.records[:2]]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.move(ids, self.target)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['moved'], 2)
+        self.assertEqual([host['ipAddress'] for host in data['hosts']], ['10.1.0.2', '10.1.0.3'])
+        self.assertTrue(all(host['subnetId'] == self.target.pk for host in data['hosts']))
+        self.assertEqual(set(data['replaced']), {str(pk) for pk in ids})
+        
+        old = IPRecord.objects.get(pk=ids[0])
+        self.assertFalse(old.is_active)
+        self.assertEqual(len(old.history), 2)
+        self.assertEqual(old.history[-1]['action'], '搬移至 機房，停用')
+        self.assertEqual(old.history[-1]['ip_address'], '10.0.0.10')
+        self.assertEqual(old.history[-1]['user'], 'root')
+        new = IPRecord.objects.get(pk=data['replaced'][str(ids[0])])
+        self.assertEqual((new.device_id, new.mac_address), (old.device_id, old.mac_address))
+        self.assertEqual(new.history[0]['action'], '由 10.0.0.10 搬移')
+        self.assertEqual(AuditLog.objects.filter(model_name='IPRecord', action='update').count(), 2)
+        self.assertEqual(AuditLog.objects.filter(model_name='IPRecord', action='create').count(), 2)
+        
+        # 已在目標網段的主機不會再次搬移
+        self.assertEqual(self.move([new.pk], self.target).json()['moved'], 0)
+    
+    def test_move_is_atomic_when_pool_is_exhausted(self):
+        """測試可用位址不足時不做任何變更"""
+        self.move([self.records[0].pk, self.records[1].pk], self.target)
+        response = self.move([self.records[2].pk], self.target)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('subnet', response.json())
+        self.assertTrue(IPRecord.objects.get(pk=self.records[2].pk).is_active)
+    
+    def test_move_requires_access(self):
+        """測試一般用戶只能搬移自己負責的主機"""
+        self.client.force_login(self.user)
+        response = self.move([self.records[0].pk, self.records[1].pk], self.target)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(IPRecord.objects.filter(is_active=True, subnet=self.target).count(), 1)
+        self.assertEqual(self.move([self.records[0].pk], self.target).json()['moved'], 1)
@@ -0,0 +1,141 @@
+"""
+API 流量限制
+
+以快取後端保存滑動視窗計數器（本視窗與前一個視窗的次數加權估算），
+每個請求只需一次 get_many 與一次 incr，超過額度時直接回應 429 與 Retry-After，不查詢資料庫。
+
+可透過 settings.API_THROTTLE 設定：
+- ENABLED：全域開關
+- CACHE：使用的快取別名（多個 worker 時應使用共用的快取，例如 Redis）
+- RATES：各額度的速率，例如 '600/min'；None 表示不限制
+- ADMIN_RATES：管理員使用的速率；未列出的額度不限制管理員
+"""
+
+import math
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import permissions
+from rest_framework.throttling import BaseThrottle
+
+from .permissions import is_admin
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    'RATES': {
+        'read': '1200/min',
+        'write': '300/min',
+        'statistics': '30/min',
+        'export': '10/min',
+        'bulk_import': '5/min',
+        'ping': '60/min',
+    },
+    'ADMIN_RATES': {},
+}
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'API_THROTTLE', {})}
+
+
+def parse_rate(rate):
+    """解析 '次數/期間'（期間可為 s、min、hour、day，或如 '10/5m' 的倍數）"""
+    if rate is None:
+        return None
+    match = re.fullmatch(r'(\d+)/(\d*)([smhd])[a-z]*', rate)
+    if match is None:
+        raise ImproperlyConfigured(f'無法解析的流量限制速率：{rate}')
+    num, multiplier, unit = match.groups()
+    return int(num), int(multiplier or 1) * DURATIONS[unit]
+
+
+class SlidingWindowCounter:
+    """以快取保存固定視窗的次數，依前一個視窗的剩餘比例加權估算滑動視窗內的請求數"""
+
+    def __init__(self, cache, num_requests, duration):
+        self.cache = cache
+        self.num_requests = num_requests
+        self.duration = duration
+
+    def hit(self, key, now=None):
+        """額度足夠時計入一次並回傳 None，否則回傳需要等待的秒數"""
+        now = time.time() if now is None else now
+        start = int(now // self.duration) * self.duration
+        current_key = f'{key}:{start}'
+        previous_key = f'{key}:{start - self.duration}'
+        counts = self.cache.get_many([current_key, previous_key])
+        current = counts.get(current_key, 0)
+        previous = counts.get(previous_key, 0)
+
+        elapsed = (now - start) / self.duration
+        if previous * (1 - elapsed) + current >= self.num_requests:
+            return self._wait(now, start, current, previous)
+
+        try:
+            self.cache.incr(current_key)
+        except ValueError:
+            # 計數器不存在（或剛過期）時建立；同時建立造成的少量誤差可接受
+            if not self.cache.add(current_key, 1, timeout=self.duration * 2):
+                self.cache.incr(current_key)
+        return None
+
+    def _wait(self, now, start, current, previous):
+        """估算要等到滑動視窗內的請求數低於額度的秒數"""
+        if current < self.num_requests and previous:
+            # 前一個視窗的權重隨時間遞減
+            until = start + self.duration * (1 - (self.num_requests - current) / previous)
+        else:
+            until = start + self.duration
+        return max(1, math.ceil(until - now))
+
+
+class ScopedSlidingWindowThrottle(BaseThrottle):
+    """
+    依額度分別計數的流量限制
+
+    ViewSet 以 throttle_scopes 將昂貴的動作對應到獨立額度（例如 statistics），
+    其餘讀取使用 read、寫入使用 write；每個用戶（未登入時為來源 IP）各自計數
+    """
+    scope_attr = 'throttle_scopes'
+
+    def get_scope(self, request, view):
+        scopes = getattr(view, self.scope_attr, {})
+        scope = scopes.get(getattr(view, 'action', None))
+        if scope:
+            return scope
+        return 'read' if request.method in permissions.SAFE_METHODS else 'write'
+
+    def allow_request(self, request, view):
+        self.wait_seconds = check_throttle(request, self.get_scope(request, view), self)
+        return self.wait_seconds is None
+
+    def wait(self):
+        return self.wait_seconds
+
+
+def check_throttle(request, scope, throttle=None):
+    """檢查並計入一次請求；超過額度時回傳需要等待的秒數"""
+    config = get_config()
+    if not config['ENABLED']:
+        return None
+    user = request.user
+    if is_admin(user):
+        rate = config['ADMIN_RATES'].get(scope)
+    else:
+        rate = config['RATES'].get(scope)
+    parsed = parse_rate(rate)
+    if parsed is None:
+        return None
+
+    if user and user.is_authenticated:
+        ident = f'user:{user.pk}'
+    else:
+        ident = f'ip:{(throttle or BaseThrottle()).get_ident(request)}'
+    counter = SlidingWindowCounter(caches[config['CACHE']], *parsed)
+    return counter.hit(f'throttle:{scope}:{ident}')
@@ -3,21 +3,46 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     DeviceCategoryViewSet,
     PropertyDefinitionViewSet,
+    PropertyMigrationViewSet,
     DeviceViewSet,
     IPRecordViewSet,
-    AuditLogViewSet
+    AuditLogViewSet,
+    SubnetViewSet,
+    TagViewSet,
+    HostViewSet
 )
+from . import async_views
 
 # 建立路由器
 router = DefaultRouter()
 router.register(r'categories', DeviceCategoryViewSet, basename='devicecategory')
 router.register(r'properties', PropertyDefinitionViewSet, basename='propertydefinition')
+router.register(r'property-migrations', PropertyMigrationViewSet, basename='propertymigration')
 router.register(r'devices', DeviceViewSet, basename='device')
 router.register(r'ip-records', IPRecordViewSet, basename='iprecord')
 router.register(r'audit-logs', AuditLogViewSet, basename='auditlog')
+router.register(r'subnets', SubnetViewSet, basename='subnet')
+router.register(r'tags', TagViewSet, basename='tag')
+router.register(r'hosts', HostViewSet, basename='host')
 
 app_name = 'device_management'
 
+# 非同步唯讀端點（ASGI 部署時使用）
+async_urlpatterns = [
+    path('devices/', async_views.device_list, name='async-device-list'),
+    path('devices/search_by_ip/', async_views.search_by_ip, name='async-device-search-by-ip'),
+    path('devices/<int:pk>/', async_views.device_detail, name='async-device-detail'),
+    path(
+        'ip-records/check_ip_available/',
+        async_views.check_ip_available,
+        name='async-iprecord-check-ip-available'
+    ),
+    path('dashboard/overview/', async_views.dashboard_overview, name='async-dashboard-overview'),
+]
+
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
+    # 即時事件串流（需以 ASGI 部署，見 icap_project/asgi.py）
+    path('events/stream/', async_views.event_stream, name='event-stream'),
     path('', include(router.urls)),
 ]
@@ -0,0 +1,313 @@
+"""
+資產估值
+
+依折舊方法計算裝置在指定日期的帳面價值：
+- straight_line（直線法）：每年折舊成本的 depreciation_rate%
+- declining_balance（定率遞減法）：每年折舊剩餘價值的 depreciation_rate%
+- schedule（折舊表）：depreciation_schedule 依序列出每一年折舊成本的百分比
+
+年度內依天數比例計算（一年 365.25 天），價值不低於殘值（salvage_value，預設 0），
+結果以 ROUND_HALF_UP 取到分。
+
+批次計算時安裝 NumPy 則以向量運算處理，否則逐筆以 Decimal 計算。
+向量運算以浮點數計算後取整，距離進位邊界過近（浮點誤差可能影響結果）的資料列
+改以 Decimal 重新計算，因此兩種實作的結果完全相同。
+"""
+
+import json
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal, localcontext
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import FloatField, TextField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+STRAIGHT_LINE = 'straight_line'
+DECLINING_BALANCE = 'declining_balance'
+SCHEDULE = 'schedule'
+METHOD_CHOICES = [
+    (STRAIGHT_LINE, '直線法'),
+    (DECLINING_BALANCE, '定率遞減法'),
+    (SCHEDULE, '折舊表'),
+]
+
+# 批次計算需要的裝置欄位（依此順序傳入 compute_cents）
+FIELDS = (
+    'cost', 'depreciation_rate', 'purchase_date',
+    'depreciation_method', 'salvage_value', 'depreciation_schedule',
+)
+
+# 少量資料時向量化的額外成本高於逐筆計算
+NUMPY_MIN_ROWS = 256
+
+DAYS_PER_YEAR = Decimal('365.25')
+CENT = Decimal('0.01')
+HUNDRED = Decimal(100)
+
+
+def validate_schedule(value):
+    """折舊表必須是非負數的列表，且總和不超過 100"""
+    if value is None:
+        return
+    if not isinstance(value, list) or not all(
+        isinstance(rate, (int, float)) and not isinstance(rate, bool) and rate >= 0 for rate in value
+    ):
+        raise ValidationError('折舊表必須是非負數的列表')
+    if sum(value) > 100:
+        raise ValidationError('折舊表的百分比總和不能超過 100')
+
+
+def _days(purchase_date, as_of):
+    return max((as_of - purchase_date).days, 0)
+
+
+def _schedule_percent(schedule, years):
+    """折舊表在 years 年時累計折舊的百分比"""
+    full = int(years)
+    percent = sum((Decimal(str(rate)) for rate in schedule[:full]), Decimal(0))
+    if full < len(schedule):
+        percent += Decimal(str(schedule[full])) * (years - full)
+    return percent
+
+
+def _value_cents(cost, rate, purchase_date, method, salvage, schedule, as_of):
+    """以 Decimal 計算單一裝置的價值（分），無法計算時回傳 None"""
+    if cost is None or purchase_date is None:
+        return None
+    method = method or STRAIGHT_LINE
+    if method == SCHEDULE and not schedule:
+        return None
+    if method != SCHEDULE and rate is None:
+        return None
+
+    with localcontext() as context:
+        context.prec = 28
+        cost = Decimal(cost)
+        days = _days(purchase_date, as_of)
+        if days == 0:
+            value = cost
+        else:
+            years = Decimal(days) / DAYS_PER_YEAR
+            if method == DECLINING_BALANCE:
+                value = cost * (1 - Decimal(rate) / HUNDRED) ** years
+            elif method == SCHEDULE:
+                value = cost - cost * _schedule_percent(schedule, years) / HUNDRED
+            else:
+                value = cost - cost * Decimal(rate) / HUNDRED * years
+        value = max(value, Decimal(salvage or 0))
+        return int((value * HUNDRED).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def _compute_python(rows, as_of):
+    return [_value_cents(*row, as_of) for row in rows]
+
+
+def _vectorized(cost, rate, purchase_dates, methods, salvage, schedules, as_of):
+    """
+    以 NumPy 向量運算計算價值（分）
+
+    各參數為欄位序列（金額可為 Decimal 或浮點數，schedules 可為列表或 JSON 字串）；
+    回傳 (分, 可計算, 需要以 Decimal 重新計算) 三個陣列
+    """
+    cost = numpy.array(cost, dtype=float)
+    rate = numpy.array(rate, dtype=float)
+    salvage = numpy.nan_to_num(numpy.array(salvage, dtype=float))
+    # 以序數日計算天數（比轉換為 datetime64 快得多）；0 表示沒有購買日期
+    purchased = numpy.array([0 if day is None else day.toordinal() for day in purchase_dates])
+    missing_date = purchased == 0
+    days = numpy.where(missing_date, 0.0, numpy.maximum(as_of.toordinal() - purchased, 0).astype(float))
+    methods = numpy.array([method or STRAIGHT_LINE for method in methods])
+    declining = methods == DECLINING_BALANCE
+    scheduled = methods == SCHEDULE
+
+    # 相同折舊表的裝置一起計算
+    groups = defaultdict(list)
+    parsed = {}
+    for index in numpy.flatnonzero(scheduled).tolist():
+        schedule = schedules[index]
+        if not schedule:
+            continue
+        key = schedule if isinstance(schedule, str) else tuple(schedule)
+        if key not in parsed:
+            parsed[key] = json.loads(key) if isinstance(key, str) else list(key)
+        if parsed[key]:
+            groups[key].append(index)
+
+    has_schedule = numpy.zeros(len(cost), dtype=bool)
+    years = days / 365.25
+    with numpy.errstate(invalid='ignore'):
+        value = numpy.where(
+            declining,
+            cost * (1 - rate / 100) ** years,
+            cost - cost * rate / 100 * years,
+        )
+    for key, indexes in groups.items():
+        rates = numpy.array(parsed[key], dtype=float)
+        cumulative = numpy.concatenate(([0.0], numpy.cumsum(rates)))
+        indexes = numpy.array(indexes)
+        has_schedule[indexes] = True
+        group_years = years[indexes]
+        full = numpy.minimum(numpy.floor(group_years).astype(int), len(rates))
+        partial = numpy.where(
+            full < len(rates),
+            rates[numpy.minimum(full, len(rates) - 1)] * (group_years - full),
+            0.0,
+        )
+        value[indexes] = cost[indexes] - cost[indexes] * (cumulative[full] + partial) / 100
+    value = numpy.where(days == 0, cost, value)
+    value = numpy.maximum(value, salvage)
+
+    valid = ~numpy.isnan(cost) & ~missing_date & numpy.where(scheduled, has_schedule, ~numpy.isnan(rate))
+    cents = numpy.where(valid, value * 100, 0.0)
+    rounded = numpy.floor(cents + 0.5)
+    fraction = cents - numpy.floor(cents)
+    ambiguous = valid & (numpy.abs(fraction - 0.5) < 1e-7 + numpy.abs(cents) * 1e-13)
+    return rounded, valid, ambiguous
+
+
+def _compute_numpy(rows, as_of):
+    """向量化計算；進位邊界附近的資料列以 Decimal 重新計算"""
+    rounded, valid, ambiguous = _vectorized(*zip(*rows), as_of)
+    results = [int(c) if ok else None for c, ok in zip(rounded.tolist(), valid.tolist())]
+    for index in numpy.flatnonzero(ambiguous).tolist():
+        results[index] = _value_cents(*rows[index], as_of)
+    return results
+
+
+def compute_cents(rows, as_of=None):
+    """
+    批次計算價值（分）
+
+    rows 為依 FIELDS 順序的資料列，回傳與 rows 對應的整數（分）或 None
+    """
+    as_of = as_of or timezone.localdate()
+    rows = rows if isinstance(rows, list) else list(rows)
+    if numpy is not None and len(rows) >= NUMPY_MIN_ROWS:
+        return _compute_numpy(rows, as_of)
+    return _compute_python(rows, as_of)
+
+
+def to_decimal(cents):
+    return None if cents is None else (Decimal(cents) * CENT).quantize(CENT)
+
+
+def value_as_of(device, as_of=None):
+    """單一裝置在指定日期的價值"""
+    row = tuple(getattr(device, name) for name in FIELDS)
+    return to_decimal(_value_cents(*row, as_of or timezone.localdate()))
+
+
+def _queryset_cents(queryset, as_of, extra=()):
+    """
+    計算查詢集中每個裝置的價值，回傳 (主鍵, 價值（分）, 成本（分）, 額外欄位) 四個列表
+
+    安裝 NumPy 時金額以浮點數查詢（略過逐筆建立 Decimal 的成本），
+    只有需要以 Decimal 重新計算的少數資料列才再次查詢原始值
+    """
+    queryset = queryset.order_by()
+    if numpy is None:
+        rows = list(queryset.values_list('pk', *FIELDS, *extra))
+        cents = _compute_python([row[1:len(FIELDS) + 1] for row in rows], as_of)
+        costs = [None if row[1] is None else int(row[1] * 100) for row in rows]
+        return [row[0] for row in rows], cents, costs, [row[len(FIELDS) + 1:] for row in rows]
+
+    # 直接以游標讀取，略過 Django 逐筆套用的欄位轉換（大量資料時是主要成本）；
+    # 運算式欄位在 SQL 中排在一般欄位之後，因此依欄位名稱取出
+    casts = {
+        'valuation_cost': Cast('cost', FloatField()),
+        'valuation_rate': Cast('depreciation_rate', FloatField()),
+        'valuation_salvage': Cast('salvage_value', FloatField()),
+        'valuation_schedule': Cast('depreciation_schedule', TextField()),
+    }
+    sql, params = (
+        queryset.annotate(**casts)
+        .values_list('pk', 'purchase_date', 'depreciation_method', *extra, *casts)
+        .query.sql_with_params()
+    )
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        names = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+    if not rows:
+        return [], [], [], []
+    raw = list(zip(*rows))
+    extra_columns = raw[3:3 + len(extra)]
+    column = {name: raw[names.index(name)] for name in casts}
+    columns = [
+        raw[0],
+        column['valuation_cost'],
+        column['valuation_rate'],
+        raw[1],
+        raw[2],
+        column['valuation_salvage'],
+        column['valuation_schedule'],
+    ]
+    pks = list(columns[0])
+    rounded, valid, ambiguous = _vectorized(*columns[1:len(FIELDS) + 1], as_of)
+    cents = [int(c) if ok else None for c, ok in zip(rounded.tolist(), valid.tolist())]
+
+    positions = numpy.flatnonzero(ambiguous).tolist()
+    if positions:
+        exact = dict(
+            (row[0], row[1:]) for row in
+            queryset.model._default_manager.filter(pk__in=[pks[i] for i in positions])
+            .values_list('pk', *FIELDS)
+        )
+        for index in positions:
+            cents[index] = _value_cents(*exact[pks[index]], as_of)
+
+    # 成本最多兩位小數，乘以 100 後四捨五入即為精確的分
+    costs = numpy.rint(numpy.array(columns[1], dtype=float) * 100).tolist()
+    costs = [None if cost is None else int(c) for cost, c in zip(columns[1], costs)]
+    return pks, cents, costs, list(zip(*extra_columns)) or [()] * len(rows)
+
+
+def value_map(queryset, as_of=None):
+    """查詢集中每個裝置的價值 {pk: Decimal}"""
+    pks, cents, _, _ = _queryset_cents(queryset, as_of or timezone.localdate())
+    return {pk: to_decimal(value) for pk, value in zip(pks, cents)}
+
+
+def valuation_report(queryset, as_of=None, group_by=None):
+    """
+    彙總查詢集的成本與價值
+
+    group_by 為裝置欄位（例如 category__name），金額以整數（分）加總後再轉為 Decimal
+    """
+    as_of = as_of or timezone.localdate()
+    _, cents, costs, extra = _queryset_cents(queryset, as_of, (group_by,) if group_by else ())
+
+    totals = defaultdict(lambda: [0, 0, 0, 0])
+    for value, cost, columns in zip(cents, costs, extra):
+        group = totals[columns[0] if group_by else None]
+        group[0] += 1
+        if value is None:
+            continue
+        group[1] += 1
+        group[2] += cost
+        group[3] += value
+
+    def summary(count, valued, cost, value):
+        return {
+            'device_count': count,
+            'valued_count': valued,
+            'total_cost': to_decimal(cost),
+            'total_value': to_decimal(value),
+            'total_depreciation': to_decimal(cost - value),
+        }
+
+    overall = [sum(group[i] for group in totals.values()) for i in range(4)]
+    report = {'as_of': as_of, **summary(*overall)}
+    if group_by:
+        report['groups'] = [
+            {'key': key, **summary(*group)}
+            for key, group in sorted(totals.items(), key=lambda item: (item[0] is None, str(item[0])))
+        ]
+    return report
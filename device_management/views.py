@@ -1,30 +1,60 @@
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Q, Count, Sum
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from .models import (
     DeviceCategory,
     PropertyDefinition,
     Device,
     IPRecord,
-    AuditLog
+    AuditLog,
+    PropertyMigration,
+    Subnet,
+    Tag
 )
 from .serializers import (
     DeviceCategorySerializer,
     PropertyDefinitionSerializer,
     DeviceSerializer,
     DeviceListSerializer,
+    DeviceExpirySerializer,
+    RowMapper,
     IPRecordSerializer,
     AuditLogSerializer,
-    DeviceStatisticsSerializer
+    DeviceStatisticsSerializer,
+    PropertyMigrationSerializer,
+    ValuationReportSerializer,
+    HostMoveSerializer,
+    HostSerializer,
+    SubnetSerializer,
+    TagAssignmentSerializer,
+    TagSerializer
+)
+from .permissions import IsAdminOrReadOnly, IsOwnerOrAdmin, get_row_policy, is_admin
+from .promoted_properties import PropertyFilterBackend, PropertyOrderingFilter
+from .tags import TagFilterBackend
+from .pagination import KeysetPagination
+from . import audit_archive, expiry, hosts, property_schema, tags, valuation
+from .mixins import (
+    AccessAuditMixin,
+    ChangeFeedMixin,
+    ConditionalRequestMixin,
+    FastListMixin,
+    HistoryMixin,
+    RowPermissionMixin,
+    TimeWindowMixin
 )
-from .permissions import IsAdminOrReadOnly, IsOwnerOrAdmin
 
 
-class DeviceCategoryViewSet(viewsets.ModelViewSet):
+class DeviceCategoryViewSet(ConditionalRequestMixin, HistoryMixin, viewsets.ModelViewSet):
     """裝置類別的 ViewSet"""
     queryset = DeviceCategory.objects.prefetch_related('property_definitions')
     serializer_class = DeviceCategorySerializer
@@ -34,6 +64,10 @@ class DeviceCategoryViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at', 'updated_at']
     ordering = ['name']
     
+    def get_conditional_related(self):
+        """類別回應包含裝置數量，裝置新增、刪除或移動時都需要更新版本"""
+        return ['devices']
+    
     def perform_create(self, serializer):
         """建立類別時記錄日誌"""
         instance = serializer.save()
@@ -71,26 +105,50 @@ class DeviceCategoryViewSet(viewsets.ModelViewSet):
         return ip
 
 
-class PropertyDefinitionViewSet(viewsets.ModelViewSet):
+class PropertyDefinitionViewSet(HistoryMixin, viewsets.ModelViewSet):
     """屬性定義的 ViewSet"""
     queryset = PropertyDefinition.objects.select_related('category')
     serializer_class = PropertyDefinitionSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['category', 'field_type', 'is_required']
+    filterset_fields = ['category', 'field_type', 'is_required', 'is_promoted']
     ordering_fields = ['order', 'name', 'category']
     ordering = ['category', 'order', 'name']
     
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        return self._with_schema_migration(response)
+    
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        return self._with_schema_migration(response)
+    
+    def _with_schema_migration(self, response):
+        """定義變更需要改寫裝置資料時，回應附上結構演進工作（可由 /api/property-migrations/{id}/ 查詢進度）"""
+        migration = getattr(self._saved_instance, 'schema_migration', None)
+        if migration is not None:
+            migration.refresh_from_db()
+            response.data['schema_migration'] = PropertyMigrationSerializer(migration).data
+        return response
+    
     def perform_create(self, serializer):
         """建立屬性定義時記錄日誌"""
         instance = serializer.save()
+        self._record_migration_owner(instance)
         self._log_action('create', instance)
     
     def perform_update(self, serializer):
         """更新屬性定義時記錄日誌"""
         instance = serializer.save()
+        self._record_migration_owner(instance)
         self._log_action('update', instance)
     
+    def _record_migration_owner(self, instance):
+        self._saved_instance = instance
+        migration = getattr(instance, 'schema_migration', None)
+        if migration is not None:
+            PropertyMigration.objects.filter(pk=migration.pk).update(created_by=self.request.user)
+    
     def perform_destroy(self, instance):
         """刪除屬性定義時記錄日誌"""
         self._log_action('delete', instance)
@@ -118,19 +176,67 @@ class PropertyDefinitionViewSet(viewsets.ModelViewSet):
         return ip
 
 
-class DeviceViewSet(viewsets.ModelViewSet):
+class PropertyMigrationViewSet(viewsets.ReadOnlyModelViewSet):
+    """屬性結構演進工作（查詢進度；失敗的工作可由管理員從游標繼續）"""
+    queryset = PropertyMigration.objects.select_related('category')
+    serializer_class = PropertyMigrationSerializer
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['category', 'definition', 'status']
+    ordering = ['-created_at']
+    
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        """從游標繼續執行失敗的工作，之後接續同一類別的待執行工作"""
+        migration = self.get_object()
+        if migration.status != 'failed':
+            raise ValidationError({'status': ['只有失敗的工作可以繼續執行']})
+        PropertyMigration.objects.filter(pk=migration.pk).update(status='pending')
+        property_schema.start(migration.category_id)
+        migration.refresh_from_db()
+        return Response(self.get_serializer(migration).data)
+
+
+class DeviceViewSet(
+    RowPermissionMixin,
+    AccessAuditMixin,
+    ConditionalRequestMixin,
+    ChangeFeedMixin,
+    FastListMixin,
+    HistoryMixin,
+    viewsets.ModelViewSet
+):
     """裝置的 ViewSet，支援動態屬性和權限控制"""
     queryset = Device.objects.select_related(
         'category',
         'responsible_person',
         'created_by'
-    ).prefetch_related('ip_records')
-    permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    )
+    permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
+    # ?prop.<名稱>= 篩選與 ?ordering=prop.<名稱> 排序動態屬性（提升的屬性使用型態化索引欄位），
+    # ?tags= / ?tags_all= 以 EXISTS 子查詢篩選標籤
+    filter_backends = [
+        DjangoFilterBackend, PropertyFilterBackend, TagFilterBackend, filters.SearchFilter, PropertyOrderingFilter
+    ]
     filterset_fields = ['category', 'status', 'department', 'location', 'responsible_person']
     search_fields = ['serial_number', 'name', 'department', 'location', 'supplier']
     ordering_fields = ['created_at', 'updated_at', 'name', 'purchase_date', 'cost']
     ordering = ['-created_at']
+    # 列表使用快速路徑輸出（只查詢需要的欄位，略過 ModelSerializer 的逐欄處理）
+    list_fast_path = True
+    list_row_mapper = RowMapper(DeviceListSerializer)
+    expiring_row_mapper = RowMapper(DeviceExpirySerializer)
+    # 讀取稽核：列表、詳情與 IP 搜尋回傳的裝置皆記錄讀取次數
+    access_audit_actions = ('list', 'retrieve', 'search_by_ip')
+    # 統計需要彙總整個查詢集，使用獨立的流量額度
+    throttle_scopes = {'statistics': 'statistics', 'valuation_report': 'statistics'}
+    # 估值報表可用的分組（?group_by= 對應的裝置欄位）
+    valuation_group_fields = {
+        'category': 'category__name',
+        'department': 'department',
+        'status': 'status',
+        'method': 'depreciation_method',
+    }
     
     def get_serializer_class(self):
         """根據動作選擇序列化器"""
@@ -138,17 +244,121 @@ class DeviceViewSet(viewsets.ModelViewSet):
             return DeviceListSerializer
         return DeviceSerializer
     
+    def get_sparse_params(self):
+        """解析 ?fields= 與 ?expand= 參數，並檢查欄位名稱"""
+        params = self.request.query_params
+        fields = {name.strip() for name in params.get('fields', '').split(',') if name.strip()}
+        expand = {name.strip() for name in params.get('expand', '').split(',') if name.strip()}
+        
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'get_available_fields'):
+            available = serializer_class.get_available_fields()
+            expandable = set(serializer_class.expandable_fields)
+        else:
+            available = set(serializer_class().fields)
+            expandable = set()
+        
+        errors = {}
+        if fields - available:
+            errors['fields'] = [f'未知的欄位：{", ".join(sorted(fields - available))}']
+        if expand - expandable:
+            errors['expand'] = [f'無法展開的欄位：{", ".join(sorted(expand - expandable))}']
+        if errors:
+            raise ValidationError(errors)
+        return fields or None, expand
+    
+    def get_serializer(self, *args, **kwargs):
+        """
+        讀取時依 ?fields= / ?expand= 建立稀疏欄位的序列化器
+
+        多筆輸出（IP 搜尋、變更摘要）的 current_value 以 valuation.value_map 一次計算
+        """
+        if self.request.method in permissions.SAFE_METHODS and self.action != 'list':
+            serializer_class = self.get_serializer_class()
+            if hasattr(serializer_class, 'get_query_plan'):
+                kwargs['fields'], kwargs['expand'] = self.get_sparse_params()
+                fields = kwargs['fields']
+                if args and kwargs.get('many') and (fields is None or 'current_value' in fields):
+                    kwargs['context'] = {
+                        **self.get_serializer_context(),
+                        'valuations': self.get_valuations(args[0]),
+                    }
+        return super().get_serializer(*args, **kwargs)
+    
+    def get_valuations(self, devices):
+        """以一次查詢計算多筆裝置在 ?as_of= 當天的價值 {pk: Decimal}"""
+        pks = [device.pk for device in devices]
+        if not pks:
+            return {}
+        return valuation.value_map(Device.objects.filter(pk__in=pks), self.get_as_of())
+    
+    def get_as_of(self):
+        """解析 ?as_of= 估值日期，未指定時為今天"""
+        value = self.request.query_params.get('as_of')
+        if not value:
+            return timezone.localdate()
+        try:
+            as_of = parse_date(value)
+        except ValueError:
+            as_of = None
+        if as_of is None:
+            raise ValidationError({'as_of': ['日期格式錯誤，請使用 YYYY-MM-DD']})
+        return as_of
+    
+    def get_conditional_date(self):
+        """未指定 ?as_of= 時 current_value 以今天計算，今天的日期納入詳情的 ETag"""
+        if 'as_of' in self.request.query_params:
+            return None
+        return timezone.localdate()
+    
+    def get_serializer_context(self):
+        """詳情的 current_value 依 ?as_of= 計算"""
+        context = super().get_serializer_context()
+        if self.request is not None and self.request.method in permissions.SAFE_METHODS:
+            context['as_of'] = self.get_as_of()
+        return context
+    
+    def get_list_row_mapper(self):
+        """列表快速路徑同樣支援 ?fields="""
+        fields, _ = self.get_sparse_params()
+        return self.list_row_mapper.subset(fields) if fields else self.list_row_mapper
+    
+    def get_conditional_related(self):
+        """列表與詳情顯示類別名稱；展開時另外納入 IP 記錄的變更"""
+        related = ['category']
+        if self.action != 'list':
+            fields, expand = self.get_sparse_params()
+            if 'ip_records' in expand or (fields and 'ip_records' in fields):
+                related.append('ip_records')
+        return related
+    
     def get_queryset(self):
-        """根據用戶權限過濾查詢集"""
+        """依列級權限過濾查詢集（一般用戶只能查看自己負責的裝置）"""
         queryset = super().get_queryset()
-        user = self.request.user
-        
-        # 管理員可以查看所有裝置
-        if user.is_staff or user.is_superuser:
-            return queryset
         
-        # 一般用戶只能查看自己負責的裝置
-        return queryset.filter(responsible_person=user)
+        # 讀取詳情時只查詢所選欄位，並只在展開時預先載入 IP 記錄
+        if (
+            self.request.method in permissions.SAFE_METHODS
+            and self.action in ('retrieve', 'search_by_ip', 'changes')
+        ):
+            queryset = self._apply_query_plan(queryset)
+        return queryset
+    
+    def _apply_query_plan(self, queryset):
+        """依稀疏欄位集調整 only()、select_related() 與 prefetch_related()"""
+        fields, expand = self.get_sparse_params()
+        only_fields, select_related, prefetch_related = (
+            DeviceSerializer.get_query_plan(fields, expand)
+        )
+        if self.action == 'changes':
+            # 增量同步的游標需要更新時間
+            only_fields.add('updated_at')
+        queryset = queryset.select_related(None).only(*only_fields)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
     
     def perform_create(self, serializer):
         """建立裝置時設定建立者並記錄日誌"""
@@ -201,25 +411,64 @@ class DeviceViewSet(viewsets.ModelViewSet):
                 .values_list('department', 'count')
             ),
             'total_cost': queryset.aggregate(total=Sum('cost'))['total'] or 0,
-            'total_current_value': sum(
-                [d.get_current_depreciation() or 0 for d in queryset if d.cost]
-            ),
+            'total_current_value': valuation.valuation_report(queryset)['total_value'],
         }
         
         serializer = DeviceStatisticsSerializer(stats)
         return Response(serializer.data)
     
-    @action(detail=True, methods=['get'])
-    def history(self, request, pk=None):
-        """獲取裝置的操作歷史"""
-        device = self.get_object()
-        logs = AuditLog.objects.filter(
-            model_name='Device',
-            object_id=str(device.id)
-        ).order_by('-timestamp')
+    @action(detail=False, methods=['get'])
+    def valuation_report(self, request):
+        """估值報表：?as_of= 日期的成本、價值與累計折舊，可依 ?group_by= 分組"""
+        group_by = request.query_params.get('group_by') or None
+        if group_by is not None and group_by not in self.valuation_group_fields:
+            raise ValidationError({
+                'group_by': [f'可用的分組：{", ".join(self.valuation_group_fields)}']
+            })
+        queryset = self.filter_queryset(self.get_queryset())
+        report = valuation.valuation_report(
+            queryset, self.get_as_of(), self.valuation_group_fields.get(group_by)
+        )
+        report['group_by'] = group_by
+        return Response(ValuationReportSerializer(report).data)
+    
+    @action(detail=False, methods=['get'])
+    def expiring(self, request):
+        """即將到期的裝置：?kind=warranty|retirement（預設保固）、?days= 天內（預設 30），依到期日排序"""
+        kind = request.query_params.get('kind', 'warranty')
+        if kind not in expiry.EXPIRY_FIELDS:
+            raise ValidationError({'kind': [f'可用的類型：{", ".join(expiry.EXPIRY_FIELDS)}']})
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            days = -1
+        if not 0 <= days <= 366:
+            raise ValidationError({'days': ['天數必須介於 0 與 366 之間']})
         
-        serializer = AuditLogSerializer(logs, many=True)
-        return Response(serializer.data)
+        queryset = expiry.expiring(self.filter_queryset(self.get_queryset()), kind, days)
+        rows = queryset.values_list(*self.expiring_row_mapper.columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.expiring_row_mapper.map_rows(page))
+        return Response(self.expiring_row_mapper.map_rows(rows))
+    
+    @action(detail=False, methods=['post'])
+    def bulk_tags(self, request):
+        """批次標記：{"devices": [ID...], "add": [標籤 ID...], "remove": [標籤 ID...]}，只處理可存取的裝置"""
+        serializer = TagAssignmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        pks = set(data['devices'])
+        permitted = get_row_policy(Device).permitted_pks(Device.objects.all(), request.user, pks)
+        if pks - permitted:
+            missing = ', '.join(str(pk) for pk in sorted(pks - permitted))
+            raise ValidationError({'devices': [f'裝置不存在或無權限：{missing}']})
+        
+        devices = Device.objects.filter(pk__in=permitted)
+        with transaction.atomic():
+            added = tags.add_tags(devices, [tag.pk for tag in data.get('add', [])], request.user, request)
+            removed = tags.remove_tags(devices, [tag.pk for tag in data.get('remove', [])], request.user, request)
+        return Response({'added': added, 'removed': removed})
     
     @action(detail=False, methods=['get'])
     def search_by_ip(self, request):
@@ -262,28 +511,18 @@ class DeviceViewSet(viewsets.ModelViewSet):
         return ip
 
 
-class IPRecordViewSet(viewsets.ModelViewSet):
-    """IP 記錄的 ViewSet"""
+class IPRecordViewSet(RowPermissionMixin, ChangeFeedMixin, HistoryMixin, viewsets.ModelViewSet):
+    """IP 記錄的 ViewSet（一般用戶只能存取自己負責裝置的 IP 記錄）"""
     queryset = IPRecord.objects.select_related('device')
     serializer_class = IPRecordSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['device', 'is_active']
     search_fields = ['ip_address', 'mac_address', 'device__name']
     ordering_fields = ['assigned_date', 'created_at', 'updated_at']
     ordering = ['-assigned_date']
-    
-    def get_queryset(self):
-        """根據用戶權限過濾查詢集"""
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        # 管理員可以查看所有 IP 記錄
-        if user.is_staff or user.is_superuser:
-            return queryset
-        
-        # 一般用戶只能查看自己負責裝置的 IP 記錄
-        return queryset.filter(device__responsible_person=user)
+    # 表單輸入時頻繁呼叫的 IP 檢查使用 ping 額度
+    throttle_scopes = {'check_ip_available': 'ping'}
     
     def perform_create(self, serializer):
         """建立 IP 記錄時記錄日誌"""
@@ -342,8 +581,99 @@ class IPRecordViewSet(viewsets.ModelViewSet):
         return ip
 
 
-class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
-    """操作日誌的 ViewSet（唯讀）"""
+class SubnetViewSet(viewsets.ModelViewSet):
+    """網段的 ViewSet（網段數量少，不分頁；usedHosts 為啟用中的 IP 記錄數）"""
+    queryset = Subnet.objects.annotate(used_hosts=Count('ip_records', filter=Q(ip_records__is_active=True)))
+    serializer_class = SubnetSerializer
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly]
+    pagination_class = None
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['name', 'cidr']
+    ordering = ['name']
+
+
+class TagViewSet(viewsets.ModelViewSet):
+    """標籤的 ViewSet（標籤數量少，不分頁；device_count 為使用此標籤的裝置數）"""
+    queryset = Tag.objects.annotate(device_count=Count('device_links'))
+    serializer_class = TagSerializer
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly]
+    pagination_class = None
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['name']
+    ordering_fields = ['name', 'device_count']
+    ordering = ['name']
+
+
+class HostViewSet(RowPermissionMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    主機列表：裝置與其啟用中的 IP 記錄（每筆 IP 記錄一台主機）
+
+    以一次 JOIN 查詢取得輸出欄位，依 ?subnet= / ?status= / ?service_type= / ?tags= / ?tags_all= / ?search= 篩選，
+    ?ordering= 排序，並以複合鍵游標分頁（回應只有 next 與 results）
+    """
+    queryset = hosts.host_queryset()
+    permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
+    pagination_class = KeysetPagination
+    lookup_value_regex = r'\d+'
+    row_mapper = RowMapper(HostSerializer)
+    
+    def filter_queryset(self, queryset):
+        params = self.request.query_params
+        return hosts.order_hosts(hosts.filter_hosts(queryset, params), params.get('ordering', ''))
+    
+    def map_rows(self, rows):
+        """輸出主機並以一次查詢附上裝置的標籤"""
+        data = self.row_mapper.map_rows(rows)
+        device_tags = tags.host_tags(host['deviceId'] for host in data)
+        for host in data:
+            host['tags'] = device_tags.get(host['deviceId'], [])
+        return data
+    
+    def list(self, request, *args, **kwargs):
+        rows = self.filter_queryset(self.get_queryset()).values_list(*self.row_mapper.columns)
+        page = self.paginate_queryset(rows)
+        return self.get_paginated_response(self.map_rows(page))
+    
+    def retrieve(self, request, *args, **kwargs):
+        rows = self.get_queryset().filter(pk=kwargs['pk']).values_list(*self.row_mapper.columns)
+        data = self.map_rows(rows)
+        if not data:
+            raise NotFound()
+        return Response(data[0])
+    
+    @action(detail=False, methods=['post'])
+    def move(self, request):
+        """
+        搬移主機到其他網段：{"hosts": [ID...], "subnet": 網段 ID}
+
+        由目標網段配置新 IP、停用原本的 IP 記錄，回傳搬移後的主機與 {原 ID: 新 ID}
+        """
+        serializer = HostMoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        pks = set(serializer.validated_data['hosts'])
+        permitted = get_row_policy(IPRecord).permitted_pks(
+            IPRecord.objects.filter(is_active=True), request.user, pks
+        )
+        if pks - permitted:
+            missing = ', '.join(str(pk) for pk in sorted(pks - permitted))
+            raise ValidationError({'hosts': [f'主機不存在或無權限：{missing}']})
+        
+        moved = hosts.move_hosts(
+            IPRecord.objects.filter(pk__in=permitted), serializer.validated_data['subnet'], request.user, request
+        )
+        rows = (
+            self.get_queryset().filter(pk__in=[record.pk for record in moved.values()])
+            .order_by('pk').values_list(*self.row_mapper.columns)
+        )
+        return Response({
+            'moved': len(moved),
+            'hosts': self.map_rows(rows),
+            'replaced': {str(pk): record.pk for pk, record in moved.items()},
+        })
+
+
+class AuditLogViewSet(RowPermissionMixin, TimeWindowMixin, viewsets.ReadOnlyModelViewSet):
+    """操作日誌的 ViewSet（唯讀，一般用戶只能查看自己的操作日誌）"""
     queryset = AuditLog.objects.select_related('user')
     serializer_class = AuditLogSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -352,16 +682,58 @@ class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['object_repr', 'model_name']
     ordering_fields = ['timestamp']
     ordering = ['-timestamp']
+    # 封存搜尋需要讀取並解壓縮檔案，與匯出共用額度
+    throttle_scopes = {'archive': 'export'}
     
     def get_queryset(self):
-        """根據用戶權限過濾查詢集"""
+        """依列級權限與時間範圍過濾查詢集"""
         queryset = super().get_queryset()
-        user = self.request.user
         
-        # 管理員可以查看所有日誌
-        if user.is_staff or user.is_superuser:
-            return queryset
+        # 明確的時間範圍讓 PostgreSQL 只掃描相關的月分割區
+        return self.filter_time_window(queryset)
+    
+    def get_default_window_days(self):
+        """列表未指定 since 時預設只查詢最近的日誌"""
+        if self.action != 'list':
+            return None
+        return getattr(settings, 'AUDIT_LOG', {}).get('DEFAULT_WINDOW_DAYS')
+    
+    @action(detail=False, methods=['get'])
+    def archive(self, request):
+        """搜尋已移出資料庫的封存日誌（依物件、用戶或時間範圍）"""
+        params = request.query_params
+        object_id = params.get('object_id')
+        model_name = params.get('model_name')
+        if object_id and not model_name:
+            raise ValidationError({'model_name': ['搜尋物件時必須指定模型名稱']})
+        values = {}
+        for name, default in (('limit', 100), ('user', None)):
+            try:
+                values[name] = int(params[name]) if params.get(name) else default
+            except ValueError:
+                raise ValidationError({name: ['必須是整數']})
+        limit, user_id = values['limit'], values['user']
         
         # 一般用戶只能查看自己的操作日誌
-        return queryset.filter(user=user)
+        if not is_admin(request.user):
+            user_id = request.user.id
+        
+        since, until = self.get_time_window()
+        query = audit_archive.ArchiveQuery(
+            model_name=model_name, object_id=object_id,
+            user_id=user_id, since=since, until=until
+        )
+        archive_dir = str(getattr(settings, 'AUDIT_LOG', {}).get('ARCHIVE_DIR', ''))
+        rows, stats = audit_archive.search_archives(archive_dir, query, max(1, min(limit, 1000)))
+        
+        users = User.objects.in_bulk({row['user_id'] for row in rows if row['user_id']})
+        logs = []
+        for row in rows:
+            log = AuditLog(**row)
+            log.user = users.get(row['user_id'])
+            logs.append(log)
+        return Response({
+            'results': AuditLogSerializer(logs, many=True).data,
+            'stats': stats,
+        })
 
@@ -65,5 +65,22 @@ if [ "$user_check_exit" -eq 0 ]; then
     echo "預設使用者帳號: user1 / user123"
 fi
 
-echo "啟動 Django 開發伺服器..."
-exec python manage.py runserver 0.0.0.0:8000
+# SERVER_MODE: dev（開發伺服器，預設）、wsgi（Gunicorn 多 worker）、asgi（Gunicorn + Uvicorn worker）
+case "${SERVER_MODE:-dev}" in
+    wsgi)
+        echo "收集靜態檔案..."
+        python manage.py collectstatic --noinput
+        echo "啟動 Gunicorn (WSGI)..."
+        exec gunicorn icap_project.wsgi:application -c gunicorn.conf.py
+        ;;
+    asgi)
+        echo "收集靜態檔案..."
+        python manage.py collectstatic --noinput
+        echo "啟動 Gunicorn (ASGI / Uvicorn worker)..."
+        exec gunicorn icap_project.asgi:application -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker
+        ;;
+    *)
+        echo "啟動 Django 開發伺服器..."
+        exec python manage.py runserver 0.0.0.0:8000
+        ;;
+esac
@@ -1,15 +1,23 @@
 import * as React from 'react'
 import { Toaster } from 'sonner'
 
+import { useLiveUpdates } from '@/hooks/use-live-updates'
+
 import { ThemeProvider } from './theme-provider'
 import { QueryProvider } from './query-provider'
 import { AuthProvider } from './auth-provider'
 
+function LiveUpdates() {
+  useLiveUpdates()
+  return null
+}
+
 export function AppProviders({ children }: { children: React.ReactNode }) {
   return (
     <ThemeProvider>
       <QueryProvider>
         <AuthProvider>
+          <LiveUpdates />
           {children}
           <Toaster position="top-right" richColors closeButton />
         </AuthProvider>
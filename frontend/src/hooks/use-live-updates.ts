@@ -0,0 +1,64 @@
+import { useQueryClient } from '@tanstack/react-query'
+import * as React from 'react'
+
+import { apiClient } from '@/lib/api-client'
+
+// 事件類型對應需要重新取得的查詢
+const invalidationMap: Record<string, string[][]> = {
+  'device.created': [['hosts'], ['dashboard-overview']],
+  'device.updated': [['hosts'], ['dashboard-overview']],
+  'device.deleted': [['hosts'], ['dashboard-overview']],
+  'device.bulk_updated': [['hosts'], ['dashboard-overview']],
+  'ip_record.created': [['hosts'], ['subnets'], ['dashboard-overview']],
+  'ip_record.updated': [['hosts'], ['subnets'], ['dashboard-overview']],
+  'ip_record.deleted': [['hosts'], ['subnets'], ['dashboard-overview']],
+  'ip_record.bulk_updated': [['hosts'], ['subnets'], ['dashboard-overview']],
+  'ip_record.bulk_deleted': [['hosts'], ['subnets'], ['dashboard-overview']],
+  ip_conflict: [['hosts'], ['dashboard-overview']],
+}
+
+// 短時間內的多筆事件合併為一次重新取得
+const FLUSH_DELAY_MS = 300
+
+export function useLiveUpdates() {
+  const queryClient = useQueryClient()
+
+  React.useEffect(() => {
+    if (typeof window === 'undefined' || !('EventSource' in window)) return
+
+    const pending = new Set<string>()
+    let timer: ReturnType<typeof setTimeout> | null = null
+
+    const flush = () => {
+      timer = null
+      pending.forEach((key) => {
+        queryClient.invalidateQueries({ queryKey: JSON.parse(key) })
+      })
+      pending.clear()
+    }
+
+    const source = new EventSource(`${apiClient.defaults.baseURL}/events/stream/`, {
+      withCredentials: true,
+    })
+
+    const handle = (event: MessageEvent) => {
+      invalidationMap[event.type]?.forEach((key) => pending.add(JSON.stringify(key)))
+      if (!timer) timer = setTimeout(flush, FLUSH_DELAY_MS)
+    }
+
+    // 連線期間由推送更新資料，不需在視窗取得焦點時重新輪詢
+    source.onopen = () => {
+      queryClient.setDefaultOptions({ queries: { refetchOnWindowFocus: false } })
+    }
+    source.onerror = () => {
+      queryClient.setDefaultOptions({ queries: { refetchOnWindowFocus: true } })
+    }
+
+    Object.keys(invalidationMap).forEach((type) => source.addEventListener(type, handle))
+
+    return () => {
+      if (timer) clearTimeout(timer)
+      source.close()
+    }
+  }, [queryClient])
+}
@@ -34,16 +34,62 @@ export async function deleteSubnet(id: string) {
   await apiClient.delete(`/subnets/${id}`)
 }
 
-export async function getHosts(params?: Record<string, string | string[] | undefined>): Promise<Host[]> {
+export interface HostQuery {
+  search?: string
+  subnets?: string[]
+  services?: string[]
+  statuses?: string[]
+  tags?: string[]
+  ordering?: string
+  pageSize?: number
+  cursor?: string
+}
+
+export interface HostPage {
+  next: string | null
+  results: Host[]
+}
+
+function joinValues(values?: string[]) {
+  return values && values.length > 0 ? values.join(',') : undefined
+}
+
+export async function getHostPage(query: HostQuery = {}): Promise<HostPage> {
+  const params = {
+    search: query.search || undefined,
+    subnet: joinValues(query.subnets),
+    service_type: joinValues(query.services),
+    status: joinValues(query.statuses),
+    tags: joinValues(query.tags),
+    ordering: query.ordering,
+    page_size: query.pageSize,
+    cursor: query.cursor,
+  }
+  const { data } = await apiClient.get<HostPage>('/hosts', { params })
+  return data
+}
+
+export async function getHosts(query?: HostQuery): Promise<Host[]> {
   try {
-    const { data } = await apiClient.get<Host[]>('/hosts', { params })
-    return data
+    const { results } = await getHostPage({ pageSize: 500, ...query })
+    return results.map((host) => ({ ...host, tags: host.tags ?? [] }))
   } catch (error) {
     console.warn('[hosts] fallback to mock data', error)
     return mockHosts
   }
 }
 
+export interface HostMoveResult {
+  moved: number
+  hosts: Host[]
+  replaced: Record<string, number>
+}
+
+export async function moveHosts(ids: string[], subnetId: string): Promise<HostMoveResult> {
+  const { data } = await apiClient.post<HostMoveResult>('/hosts/move', { hosts: ids, subnet: subnetId })
+  return data
+}
+
 export async function createOrUpdateHost(payload: Partial<Host>) {
   if (payload.id) {
     await apiClient.put(`/hosts/${payload.id}`, payload)
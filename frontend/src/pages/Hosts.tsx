@@ -45,7 +45,10 @@ function HostsPage() {
   const subnets = subnetData ?? []
 
   const { data, isLoading, isFetching, refetch } = useQuery<Host[]>({
-    queryKey: ['hosts', { searchKeyword, selectedSubnets, selectedServices, selectedStatuses, selectedTags }],
+    queryKey: [
+      'hosts',
+      { searchKeyword, selectedSubnets, selectedServices, selectedStatuses, selectedTags, sortBy, sortDirection },
+    ],
     queryFn: () =>
       getHosts({
         search: searchKeyword,
@@ -53,6 +56,7 @@ function HostsPage() {
         services: selectedServices,
         statuses: selectedStatuses,
         tags: selectedTags,
+        ordering: `${sortDirection === 'desc' ? '-' : ''}${sortBy}`,
       }),
   })
 
@@ -302,7 +306,7 @@ function HostsPage() {
         availableTags={filterableTags}
         onSubmit={handleSubmit}
         onCheckIpConflict={async (ip, currentHostId) => {
-          const hosts = await getHosts()
+          const hosts = await getHosts({ search: ip })
           return hosts.some((host) => host.ipAddress === ip && host.id !== currentHostId)
         }}
       />
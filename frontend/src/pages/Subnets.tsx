@@ -16,7 +16,7 @@ import { Dialog, DialogContent, DialogDescription, DialogFooter, DialogHeader, D
 import { Skeleton } from '@/components/ui/skeleton'
 import { Spinner } from '@/components/ui/spinner'
 import { useToast } from '@/hooks/use-toast'
-import { createOrUpdateHost, createOrUpdateSubnet, deleteSubnet, getSubnets } from '@/lib/ipac-service'
+import { createOrUpdateSubnet, deleteSubnet, getSubnets, moveHosts } from '@/lib/ipac-service'
 import type { Host, SubnetWithHosts } from '@/types'
 
 import { DroppableSubnetCard } from '@/components/features/subnets/DroppableSubnetCard'
@@ -148,8 +148,9 @@ function SubnetsPage() {
 
     try {
       updateHostInCache(host, overSubnetId)
-      await createOrUpdateHost({ ...host, subnetId: overSubnetId })
-      success('主機已搬移', `${host.hostname} 已移至新網段`)
+      const [moved] = (await moveHosts([host.id], overSubnetId)).hosts
+      success('主機已搬移', moved ? `${host.hostname} 已移至 ${moved.ipAddress}` : `${host.hostname} 已移至新網段`)
+      refetch()
     } catch (err) {
       error('搬移失敗', err instanceof Error ? err.message : '請稍後再試')
       refetch()
@@ -0,0 +1,28 @@
+"""
+Gunicorn 設定檔（生產環境）
+
+WSGI 模式使用 gthread worker，ASGI 模式由啟動腳本以 -k 覆寫為 UvicornWorker。
+所有參數皆可透過環境變數調整。
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# 預設 worker 數：CPU 核心數 * 2 + 1
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+# 保持 HTTP keep-alive，減少反向代理後的連線建立成本
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+
+# 定期回收 worker，避免記憶體無限成長；加入抖動避免同時重啟
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
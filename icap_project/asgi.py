@@ -3,6 +3,12 @@ ASGI config for icap_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The server-sent events stream (/api/events/stream/) holds one long-lived
+connection per browser tab; under ASGI each connection is a coroutine rather
+than a worker thread, so the stream must be served through this application
+(SERVER_MODE=asgi). Multi-worker deployments should configure a shared
+DEVICE_EVENTS backend (e.g. RedisBackend) so events reach every worker.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -81,6 +81,9 @@ DATABASES = {
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD', 'icap_password'),
         'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
         'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # 持久連線：同一執行緒的請求重用連線，重用前先檢查連線是否仍可用
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -129,12 +132,51 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = Path(os.environ.get('DJANGO_STATIC_ROOT', BASE_DIR / 'staticfiles'))
+
+# 生產環境使用 WhiteNoise 提供壓縮且帶雜湊檔名的靜態檔案（選用套件）
+try:
+    import whitenoise  # noqa: F401
+except ImportError:
+    WHITENOISE_ENABLED = False
+else:
+    WHITENOISE_ENABLED = True
+
+if WHITENOISE_ENABLED:
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+        'whitenoise.middleware.WhiteNoiseMiddleware',
+    )
+    if not DEBUG:
+        STORAGES = {
+            'default': {
+                'BACKEND': 'django.core.files.storage.FileSystemStorage',
+            },
+            'staticfiles': {
+                'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+            },
+        }
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# 快取：shared 存放流量限制計數器與權杖主體
+# 多個 worker 時設定 SHARED_CACHE_REDIS_URL，讓所有行程共用；未設定時為行程內快取
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    },
+}
+if os.environ.get('SHARED_CACHE_REDIS_URL'):
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['SHARED_CACHE_REDIS_URL'],
+    }
+
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -142,8 +184,20 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
+        # 機器用戶端建議使用權杖，避免每個請求都進行密碼雜湊驗證
+        'device_management.authentication.TokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
+    # 安裝 orjson 時使用較快的 JSON 編碼／解碼，否則退回標準函式庫
+    'DEFAULT_RENDERER_CLASSES': [
+        'device_management.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'device_management.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
@@ -151,7 +205,90 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 50,
+    # 以快取中的滑動視窗計數器限制流量（額度見 API_THROTTLE）
+    'DEFAULT_THROTTLE_CLASSES': [
+        'device_management.throttling.ScopedSlidingWindowThrottle',
+    ],
+}
+
+# API 流量限制（見 device_management/throttling.py）
+# 統計、匯出、批次匯入與 ping 等昂貴動作各有獨立額度；一般讀取與寫入另計
+API_THROTTLE = {
+    'ENABLED': os.environ.get('API_THROTTLE_ENABLED', 'True').lower() == 'true',
+    'CACHE': 'shared',
+    'RATES': {
+        'read': os.environ.get('API_THROTTLE_READ', '1200/min'),
+        'write': os.environ.get('API_THROTTLE_WRITE', '300/min'),
+        'statistics': os.environ.get('API_THROTTLE_STATISTICS', '30/min'),
+        'export': os.environ.get('API_THROTTLE_EXPORT', '10/min'),
+        'bulk_import': os.environ.get('API_THROTTLE_BULK_IMPORT', '5/min'),
+        'ping': os.environ.get('API_THROTTLE_PING', '60/min'),
+    },
+    # 管理員只限制昂貴動作，一般讀寫不受限
+    'ADMIN_RATES': {
+        'statistics': '120/min',
+        'export': '60/min',
+        'bulk_import': '30/min',
+        'ping': '300/min',
+    },
+}
+
+# API 權杖認證（見 device_management/authentication.py）
+# 權杖主體先查行程內快取（LOCAL_TTL 秒），再查共用快取（CACHE_TTL 秒），最後才查資料庫
+API_TOKEN = {
+    'CACHE': 'shared',
+    'CACHE_TTL': int(os.environ.get('API_TOKEN_CACHE_TTL', '300')),
+    'LOCAL_TTL': int(os.environ.get('API_TOKEN_LOCAL_TTL', '10')),
+}
+
+# 操作日誌保存期限（見 prune_audit_logs 指令）
+# PostgreSQL 依月分割；其他資料庫超過 HOT_MONTHS 的日誌移入封存表
+AUDIT_LOG = {
+    'DEFAULT_WINDOW_DAYS': int(os.environ.get('AUDIT_LOG_DEFAULT_WINDOW_DAYS', '90')),
+    'HOT_MONTHS': int(os.environ.get('AUDIT_LOG_HOT_MONTHS', '3')),
+    'RETENTION_MONTHS': int(os.environ.get('AUDIT_LOG_RETENTION_MONTHS', '12')),
+    'ARCHIVE_DIR': Path(os.environ.get('AUDIT_LOG_ARCHIVE_DIR', BASE_DIR / 'archives' / 'audit_logs')),
+    # columnar：可由 audit_archive 指令與 /api/audit-logs/archive/ 查詢；jsonl：gzip 壓縮的 JSONL
+    'ARCHIVE_FORMAT': os.environ.get('AUDIT_LOG_ARCHIVE_FORMAT', 'columnar'),
+}
+
+# 讀取稽核（見 device_management/access_audit.py）
+# 讀取次數先在記憶體中依 (用戶, 物件, 時間區間) 彙總，每 FLUSH_INTERVAL 秒批次寫入
+ACCESS_AUDIT = {
+    'ENABLED': os.environ.get('ACCESS_AUDIT_ENABLED', 'True').lower() == 'true',
+    'BUCKET_SECONDS': int(os.environ.get('ACCESS_AUDIT_BUCKET_SECONDS', '3600')),
+    'FLUSH_INTERVAL': int(os.environ.get('ACCESS_AUDIT_FLUSH_INTERVAL', '30')),
+    'SAMPLE_RATE': float(os.environ.get('ACCESS_AUDIT_SAMPLE_RATE', '1.0')),
+}
+
+# 動態屬性結構演進（見 device_management/property_schema.py）
+# 屬性定義變更後在背景執行緒分批改寫裝置資料；中斷的工作以 property_migrations 指令繼續
+PROPERTY_MIGRATIONS = {
+    'BATCH_SIZE': int(os.environ.get('PROPERTY_MIGRATIONS_BATCH_SIZE', '1000')),
+    'BACKGROUND': True,
+}
+
+# 即時事件推送（SSE）
+# 單一 worker 使用行程內廣播；多個 worker 時設定 DEVICE_EVENTS_REDIS_URL 改用 Redis 分送
+DEVICE_EVENTS = {
+    'BACKEND': 'device_management.events.InMemoryBackend',
+    'OPTIONS': {},
+    'HEARTBEAT_INTERVAL': int(os.environ.get('DEVICE_EVENTS_HEARTBEAT', '15')),
+}
+if os.environ.get('DEVICE_EVENTS_REDIS_URL'):
+    DEVICE_EVENTS['BACKEND'] = 'device_management.events.RedisBackend'
+    DEVICE_EVENTS['OPTIONS'] = {'url': os.environ['DEVICE_EVENTS_REDIS_URL']}
+
+# 通知（見 device_management/notifications.py 與 expiry_digest 指令）
+# 預設輸出至標準輸出；設定 NOTIFICATIONS_FILE 時改以 JSONL 寫入檔案
+NOTIFICATIONS = {
+    'BACKEND': 'device_management.notifications.ConsoleBackend',
+    'OPTIONS': {},
+    'BATCH_SIZE': int(os.environ.get('NOTIFICATIONS_BATCH_SIZE', '500')),
 }
+if os.environ.get('NOTIFICATIONS_FILE'):
+    NOTIFICATIONS['BACKEND'] = 'device_management.notifications.FileBackend'
+    NOTIFICATIONS['OPTIONS'] = {'path': os.environ['NOTIFICATIONS_FILE']}
 
 # Timezone settings
 TIME_ZONE = 'Asia/Taipei'